@@ -112,6 +112,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "django.middleware.http.ConditionalGetMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
 ]
@@ -184,6 +185,114 @@ else:
     logging.getLogger("boto3").setLevel(logging.WARNING)
     logging.getLogger("urllib3").setLevel(logging.WARNING)
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory by default (and in tests). Deployments with more than one
+# process (several gunicorn workers, the ML worker container) need a shared
+# backend such as Redis/Memcached: invalidations only reach the process that
+# made them otherwise, so the access and story caches stay off (system checks
+# ct_application.W001/W002).
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "commonthread"),
+    }
+}
+
+# verify_user membership / project->org / story->project lookups (only cached
+# on a shared backend)
+ACCESS_CACHE_ALIAS = "default"
+ACCESS_CACHE_TIMEOUT = 60 * 5
+
+# get_story bodies and project stats (only cached on a shared backend)
+STORY_CACHE_ALIAS = "default"
+STORY_CACHE_TIMEOUT = 60 * 15
+
+# Presigned S3 download links are reused while more than this fraction of
+# their lifetime remains
+PRESIGNED_URL_CACHE_ALIAS = "default"
+PRESIGNED_URL_MIN_REMAINING = 0.5
+
+# get_stories pagination (?limit= is capped at STORIES_PAGE_MAX)
+STORIES_PAGE_SIZE = 100
+STORIES_PAGE_MAX = 500
+# Characters of text_content sent as a story's text_preview in lists
+STORY_PREVIEW_CHARS = 500
+# Rows fetched per round trip when get_stories streams (?stream=ndjson|json)
+STORIES_STREAM_CHUNK_SIZE = 200
+
+# TaggingService batch mode: texts per NER forward pass, stories per
+# load/write transaction
+TAGGING_BATCH_SIZE = 16
+TAGGING_CHUNK_SIZE = 256
+# Stories per local summarization generate call (similar lengths are batched
+# together)
+SUMMARIZING_BATCH_SIZE = 8
+# Project insight refreshes are skipped while a summarization for the project
+# queued within this many seconds is still waiting (bulk uploads refresh once)
+INSIGHT_DEBOUNCE_SECONDS = 15 * 60
+# Project insight prompt budget (tokens, counted locally with
+# INSIGHT_TOKENIZER). Near-duplicate summaries are dropped, each storyteller
+# contributes at most INSIGHT_MAX_PER_STORYTELLER, and a diverse sample is
+# taken when the rest does not fit. See ct_application/ml/context_packer.py.
+INSIGHT_CONTEXT_TOKENS = 8000
+INSIGHT_MAX_PER_STORYTELLER = 3
+INSIGHT_NEAR_DUPLICATE_THRESHOLD = 0.9
+INSIGHT_TOKENIZER = "sshleifer/distilbart-cnn-12-6"
+# Project chat sends only the CHAT_TOP_K story chunks (CHAT_CHUNK_WORDS-word
+# windows) most similar to the question, ranked with CHAT_EMBEDDING_MODEL or
+# BM25 when it can't be loaded. See ct_application/ml/retrieval_index.py.
+CHAT_CHUNK_WORDS = 150
+CHAT_CHUNK_OVERLAP = 30
+CHAT_TOP_K = 8
+CHAT_INDEX_MAX_PROJECTS = 32
+# Seconds after which a chat index re-checks its stories for changes even if
+# the project's cache version didn't move (edits made by the ML worker)
+CHAT_INDEX_MAX_AGE = 60
+CHAT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Memoized ML pipeline outputs (MLResult rows), least recently used evicted
+# beyond the bound
+ML_RESULT_CACHE_MAX_ENTRIES = 50000
+ML_RESULT_CACHE_EVICT_EVERY = 100
+
+# ML worker (cloud/consumer_service.py): messages processed concurrently by
+# one worker process; messages of the same story still run in order
+ML_WORKER_MAX_IN_FLIGHT = int(os.getenv("ML_WORKER_MAX_IN_FLIGHT", 4))
+ML_WORKER_ERROR_BACKOFF = 1
+# Expected run time per task type (seconds). The worker keeps a message
+# invisible in steps of this size while its job runs, up to
+# ML_VISIBILITY_MAX_SECONDS, so slow jobs are not redelivered and run twice.
+ML_TASK_EXPECTED_SECONDS = {"transcription": 900, "summarization": 300, "tag": 120}
+ML_TASK_DEFAULT_EXPECTED_SECONDS = 300
+ML_VISIBILITY_MAX_SECONDS = 2 * 60 * 60
+# "sqs", or "database" to queue ML jobs in the MLJob table (cloud/db_queue.py)
+# and run the pipeline without AWS. Jobs are leased for
+# ML_DB_QUEUE_LEASE_SECONDS until the worker's first heartbeat, and retried
+# with exponential backoff from ML_DB_QUEUE_RETRY_BACKOFF seconds.
+ML_QUEUE_BACKEND = os.getenv("ML_QUEUE_BACKEND", "sqs")
+ML_DB_QUEUE_POLL_INTERVAL = 1
+ML_DB_QUEUE_LEASE_SECONDS = 300
+ML_DB_QUEUE_MAX_ATTEMPTS = 3
+ML_DB_QUEUE_RETRY_BACKOFF = 30
+# ML task scheduling. Lower priority runs first; within a priority the org
+# with the fewest running jobs goes next, so one org's bulk import cannot
+# starve the others. ML_TASK_CONCURRENCY caps running jobs of a type per
+# worker process. The SQS worker holds up to ML_WORKER_PREFETCH extra
+# messages (kept invisible) so the scheduler has something to choose from.
+ML_TASK_PRIORITY = {"tag": 0, "transcription": 1, "summarization": 2}
+ML_TASK_DEFAULT_PRIORITY = 1
+ML_TASK_CONCURRENCY = {"transcription": 2, "summarization": 1}
+ML_WORKER_PREFETCH = 10
+# SQS outbox (MLOutbox): a relay leases the rows it sends for
+# ML_OUTBOX_LEASE_SECONDS; rows whose request couldn't relay them are sent by
+# the SQS worker every ML_OUTBOX_RELAY_INTERVAL seconds
+ML_OUTBOX_LEASE_SECONDS = 60
+ML_OUTBOX_RELAY_INTERVAL = 30
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
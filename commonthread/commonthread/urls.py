@@ -37,6 +37,7 @@ from ct_application.views import (
     delete_user_from_org,
     create_project,
     get_project,
+    get_project_stats,
     edit_project,
     delete_project,
     create_story,
@@ -44,9 +45,9 @@ from ct_application.views import (
     delete_story,
     get_stories,
     get_story,
-    feat/project-chat-perplexity
     project_chat_api,
-    story_chat_api # Added new story_chat_api view
+    story_chat_api,  # Added new story_chat_api view
+)
 
 
 urlpatterns = [
@@ -77,6 +78,7 @@ urlpatterns = [
     # Project Related Endpoints
     path("project/create", create_project, name="project-create"),
     path("project/<int:project_id>", get_project, name="get-project"),
+    path("project/<int:project_id>/stats", get_project_stats, name="get-project-stats"),
     path("project/<int:project_id>/edit", edit_project, name="project-edit"),
     path("project/<int:project_id>/delete", delete_project, name="project-delete"),
     # Story Related Endpoints
@@ -0,0 +1,143 @@
+"""
+Cache of the facts verify_user needs to authorize a request:
+
+1. Per-user membership map (org_id -> access level), loaded from OrgUser
+2. project_id -> org_id and story_id -> project_id lookups
+
+Entries live in Django's cache framework (settings.ACCESS_CACHE_ALIAS). The
+cache is only used on a shared backend: with a per-process one (LocMemCache,
+the default) a revoked membership would stay cached in the other web
+processes for ACCESS_CACHE_TIMEOUT, so every request reads the database
+instead (system check ct_application.W001), as the story cache does. Views
+that change memberships or delete orgs/projects/stories call the matching
+invalidate_* function, which drops the affected keys once the surrounding
+transaction commits.
+"""
+
+import logging
+from typing import Iterable, Optional
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from .checks import is_process_local
+from .models import OrgUser, Project, Story
+
+logger = logging.getLogger(__name__)
+
+ACCESS_CACHE_ALIAS = getattr(settings, "ACCESS_CACHE_ALIAS", "default")
+ACCESS_CACHE_TIMEOUT = getattr(settings, "ACCESS_CACHE_TIMEOUT", 300)
+
+
+def _cache():
+    return caches[ACCESS_CACHE_ALIAS]
+
+
+def _enabled() -> bool:
+    return not is_process_local(ACCESS_CACHE_ALIAS)
+
+
+def _user_key(user_id) -> str:
+    return f"access:user:{user_id}"
+
+
+def _project_key(project_id) -> str:
+    return f"access:project:{project_id}"
+
+
+def _story_key(story_id) -> str:
+    return f"access:story:{story_id}"
+
+
+## Lookups ---------------------------------------------------------------------
+
+
+def get_user_orgs(user_id) -> dict:
+    """
+    Returns the user's {org_id: access} map, loading it from OrgUser in a
+    single query on a cache miss. Org ids are stored as strings so ids from
+    URL kwargs and JSON bodies hit the same entry.
+    """
+    key = _user_key(user_id)
+    memberships = _cache().get(key) if _enabled() else None
+    if memberships is None:
+        memberships = {
+            str(org_id): access
+            for org_id, access in OrgUser.objects.filter(user_id=user_id).values_list(
+                "org_id", "access"
+            )
+        }
+        if _enabled():
+            _cache().set(key, memberships, ACCESS_CACHE_TIMEOUT)
+    return memberships
+
+
+def get_org_access(user_id, org_id) -> Optional[str]:
+    # Access level of user in org, or None if no cached membership exists
+    return get_user_orgs(user_id).get(str(org_id))
+
+
+def get_project_org(project_id) -> Optional[int]:
+    if not _enabled():
+        return None
+    return _cache().get(_project_key(project_id))
+
+
+def set_project_org(project_id, org_id) -> None:
+    if _enabled():
+        _cache().set(_project_key(project_id), org_id, ACCESS_CACHE_TIMEOUT)
+
+
+def get_story_project(story_id) -> Optional[int]:
+    if not _enabled():
+        return None
+    return _cache().get(_story_key(story_id))
+
+
+def set_story_project(story_id, project_id) -> None:
+    if _enabled():
+        _cache().set(_story_key(story_id), project_id, ACCESS_CACHE_TIMEOUT)
+
+
+## Invalidation ----------------------------------------------------------------
+
+
+def _forget(keys: Iterable[str]) -> None:
+    # Keys are collected now, but dropped after commit so a concurrent request
+    # cannot re-cache the pre-transaction state.
+    keys = list(keys)
+    if keys and _enabled():
+        logger.debug("Invalidating access cache keys: %r", keys)
+        transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+def invalidate_user(user_id) -> None:
+    # Membership of user changed (added/removed from an org, org created)
+    _forget([_user_key(user_id)])
+
+
+def invalidate_story(story_id) -> None:
+    _forget([_story_key(story_id)])
+
+
+def invalidate_project(project_id) -> None:
+    """
+    Call before deleting the project: its stories are looked up here since
+    they are gone once the cascade runs.
+    """
+    story_ids = Story.objects.filter(proj_id=project_id).values_list("id", flat=True)
+    _forget([_project_key(project_id)] + [_story_key(s) for s in story_ids])
+
+
+def invalidate_org(org_id) -> None:
+    """
+    Call before deleting the org: drops every member's map along with the
+    entries of the org's projects and stories.
+    """
+    user_ids = OrgUser.objects.filter(org_id=org_id).values_list("user_id", flat=True)
+    project_ids = Project.objects.filter(org_id=org_id).values_list("id", flat=True)
+    story_ids = Story.objects.filter(proj__org_id=org_id).values_list("id", flat=True)
+    _forget(
+        [_user_key(u) for u in user_ids]
+        + [_project_key(p) for p in project_ids]
+        + [_story_key(s) for s in story_ids]
+    )
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CtApplicationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ct_application'
+
+    def ready(self):
+        from . import checks  # noqa: F401  (registers the system checks)
@@ -0,0 +1,57 @@
+"""
+System checks for cache settings.
+
+Access cache entries are dropped, and story cache versions bumped, by the
+process that made the change (a view, a management shell, the ML worker).
+With a per-process backend (LocMemCache) no other process would see it, so
+both caches are turned off.
+"""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+PROCESS_LOCAL_CACHE_BACKENDS = ("django.core.cache.backends.locmem.LocMemCache",)
+
+
+def is_process_local(alias: str) -> bool:
+    # True when every process has its own copy of the cache alias
+    backend = settings.CACHES.get(alias, {}).get("BACKEND", "")
+    return backend in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+@register("caches")
+def check_access_cache(app_configs, **kwargs):
+    alias = getattr(settings, "ACCESS_CACHE_ALIAS", "default")
+    if not is_process_local(alias):
+        return []
+    return [
+        Warning(
+            f"ACCESS_CACHE_ALIAS ({alias!r}) uses a per-process cache backend, "
+            "so request authorization is not cached.",
+            hint=(
+                "Revocations must reach every web worker. Set "
+                "CACHE_BACKEND/CACHE_LOCATION to a shared backend (Redis, "
+                "Memcached or the database cache) to enable the access cache."
+            ),
+            id="ct_application.W001",
+        )
+    ]
+
+
+@register("caches")
+def check_story_cache(app_configs, **kwargs):
+    alias = getattr(settings, "STORY_CACHE_ALIAS", "default")
+    if not is_process_local(alias):
+        return []
+    return [
+        Warning(
+            f"STORY_CACHE_ALIAS ({alias!r}) uses a per-process cache backend, "
+            "so get_story and project stats responses are not cached.",
+            hint=(
+                "The ML worker invalidates stories from its own process. Set "
+                "CACHE_BACKEND/CACHE_LOCATION to a shared backend (Redis, "
+                "Memcached or the database cache) to enable the story cache."
+            ),
+            id="ct_application.W002",
+        )
+    ]
@@ -1,16 +1,24 @@
 """
 This module has 2 main functions:
-1. Keep listening to the sqs queue
+1. Keep listening to the sqs queue (or, with ML_QUEUE_BACKEND = "database",
+   claiming jobs from the MLJob table, see db_queue.py)
 2  Process the message and update the database table (MLProcessingQueue) with the task status.
 """
 
 import os
 import django
 import json
-import boto3
 import logging
+import threading
 import time
+from collections import Counter, deque
+from itertools import count
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections, connection
 from django.utils import timezone
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "commonthread.settings")
@@ -22,13 +30,44 @@ from ..ml.ml_services.tagging_service import TaggingService #noqa: E402
 from ..ml.ml_services.transcribing_service import TranscribingService #noqa: E402
 from ..models import MLProcessingQueue, Story, Project #noqa: E402
 from commonthread.settings import CT_SQS_QUEUE_URL #noqa: E402
+from ..registry import get_shared #noqa: E402
+from .db_queue import claim_jobs, complete_job, extend_lease, fail_job #noqa: E402
+from .producer_service import relay_outbox #noqa: E402
 
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-
-sqs = boto3.client("sqs", region_name="us-east-1")
+# Messages processed at once by one worker process (poll mode)
+ML_WORKER_MAX_IN_FLIGHT = getattr(settings, "ML_WORKER_MAX_IN_FLIGHT", 4)
+# Pause after a failed receive_message call
+ML_WORKER_ERROR_BACKOFF = getattr(settings, "ML_WORKER_ERROR_BACKOFF", 1)
+# Expected run time per task type; message visibility is extended in steps of
+# this size while a job runs, up to ML_VISIBILITY_MAX_SECONDS in total
+ML_TASK_EXPECTED_SECONDS = getattr(
+    settings,
+    "ML_TASK_EXPECTED_SECONDS",
+    {"transcription": 900, "summarization": 300, "tag": 120},
+)
+ML_TASK_DEFAULT_EXPECTED_SECONDS = getattr(
+    settings, "ML_TASK_DEFAULT_EXPECTED_SECONDS", 300
+)
+ML_VISIBILITY_MAX_SECONDS = getattr(settings, "ML_VISIBILITY_MAX_SECONDS", 2 * 60 * 60)
+ML_QUEUE_BACKEND = getattr(settings, "ML_QUEUE_BACKEND", "sqs")
+# Scheduling: priority per task type (lower runs first), running jobs per task
+# type per worker process, and SQS messages held beyond the running ones
+ML_TASK_PRIORITY = getattr(
+    settings, "ML_TASK_PRIORITY", {"tag": 0, "transcription": 1, "summarization": 2}
+)
+ML_TASK_DEFAULT_PRIORITY = getattr(settings, "ML_TASK_DEFAULT_PRIORITY", 1)
+ML_TASK_CONCURRENCY = getattr(
+    settings, "ML_TASK_CONCURRENCY", {"transcription": 2, "summarization": 1}
+)
+ML_WORKER_PREFETCH = getattr(settings, "ML_WORKER_PREFETCH", 10)
+# Pause between claims while the database queue is empty
+ML_DB_QUEUE_POLL_INTERVAL = getattr(settings, "ML_DB_QUEUE_POLL_INTERVAL", 1)
+# Seconds between relays of outbox rows their request couldn't send (poll mode)
+ML_OUTBOX_RELAY_INTERVAL = getattr(settings, "ML_OUTBOX_RELAY_INTERVAL", 30)
 
 
 class MLWorkerService:
@@ -37,15 +76,26 @@ class MLWorkerService:
         self.summarizing_service = SummarizingService()
         self.transcribing_service = TranscribingService()
 
-    def _dispatch(self, body: dict):
+    def _dispatch(self, body: dict) -> bool:
         """
-        Shared dispatch logic for a single job payload.
+        Shared dispatch logic for a single job payload. Returns whether the
+        task succeeded.
+
+        Idempotent per job_id: a redelivered message (Lambda or SQS retry,
+        duplicate delivery) whose job already completed is acknowledged
+        without running the ML task again.
         """
         job_id = body.get("job_id")
         task_type = body.get("task_type")
         story_id = body.get("story_id", None)
         project_id = body.get("project_id", None)
 
+        if job_id and MLProcessingQueue.objects.filter(
+            job_id=job_id, status="completed"
+        ).exists():
+            logger.info("Skipping job_id=%s, already completed", job_id)
+            return True
+
         logger.info("Dispatching job_id=%s, type=%s", job_id, task_type)
 
         self._create_queue_entries(body, status="processing")
@@ -71,7 +121,7 @@ class MLWorkerService:
                 job_id,
             )
         self._create_queue_entries(body, status="completed" if success else "failed")
-
+        return bool(success)
 
     def _create_queue_entries(
         self, task_body: dict, status: str
@@ -90,17 +140,22 @@ class MLWorkerService:
             logger.error(f"Failed to create queue entry: {str(e)}")
             raise
 
-        #update the status of the task for existing task
-        entry, _ = MLProcessingQueue.objects.update_or_create(
-            story=story,
-            project=project,
-            task_type=task_body.get("task_type"),
-            defaults={
-                "status": status,
-                "timestamp": timezone.now(),
-            }
+        #update the status of the task for existing task; filter().update
+        #rather than update_or_create, which raises on duplicate entries
+        #written before QueueProducer reset them in place
+        entries = MLProcessingQueue.objects.filter(
+            story=story, project=project, task_type=task_body.get("task_type")
+        )
+        fields = {
+            "status": status,
+            "timestamp": timezone.now(),
+            "job_id": task_body.get("job_id") or "",
+        }
+        if entries.update(**fields):
+            return entries.first()
+        return MLProcessingQueue.objects.create(
+            story=story, project=project, task_type=task_body.get("task_type"), **fields
         )
-        return entry
 
     def process_messages(
         self, use_lambda: bool = False, event: dict = None, context=None
@@ -108,47 +163,452 @@ class MLWorkerService:
         """
         Entry point for processing ML tasks.
 
-        If use_lambda=True, handles an SQS-triggered Lambda event.
-        Otherwise, starts a long-poll loop on the configured SQS queue.
+        If use_lambda=True, handles an SQS-triggered Lambda event and returns
+        the partial batch response (the event source mapping needs
+        ReportBatchItemFailures), so Lambda only retries the failed records.
+        Otherwise, starts a long-poll loop on the configured SQS queue, or on
+        the MLJob table when ML_QUEUE_BACKEND is "database".
         """
         if use_lambda:
             # Lambda mode
             records = event.get("Records", []) if event else []
             logger.info("Lambda mode: processing %d records", len(records))
-            for record in records:
-                try:
-                    body = json.loads(record.get("body", "{}"))
-                    self._dispatch(body)
-                except Exception:
-                    logger.exception(
-                        "Failed to dispatch Lambda record %s", record.get("messageId")
-                    )
-                    raise
-            return {"status": "ok"}
+            return {"batchItemFailures": self._process_records(records)}
+
+        if ML_QUEUE_BACKEND == "database":
+            logger.info("Starting database queue loop")
+            self._poll_database()
+            return
 
         if not CT_SQS_QUEUE_URL:
             logger.error("CT_SQS_QUEUE_URL not set. Exiting.")
             return
         logger.info("Starting SQS poll loop on %s", CT_SQS_QUEUE_URL)
-        while True:
-            resp = sqs.receive_message(
-                QueueUrl=CT_SQS_QUEUE_URL,
-                MaxNumberOfMessages=10,
-                WaitTimeSeconds=20,
+        self._poll(get_shared("sqs_client"))
+
+    def _process_records(self, records: list) -> list:
+        """
+        Dispatch the records of one Lambda batch, returning the
+        batchItemFailures entries of those that failed. Once a record fails,
+        the later records of its message group are not run and are reported
+        as failed too, so a story's tasks are still retried in order.
+        """
+        failures = []
+        failed_groups = set()
+        for record in records:
+            message_id = record.get("messageId")
+            group = record.get("attributes", {}).get("MessageGroupId", message_id)
+            if group in failed_groups:
+                failures.append({"itemIdentifier": message_id})
+                continue
+            try:
+                success = self._dispatch(json.loads(record.get("body", "{}")))
+            except Exception:
+                logger.exception("Failed to dispatch Lambda record %s", message_id)
+                success = False
+            if not success:
+                failed_groups.add(group)
+                failures.append({"itemIdentifier": message_id})
+        if failures:
+            logger.warning("%d of %d records failed", len(failures), len(records))
+        return failures
+
+    def _process_message(
+        self, sqs, msg: dict, heartbeat: Optional["VisibilityHeartbeat"] = None
+    ) -> bool:
+        """
+        Dispatch one SQS message and delete it on success. Failed messages
+        are left on the queue and come back after the visibility timeout.
+        heartbeat is the one started when the message was received, if any.
+        """
+        receipt = msg.get("ReceiptHandle")
+        try:
+            body = json.loads(msg.get("Body", "{}"))
+            heartbeat = heartbeat or VisibilityHeartbeat(
+                sqs, receipt, body.get("task_type")
             )
-            messages = resp.get("Messages", [])
-            for msg in messages:
-                receipt = msg.get("ReceiptHandle")
+            with heartbeat:
+                success = self._dispatch(body)
+            if not success:
+                logger.warning(
+                    "Leaving failed job_id=%s on the queue", body.get("job_id")
+                )
+                return False
+            sqs.delete_message(QueueUrl=CT_SQS_QUEUE_URL, ReceiptHandle=receipt)
+            logger.info("Deleted message job_id=%s", body.get("job_id"))
+            return True
+        except Exception:
+            logger.exception("Failed to process message id=%s", msg.get("MessageId"))
+            return False
+        finally:
+            if heartbeat is not None:
+                heartbeat.stop()
+
+    def _poll(self, sqs, max_in_flight: Optional[int] = None):
+        """
+        Long-poll loop. Up to max_in_flight messages run at once on a thread
+        pool, chosen by FairScheduler; messages sharing a MessageGroupId (one
+        story) run one after the other in receive order, so transcription
+        still precedes tagging and summarization. Up to ML_WORKER_PREFETCH
+        more messages are received and held (kept invisible) so a small
+        org's tags can overtake a large import. The loop never sleeps while
+        messages are flowing. Every ML_OUTBOX_RELAY_INTERVAL seconds it also
+        sends outbox rows that their request failed to send.
+        """
+        max_in_flight = max_in_flight or ML_WORKER_MAX_IN_FLIGHT
+        scheduler = FairScheduler(
+            max_in_flight,
+            partial(
+                self._run_in_thread, lambda item: self._process_message(sqs, *item)
+            ),
+            type_caps=ML_TASK_CONCURRENCY,
+            prefetch=ML_WORKER_PREFETCH,
+        )
+        next_relay = time.monotonic()
+        try:
+            while True:
+                if time.monotonic() >= next_relay:
+                    next_relay = time.monotonic() + ML_OUTBOX_RELAY_INTERVAL
+                    self._relay_outbox(sqs)
+                free = scheduler.wait_for_capacity()
                 try:
-                    body = json.loads(msg.get("Body", "{}"))
-                    self._dispatch(body)
-                    sqs.delete_message(QueueUrl=CT_SQS_QUEUE_URL, ReceiptHandle=receipt)
-                    logger.info("Deleted message job_id=%s", body.get("job_id"))
+                    resp = sqs.receive_message(
+                        QueueUrl=CT_SQS_QUEUE_URL,
+                        MaxNumberOfMessages=min(10, free),
+                        WaitTimeSeconds=20,
+                        AttributeNames=["MessageGroupId"],
+                    )
                 except Exception:
-                    logger.exception(
-                        "Failed to process message id=%s", msg.get("MessageId")
+                    logger.exception("Failed to receive messages")
+                    time.sleep(ML_WORKER_ERROR_BACKOFF)
+                    continue
+                for msg in resp.get("Messages", []):
+                    group = msg.get("Attributes", {}).get(
+                        "MessageGroupId", msg.get("MessageId")
                     )
-            time.sleep(1)
+                    try:
+                        body = json.loads(msg.get("Body", "{}"))
+                    except ValueError:
+                        body = {}
+                    # Held messages must stay invisible too, not only running ones
+                    heartbeat = VisibilityHeartbeat(
+                        sqs, msg.get("ReceiptHandle"), body.get("task_type")
+                    ).start()
+                    scheduler.submit(group, (msg, heartbeat), **schedule_info(body))
+        finally:
+            scheduler.shutdown()
+
+    def _relay_outbox(self, sqs) -> None:
+        try:
+            relay_outbox(sqs, CT_SQS_QUEUE_URL)
+        except Exception:
+            logger.exception("Failed to relay outbox messages")
+            close_old_connections()
+
+    def _process_job(self, job) -> bool:
+        """
+        Run one claimed MLJob, keeping its lease alive meanwhile, then mark it
+        done or schedule its retry.
+        """
+        task_type = job.body.get("task_type")
+        error = ""
+        try:
+            with LeaseHeartbeat(job, task_type):
+                success = self._dispatch(job.body)
+        except Exception as e:
+            logger.exception("Failed to process job_id=%s", job.job_id)
+            success, error = False, str(e)
+        if success:
+            complete_job(job)
+        else:
+            fail_job(job, error or f"{task_type} task failed")
+        return success
+
+    def _poll_database(self, max_in_flight: Optional[int] = None):
+        """
+        Claim loop for the database queue, the counterpart of _poll. Only the
+        oldest unfinished job of each story is claimable, so per-story order
+        holds across any number of worker processes. Priority and per-org
+        fair share are applied by the claim itself; capped task types are
+        only claimed while this worker has room for them.
+        """
+        max_in_flight = max_in_flight or ML_WORKER_MAX_IN_FLIGHT
+        scheduler = FairScheduler(
+            max_in_flight,
+            partial(self._run_in_thread, self._process_job),
+            type_caps=ML_TASK_CONCURRENCY,
+        )
+        try:
+            while True:
+                free = scheduler.wait_for_capacity()
+                try:
+                    jobs = claim_jobs(free, type_limits=scheduler.free_by_type())
+                except Exception:
+                    logger.exception("Failed to claim jobs")
+                    close_old_connections()
+                    time.sleep(ML_WORKER_ERROR_BACKOFF)
+                    continue
+                if not jobs:
+                    time.sleep(ML_DB_QUEUE_POLL_INTERVAL)
+                    continue
+                for job in jobs:
+                    scheduler.submit(
+                        job.group_id,
+                        job,
+                        task_type=job.task_type or job.body.get("task_type"),
+                        priority=job.priority,
+                        org=job.org_id,
+                    )
+        finally:
+            scheduler.shutdown()
+
+    def _run_in_thread(self, process: Callable[[Any], bool], item) -> bool:
+        # Worker threads get their own DB connections; drop them between jobs
+        close_old_connections()
+        try:
+            return process(item)
+        finally:
+            close_old_connections()
+
+
+def expected_seconds(task_type: Optional[str]) -> int:
+    return ML_TASK_EXPECTED_SECONDS.get(task_type, ML_TASK_DEFAULT_EXPECTED_SECONDS)
+
+
+def schedule_info(body: dict) -> Dict[str, Any]:
+    # FairScheduler.submit arguments for a queue message body
+    task_type = body.get("task_type")
+    return {
+        "task_type": task_type,
+        "priority": body.get(
+            "priority", ML_TASK_PRIORITY.get(task_type, ML_TASK_DEFAULT_PRIORITY)
+        ),
+        "org": body.get("org_id"),
+    }
+
+
+class VisibilityHeartbeat:
+    """
+    Keeps an SQS message invisible while its job runs, so a job that outlives
+    the queue's visibility timeout is not picked up and run again by another
+    worker.
+
+    On entry the visibility is set to the task type's expected duration; a
+    background thread then pushes it out by that much again every half
+    duration. Extensions stop once the message has been held for
+    ML_VISIBILITY_MAX_SECONDS, after which a stuck job's message is released
+    to be retried.
+    """
+
+    def __init__(self, sqs, receipt_handle: str, task_type: Optional[str]):
+        self.sqs = sqs
+        self.receipt_handle = receipt_handle
+        self.extension = min(expected_seconds(task_type), ML_VISIBILITY_MAX_SECONDS)
+        self.interval = max(self.extension / 2, 1)
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = False
+
+    def _extend(self, seconds: int) -> bool:
+        try:
+            self.sqs.change_message_visibility(
+                QueueUrl=CT_SQS_QUEUE_URL,
+                ReceiptHandle=self.receipt_handle,
+                VisibilityTimeout=int(seconds),
+            )
+            return True
+        except Exception:
+            logger.exception("Failed to extend message visibility")
+            return False
+
+    def _run(self) -> None:
+        started = time.monotonic()
+        while not self._stop.wait(self.interval):
+            remaining = ML_VISIBILITY_MAX_SECONDS - (time.monotonic() - started)
+            if remaining < 1 or not self._extend(min(self.extension, remaining)):
+                logger.warning(
+                    "Stopped heartbeat after %ds", time.monotonic() - started
+                )
+                return
+
+    def start(self) -> "VisibilityHeartbeat":
+        # Idempotent, so a heartbeat started on receive can be entered later
+        if self._started:
+            return self
+        self._started = True
+        if self.receipt_handle and self._extend(self.extension):
+            self._thread = threading.Thread(
+                target=self._run, name="ml-heartbeat", daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+class LeaseHeartbeat(VisibilityHeartbeat):
+    """VisibilityHeartbeat for database queue jobs: extends the job's lease."""
+
+    def __init__(self, job, task_type: Optional[str]):
+        super().__init__(None, job.job_id, task_type)
+        self.job = job
+
+    def _extend(self, seconds: int) -> bool:
+        try:
+            return extend_lease(self.job, int(seconds))
+        except Exception:
+            logger.exception("Failed to extend job lease")
+            return False
+
+    def _run(self) -> None:
+        try:
+            super()._run()
+        finally:
+            connection.close()
+
+
+class FairScheduler:
+    """
+    Bounded thread pool that decides which accepted item runs next.
+
+    - Items of the same group (story) run one at a time, in submission order.
+    - Among the runnable group heads, the lowest priority goes first, then
+      the org with the fewest running items, then the org served least
+      recently (round-robin), then the oldest item.
+    - type_caps limits how many items of a task type run at once, so long
+      transcriptions can't occupy every slot.
+
+    Up to prefetch items beyond max_in_flight are accepted and held, to have
+    something to choose from.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        handler: Callable[[Any], bool],
+        type_caps: Optional[Dict[str, int]] = None,
+        prefetch: int = 0,
+    ):
+        self.max_in_flight = max_in_flight
+        self.handler = handler
+        self.type_caps = dict(type_caps or {})
+        self.prefetch = prefetch
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="ml-worker"
+        )
+        # group -> deque of (seq, item, task_type, priority, org)
+        self._pending: Dict[str, deque] = {}
+        self._running_groups = set()
+        self._accepted = 0
+        self._accepted_by_type = Counter()
+        self._running = 0
+        self._running_by_type = Counter()
+        self._running_by_org = Counter()
+        self._last_served: Dict[Any, int] = {}
+        self._seq = count()
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def wait_for_capacity(self) -> int:
+        # Blocks until another item can be accepted; returns how many can
+        limit = self.max_in_flight + self.prefetch
+        with self._cond:
+            while self._accepted >= limit:
+                self._cond.wait()
+            return limit - self._accepted
+
+    def free_by_type(self) -> Dict[str, int]:
+        # Items of each capped task type that would still start right away
+        with self._cond:
+            return {
+                task_type: cap - self._accepted_by_type[task_type]
+                for task_type, cap in self.type_caps.items()
+            }
+
+    def submit(
+        self,
+        group: str,
+        item: Any,
+        task_type: Optional[str] = None,
+        priority: int = 0,
+        org: Any = None,
+    ) -> None:
+        with self._cond:
+            self._accepted += 1
+            self._accepted_by_type[task_type] += 1
+            self._pending.setdefault(group, deque()).append(
+                (next(self._seq), item, task_type, priority, org)
+            )
+            self._schedule()
+
+    def _pick(self):
+        best = None
+        for group, queue in self._pending.items():
+            if group in self._running_groups:
+                continue
+            seq, _, task_type, priority, org = queue[0]
+            cap = self.type_caps.get(task_type)
+            if cap is not None and self._running_by_type[task_type] >= cap:
+                continue
+            key = (
+                priority,
+                self._running_by_org[org],
+                self._last_served.get(org, -1),
+                seq,
+            )
+            if best is None or key < best[0]:
+                best = (key, group)
+        return None if best is None else best[1]
+
+    def _schedule(self) -> None:
+        # Start items while there are free slots; called with the lock held
+        while not self._closed and self._running < self.max_in_flight:
+            group = self._pick()
+            if group is None:
+                return
+            entry = self._pending[group].popleft()
+            _, _, task_type, _, org = entry
+            self._running_groups.add(group)
+            self._running += 1
+            self._running_by_type[task_type] += 1
+            self._running_by_org[org] += 1
+            self._last_served[org] = next(self._seq)
+            self._pool.submit(self._run, group, entry)
+
+    def _run(self, group: str, entry: tuple) -> None:
+        _, item, task_type, _, org = entry
+        try:
+            self.handler(item)
+        except Exception:
+            logger.exception("Unhandled error in ML worker thread")
+        finally:
+            with self._cond:
+                self._running_groups.discard(group)
+                if not self._pending[group]:
+                    del self._pending[group]
+                self._running -= 1
+                self._running_by_type[task_type] -= 1
+                self._running_by_org[org] -= 1
+                self._accepted -= 1
+                self._accepted_by_type[task_type] -= 1
+                self._schedule()
+                self._cond.notify_all()
+
+    def shutdown(self) -> None:
+        # Running items finish; held ones are left for their queue to redeliver
+        with self._cond:
+            self._closed = True
+        self._pool.shutdown(wait=True)
 
 
 if __name__ == "__main__":
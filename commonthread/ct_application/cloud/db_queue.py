@@ -0,0 +1,184 @@
+"""
+Database-backed ML job queue (the "database" ML_QUEUE_BACKEND).
+
+A stand-in for SQS for local runs, benchmarks and small deployments: the
+producer writes MLJob rows inside the story's transaction and
+MLWorkerService claims them with SELECT ... FOR UPDATE SKIP LOCKED.
+
+- Jobs of one group (story) run one at a time, in id order: only the oldest
+  unfinished job of a group can be claimed.
+- A claimed job holds a lease; the worker extends it while the job runs. A
+  job whose lease expires (crashed worker) is claimed again.
+- Failed jobs are retried with exponential backoff up to
+  ML_DB_QUEUE_MAX_ATTEMPTS attempts, then marked failed, which releases the
+  rest of their group.
+- Claims go by priority, then fair share: within a priority, orgs with the
+  fewest running jobs come first, and an org's jobs interleave with other
+  orgs' rather than running as one block.
+
+The attempts counter doubles as a fencing token: a worker whose lease expired
+and whose job was claimed again can no longer extend, complete or fail it.
+"""
+
+import logging
+from datetime import timedelta
+from typing import Dict, List, Optional
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Value, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.utils import timezone
+from ct_application.models import MLJob
+
+logger = logging.getLogger(__name__)
+
+ML_DB_QUEUE_LEASE_SECONDS = getattr(settings, "ML_DB_QUEUE_LEASE_SECONDS", 300)
+ML_DB_QUEUE_MAX_ATTEMPTS = getattr(settings, "ML_DB_QUEUE_MAX_ATTEMPTS", 3)
+ML_DB_QUEUE_RETRY_BACKOFF = getattr(settings, "ML_DB_QUEUE_RETRY_BACKOFF", 30)
+
+# Ranked candidates fetched per claimed job, to make up for rows another
+# worker locks first
+CLAIM_WINDOW = 4
+
+UNFINISHED = ("pending", "running")
+
+
+def _runnable(now):
+    earlier_unfinished = MLJob.objects.filter(
+        group_id=OuterRef("group_id"),
+        id__lt=OuterRef("id"),
+        status__in=UNFINISHED,
+    )
+    runnable = Q(status="pending", available_at__lte=now) | Q(
+        status="running", lease_expires_at__lt=now
+    )
+    return MLJob.objects.filter(runnable).filter(~Exists(earlier_unfinished))
+
+
+def _ranked_candidates(now, limit: int, type_limits: Dict[str, int]) -> List[int]:
+    """
+    Ids of runnable jobs in claim order: priority first, then
+    (jobs the org already has running + the job's place in the org's own
+    queue), i.e. round-robin across orgs weighted by their current load.
+    """
+    running = (
+        MLJob.objects.filter(
+            org_id=OuterRef("org_id"), status="running", lease_expires_at__gte=now
+        )
+        .order_by()
+        .values("org_id")
+        .annotate(n=Count("id"))
+        .values("n")
+    )
+    candidates = (
+        _runnable(now)
+        .exclude(task_type__in=[t for t, free in type_limits.items() if free <= 0])
+        .annotate(
+            org_running=Coalesce(Subquery(running), Value(0)),
+            org_rank=Window(
+                RowNumber(),
+                partition_by=[F("org_id")],
+                order_by=[F("priority").asc(), F("id").asc()],
+            ),
+        )
+        .order_by("priority", F("org_rank") + F("org_running"), "id")
+        .values_list("id", "task_type")[: limit * CLAIM_WINDOW]
+    )
+    free = dict(type_limits)
+    picked = []
+    for job_id, task_type in candidates:
+        if task_type in free:
+            if free[task_type] <= 0:
+                continue
+            free[task_type] -= 1
+        picked.append(job_id)
+    return picked
+
+
+def claim_jobs(
+    limit: int,
+    lease_seconds: int = ML_DB_QUEUE_LEASE_SECONDS,
+    max_attempts: int = ML_DB_QUEUE_MAX_ATTEMPTS,
+    type_limits: Optional[Dict[str, int]] = None,
+) -> List[MLJob]:
+    """
+    Lease up to limit runnable jobs, at most one per group, in priority and
+    fair-share order. type_limits caps how many jobs of a task type may be
+    claimed (the worker's free slots for capped types).
+    Jobs that already used up their attempts (their worker kept dying) are
+    marked failed instead of being returned.
+    """
+    now = timezone.now()
+    order = _ranked_candidates(now, limit, type_limits or {})
+    if not order:
+        return []
+    with transaction.atomic():
+        # FOR UPDATE can't be combined with the window function, so lock the
+        # ranked ids in a second query and re-check that they are runnable
+        locked = {
+            job.id: job
+            for job in _runnable(now)
+            .select_for_update(skip_locked=True)
+            .filter(id__in=order)
+        }
+        jobs = [locked[job_id] for job_id in order if job_id in locked][:limit]
+        claimed, exhausted = [], []
+        for job in jobs:
+            if job.attempts >= max_attempts:
+                job.status = "failed"
+                job.last_error = job.last_error or "lease expired"
+                exhausted.append(job)
+                continue
+            job.status = "running"
+            job.attempts += 1
+            job.lease_expires_at = now + timedelta(seconds=lease_seconds)
+            claimed.append(job)
+        MLJob.objects.bulk_update(
+            claimed + exhausted,
+            ["status", "attempts", "lease_expires_at", "last_error"],
+        )
+    for job in exhausted:
+        logger.error("Job %s gave up after %d attempts", job.job_id, job.attempts)
+    return claimed
+
+
+def _owned(job: MLJob):
+    return MLJob.objects.filter(id=job.id, status="running", attempts=job.attempts)
+
+
+def extend_lease(job: MLJob, seconds: int) -> bool:
+    """Push the lease out to now + seconds; False if the job is no longer ours."""
+    return bool(
+        _owned(job).update(lease_expires_at=timezone.now() + timedelta(seconds=seconds))
+    )
+
+
+def complete_job(job: MLJob) -> bool:
+    return bool(_owned(job).update(status="done", lease_expires_at=None))
+
+
+def fail_job(
+    job: MLJob,
+    error: str = "",
+    max_attempts: int = ML_DB_QUEUE_MAX_ATTEMPTS,
+    backoff: int = ML_DB_QUEUE_RETRY_BACKOFF,
+) -> bool:
+    """
+    Schedule a retry after backoff * 2**(attempts - 1) seconds, or mark the
+    job failed once it has used max_attempts.
+    """
+    if job.attempts >= max_attempts:
+        updated = _owned(job).update(
+            status="failed", lease_expires_at=None, last_error=error
+        )
+        logger.error("Job %s failed after %d attempts", job.job_id, job.attempts)
+    else:
+        delay = backoff * 2 ** max(job.attempts - 1, 0)
+        updated = _owned(job).update(
+            status="pending",
+            lease_expires_at=None,
+            available_at=timezone.now() + timedelta(seconds=delay),
+            last_error=error,
+        )
+        logger.warning("Job %s failed, retrying in %ds", job.job_id, delay)
+    return bool(updated)
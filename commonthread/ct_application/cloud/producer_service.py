@@ -4,22 +4,47 @@ Producer Service for Machine Learning Task Queue Management
 1. Adds tasks to the queue
 2. Creates metadata entries for the tasks
 
+SQS messages go through an outbox: SQSStrategy writes MLOutbox rows inside
+the story's transaction and relay_outbox sends them with send_message_batch
+once it commits. A rollback therefore never leaves orphaned messages, and no
+network call happens while a transaction is open. Rows a request couldn't
+send (SQS unreachable) are picked up by the SQS worker's periodic relay or
+the relay_outbox command.
+
+With ML_QUEUE_BACKEND = "database" tasks go to the MLJob table instead (see
+db_queue.py) and no AWS access is needed.
 """
 
 import boto3
 import json
 import logging
-from datetime import datetime, timezone, UTC
+from datetime import datetime, timedelta, timezone, UTC
 from django.conf import settings
 from django.db import transaction
-from typing import Dict, List
+from django.db.models import Exists, F, OuterRef, Q
+from typing import Dict, Iterable, List, Optional
 from abc import ABC, abstractmethod
-from ct_application.models import Story, MLProcessingQueue
+from django.utils import timezone as dj_timezone
+from ct_application.models import Story, MLProcessingQueue, MLOutbox, MLJob
 from commonthread.settings import CT_SQS_QUEUE_URL
+from ct_application.registry import get_shared
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# send_message_batch accepts at most 10 entries
+SQS_BATCH_SIZE = 10
+# "sqs" or "database"
+ML_QUEUE_BACKEND = getattr(settings, "ML_QUEUE_BACKEND", "sqs")
+# Scheduling priority per task type, lower runs first (see consumer_service)
+ML_TASK_PRIORITY = getattr(
+    settings, "ML_TASK_PRIORITY", {"tag": 0, "transcription": 1, "summarization": 2}
+)
+ML_TASK_DEFAULT_PRIORITY = getattr(settings, "ML_TASK_DEFAULT_PRIORITY", 1)
+# How long a relay may take to send the rows it claimed before another relay
+# may claim them again
+ML_OUTBOX_LEASE_SECONDS = getattr(settings, "ML_OUTBOX_LEASE_SECONDS", 60)
+
 
 class MLTask:
     """
@@ -29,12 +54,24 @@ class MLTask:
         task_type (str): Type of ML task to be performed
         enabled (bool): Whether the task is currently enabled
         story_level (bool): Whether the task operates at story level
+        priority (int): Scheduling priority for workers, lower runs first
     """
 
-    def __init__(self, task_type: str, enabled: bool = True, story_level: bool = True):
+    def __init__(
+        self,
+        task_type: str,
+        enabled: bool = True,
+        story_level: bool = True,
+        priority: Optional[int] = None,
+    ):
         self.task_type = task_type
         self.enabled = enabled
         self.story_level = story_level
+        self.priority = (
+            ML_TASK_PRIORITY.get(task_type, ML_TASK_DEFAULT_PRIORITY)
+            if priority is None
+            else priority
+        )
 
 
 class QueueStrategy(ABC):
@@ -58,70 +95,253 @@ class QueueStrategy(ABC):
         pass
 
 
+def build_messages(tasks: List[MLTask], story: Story) -> List[Dict]:
+    """
+    The queue message for each task, in task order. Messages of one story
+    share a group id so workers run them in order; the deduplication id
+    sorts transcription before the tasks that need its text. priority and
+    org_id let workers schedule fairly across task types and orgs.
+    """
+    messages = []
+    for task in tasks:
+        job_id = f"{story.id}_{task.task_type}_{datetime.now(UTC).timestamp()}"
+        body = {
+            "job_id": job_id,
+            "project_id": story.proj.id,
+            "task_type": task.task_type,
+            "priority": task.priority,
+            "org_id": story.proj.org_id,
+        }
+
+        if task.story_level:
+            body["story_id"] = story.id
+
+        sequence_prefix = "1" if task.task_type == "transcription" else "2"
+        messages.append(
+            {
+                "task_type": task.task_type,
+                "job_id": job_id,
+                "body": body,
+                "group_id": f"{story.id}",
+                "deduplication_id": f"{sequence_prefix}_{job_id}",
+            }
+        )
+    return messages
+
+
+def build_queue_strategy() -> "QueueStrategy":
+    """Queue strategy for ML_QUEUE_BACKEND (the registry's "queue" factory)."""
+    if ML_QUEUE_BACKEND == "database":
+        return DatabaseQueueStrategy()
+    return SQSStrategy()
+
+
+def build_sqs_client():
+    """SQS client shared by the producer and the ML worker (see registry)."""
+    try:
+        return boto3.client(
+            "sqs",
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_S3_REGION_NAME or "us-east-1",
+        )
+    except Exception as e:
+        logger.error(f"Failed to initialize SQS client: {str(e)}")
+        raise
+
+
 class SQSStrategy(QueueStrategy):
     """AWS SQS implementation of the queue strategy."""
 
     def __init__(self):
-        """Initialize SQS client with AWS credentials."""
+        """Use the process-wide SQS client."""
+        self.sqs = get_shared("sqs_client")
+        self.queue_url = CT_SQS_QUEUE_URL
+
+    def add_to_queue(self, tasks: List[MLTask], story: Story) -> Dict:
+        """
+        Add tasks to the SQS outbox; they are sent once the surrounding
+        transaction commits.
+
+        Args:
+            tasks: List of MLTask objects to be queued
+            story: Story object associated with the tasks
+
+        Returns:
+            Dict containing success status and job IDs
+        """
         try:
-            self.sqs = boto3.client(
-                "sqs",
-                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_S3_REGION_NAME,
+            messages = build_messages(tasks, story)
+            entries = [
+                MLOutbox(
+                    job_id=m["job_id"],
+                    body=m["body"],
+                    group_id=m["group_id"],
+                    deduplication_id=m["deduplication_id"],
+                )
+                for m in messages
+            ]
+            task_ids = {m["task_type"]: m["job_id"] for m in messages}
+
+            MLOutbox.objects.bulk_create(entries)
+            ids = [entry.id for entry in entries]
+            # Only this story's rows; older leftovers are the periodic relay's
+            transaction.on_commit(
+                lambda: relay_outbox(self.sqs, self.queue_url, ids=ids), robust=True
             )
-            self.queue_url = CT_SQS_QUEUE_URL
+            logger.info(f"Queued {len(entries)} tasks for story {story.id} in outbox")
+            return {"success": True, "task_ids": task_ids}
+
         except Exception as e:
-            logger.error(f"Failed to initialize SQS client: {str(e)}")
-            raise
+            error_msg = (
+                f"Failed to add tasks to SQS outbox for story {story.id}: {str(e)}"
+            )
+            logger.error(error_msg)
+            return {"success": False, "error": error_msg}
+
+
+def _claim_outbox(
+    limit: int, lease_seconds: int, ids: Optional[List[int]] = None
+) -> List[MLOutbox]:
+    """
+    Lease up to limit unsent rows in id order and commit, so the rows are not
+    locked while they are sent. A row is skipped while an earlier unsent row
+    of its group is leased by another relay (or, with ids, isn't one of ids),
+    so a story's messages still reach SQS in order.
+    """
+    now = dj_timezone.now()
+    earlier_blocked = MLOutbox.objects.filter(
+        group_id=OuterRef("group_id"), id__lt=OuterRef("id"), sent_at__isnull=True
+    )
+    blocked = Q(lease_expires_at__gte=now)
+    rows = MLOutbox.objects.filter(sent_at__isnull=True).filter(
+        Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+    )
+    if ids is not None:
+        blocked |= ~Q(id__in=ids)
+        rows = rows.filter(id__in=ids)
+    rows = rows.filter(~Exists(earlier_blocked.filter(blocked)))
+    with transaction.atomic():
+        claimed = list(
+            rows.select_for_update(skip_locked=True).order_by("id")[:limit]
+        )
+        MLOutbox.objects.filter(id__in=[row.id for row in claimed]).update(
+            lease_expires_at=now + timedelta(seconds=lease_seconds)
+        )
+    return claimed
+
+
+def relay_outbox(
+    sqs=None,
+    queue_url: str = CT_SQS_QUEUE_URL,
+    max_batches=None,
+    ids: Optional[Iterable[int]] = None,
+    lease_seconds: int = ML_OUTBOX_LEASE_SECONDS,
+) -> int:
+    """
+    Send unsent MLOutbox rows (all of them, or only those of ids) to SQS in
+    id order, SQS_BATCH_SIZE per send_message_batch call.
+
+    Each batch is claimed with SKIP LOCKED and leased in its own short
+    transaction, then sent with no transaction open, then marked sent. Several
+    relays (request threads, the SQS worker, the relay_outbox command) thus
+    never send a row at the same time. Failed entries stay unsent with their
+    error recorded and are retried by a later relay. A relay that dies
+    between sending and marking leaves the lease to expire, and the row is
+    sent again: SQS drops the copy within its deduplication window, and
+    workers skip jobs that already completed.
+
+    Returns the number of messages sent.
+    """
+    sqs = sqs or get_shared("sqs_client")
+    ids = None if ids is None else list(ids)
+    sent = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = _claim_outbox(SQS_BATCH_SIZE, lease_seconds, ids)
+        if not rows:
+            break
+        batches += 1
+        try:
+            response = sqs.send_message_batch(
+                QueueUrl=queue_url,
+                Entries=[
+                    {
+                        "Id": str(row.id),
+                        "MessageBody": json.dumps(row.body),
+                        "MessageGroupId": row.group_id,
+                        "MessageDeduplicationId": row.deduplication_id,
+                    }
+                    for row in rows
+                ],
+            )
+        except Exception as e:
+            logger.error(f"Failed to relay {len(rows)} outbox messages: {str(e)}")
+            MLOutbox.objects.filter(id__in=[row.id for row in rows]).update(
+                attempts=F("attempts") + 1,
+                last_error=str(e)[:1000],
+                lease_expires_at=None,
+            )
+            break
+
+        sent_ids = [int(entry["Id"]) for entry in response.get("Successful", [])]
+        MLOutbox.objects.filter(id__in=sent_ids).update(
+            sent_at=dj_timezone.now(), lease_expires_at=None
+        )
+        for failure in response.get("Failed", []):
+            MLOutbox.objects.filter(id=int(failure["Id"])).update(
+                attempts=F("attempts") + 1,
+                last_error=failure.get("Message", failure.get("Code", "")),
+                lease_expires_at=None,
+            )
+        sent += len(sent_ids)
+        if response.get("Failed"):
+            # Keep per-story order: retry the failed ones before newer rows
+            break
+    if sent:
+        logger.info(f"Relayed {sent} outbox messages to SQS")
+    return sent
+
+
+class DatabaseQueueStrategy(QueueStrategy):
+    """
+    Queue strategy backed by the MLJob table, consumed by MLWorkerService in
+    database mode. Jobs are written in the caller's transaction, so they only
+    become visible to workers once the story commits.
+    """
 
     def add_to_queue(self, tasks: List[MLTask], story: Story) -> Dict:
         """
-        Add tasks to SQS queue.
+        Add tasks to the database job queue.
 
         Args:
             tasks: List of MLTask objects to be queued
             story: Story object associated with the tasks
 
         Returns:
-            Dict containing success status and task IDs
-
-        Raises:
-            Exception: If there's an error sending messages to SQS
+            Dict containing success status and job IDs
         """
-        task_ids = {}
-
         try:
-            for task in tasks:
-                job_id = f"{story.id}_{task.task_type}_{datetime.now(UTC).timestamp()}"
-                message = {
-                    "job_id": job_id,
-                    "project_id": story.proj.id,
-                    "task_type": task.task_type,
-                }
-
-                if task.story_level:
-                    message["story_id"] = story.id
-
-                message_group_id = f"{story.id}"
-                sequence_prefix = "1" if task.task_type == "transcription" else "2"
-                deduplication_id = f"{sequence_prefix}_{job_id}"
-                
-                response = self.sqs.send_message(
-                    QueueUrl=self.queue_url,
-                    MessageBody=json.dumps(message),
-                    MessageGroupId=message_group_id, 
-                    MessageDeduplicationId=deduplication_id
+            messages = build_messages(tasks, story)
+            MLJob.objects.bulk_create(
+                MLJob(
+                    job_id=m["job_id"],
+                    body=m["body"],
+                    group_id=m["group_id"],
+                    task_type=m["task_type"],
+                    priority=m["body"]["priority"],
+                    org_id=m["body"]["org_id"],
                 )
-                task_ids[task.task_type] = response["MessageId"]
-                logger.info(
-                    f"Successfully queued task {task.task_type} for story {story.id}"
-                )
-            return {"success": True, "task_ids": task_ids}
-        
+                for m in messages
+            )
+            logger.info(f"Queued {len(messages)} database jobs for story {story.id}")
+            return {
+                "success": True,
+                "task_ids": {m["task_type"]: m["job_id"] for m in messages},
+            }
         except Exception as e:
             error_msg = (
-                f"Failed to add tasks to SQS queue for story {story.id}: {str(e)}"
+                f"Failed to add tasks to database queue for story {story.id}: {str(e)}"
             )
             logger.error(error_msg)
             return {"success": False, "error": error_msg}
@@ -166,22 +386,29 @@ class QueueProducer:
         tasks: Dictionary of available ML tasks
     """
 
-    def __init__(self, queue_strategy: QueueStrategy = SQSStrategy()):
+    def __init__(self, queue_strategy: Optional[QueueStrategy] = None):
         """
         Initialize QueueProducer with a queue strategy.
 
         Args:
-            queue_strategy: Strategy object for queue implementation (defaults to SQS)
+            queue_strategy: Strategy object for queue implementation (defaults
+                to the shared "queue" instance, SQS, built on first use)
         """
-        self.queue_strategy = queue_strategy
+        self._queue_strategy = queue_strategy
         self.tasks = {
             "transcription": MLTask("transcription"),
             "summarization": MLTask("summarization"),
             "tag": MLTask("tag")
         }
-        logger.info(
-            "QueueProducer initialized with %s", queue_strategy.__class__.__name__
-        )
+
+    @property
+    def queue_strategy(self) -> QueueStrategy:
+        if self._queue_strategy is None:
+            self._queue_strategy = get_shared("queue")
+            logger.info(
+                "QueueProducer using %s", self._queue_strategy.__class__.__name__
+            )
+        return self._queue_strategy
 
     def enable_task(self, task_type: str) -> None:
         """Enable a specific task type."""
@@ -207,28 +434,37 @@ class QueueProducer:
         self, enabled_tasks: List[MLTask], story: Story
     ) -> List[MLProcessingQueue]:
         """
-        Create database entries for queued tasks.
+        Create database entries for queued tasks. A task queued again (e.g.
+        summarization after a text edit) resets the story's existing entry,
+        so there is one entry per story, project and task type.
 
         Args:
             enabled_tasks: List of enabled MLTask objects
             story: Story object associated with the tasks
 
         Returns:
-            List of created MLProcessingQueue objects
+            List of newly created MLProcessingQueue objects
 
         Raises:
             Exception: If database operation fails
         """
         try:
+            now = datetime.now(UTC)
             entries = []
             for task in enabled_tasks:
+                task_story = story if task.story_level else None
+                reset = MLProcessingQueue.objects.filter(
+                    story=task_story, project=story.proj, task_type=task.task_type
+                ).update(status="initialized", timestamp=now, job_id="")
+                if reset:
+                    continue
                 entries.append(
                     MLProcessingQueue(
-                        story=story if task.story_level else None,
+                        story=task_story,
                         project=story.proj,
                         task_type=task.task_type,
                         status="initialized",
-                        timestamp=datetime.now(UTC),
+                        timestamp=now,
                     )
                 )
             return MLProcessingQueue.objects.bulk_create(entries)
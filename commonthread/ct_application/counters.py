@@ -0,0 +1,112 @@
+"""
+Denormalized story/project counters on Organization and Project.
+
+Views that add or remove stories and projects call these helpers inside their
+transaction. Counters are moved with F() expressions so concurrent writers
+never lose an update. reconcile_counts recomputes them from the tables and is
+run by `manage.py reconcile_counts` to repair any drift.
+"""
+
+import logging
+from typing import Iterable, Optional
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import Organization, Project, Story
+
+logger = logging.getLogger(__name__)
+
+
+def story_added(project_id, org_id) -> None:
+    Project.objects.filter(id=project_id).update(story_count=F("story_count") + 1)
+    Organization.objects.filter(id=org_id).update(story_count=F("story_count") + 1)
+
+
+def _minus(field: str, amount):
+    # Drifted counters are clamped at 0 rather than violating the unsigned column
+    return Greatest(F(field) - amount, Value(0))
+
+
+def story_removed(project_id, org_id) -> None:
+    Project.objects.filter(id=project_id).update(story_count=_minus("story_count", 1))
+    Organization.objects.filter(id=org_id).update(story_count=_minus("story_count", 1))
+
+
+def project_added(org_id) -> None:
+    Organization.objects.filter(id=org_id).update(project_count=F("project_count") + 1)
+
+
+@transaction.atomic
+def project_removed(project_id) -> None:
+    """
+    Call before deleting the project. The project row is locked so a story
+    created concurrently cannot change story_count between the read and the
+    org update.
+    """
+    project = (
+        Project.objects.select_for_update()
+        .only("org_id", "story_count")
+        .filter(id=project_id)
+        .first()
+    )
+    if project is None:
+        return
+    Organization.objects.filter(id=project.org_id).update(
+        project_count=_minus("project_count", 1),
+        story_count=_minus("story_count", project.story_count),
+    )
+
+
+def _count_of(queryset, group_field: str):
+    # Correlated COUNT subquery, 0 when the group has no rows
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{group_field: OuterRef("pk")})
+            .order_by()
+            .values(group_field)
+            .annotate(n=Count("id"))
+            .values("n")
+        ),
+        Value(0),
+    )
+
+
+@transaction.atomic
+def reconcile_counts(org_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recompute the counters of the given orgs (all orgs by default) and their
+    projects from the Project/Story tables. Returns the number of projects and
+    orgs whose stored counts were wrong.
+    """
+    orgs = Organization.objects.all()
+    projects = Project.objects.all()
+    if org_ids is not None:
+        orgs = orgs.filter(id__in=org_ids)
+        projects = projects.filter(org_id__in=org_ids)
+
+    drifted = 0
+    project_drift = projects.annotate(
+        actual=_count_of(Story.objects.all(), "proj")
+    ).exclude(story_count=F("actual"))
+    for project_id, actual in project_drift.values_list("id", "actual"):
+        Project.objects.filter(id=project_id).update(story_count=actual)
+        drifted += 1
+
+    org_drift = (
+        orgs.annotate(
+            actual_projects=_count_of(Project.objects.all(), "org"),
+            actual_stories=_count_of(Story.objects.all(), "proj__org"),
+        )
+        .exclude(project_count=F("actual_projects"), story_count=F("actual_stories"))
+    )
+    for org_id, actual_projects, actual_stories in org_drift.values_list(
+        "id", "actual_projects", "actual_stories"
+    ):
+        Organization.objects.filter(id=org_id).update(
+            project_count=actual_projects, story_count=actual_stories
+        )
+        drifted += 1
+
+    if drifted:
+        logger.info("Reconciled %d drifted project/org counters", drifted)
+    return drifted
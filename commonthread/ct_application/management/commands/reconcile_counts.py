@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from ct_application.counters import reconcile_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized Organization.project_count/story_count and "
+        "Project.story_count columns from the Project and Story tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--org",
+            type=int,
+            action="append",
+            dest="org_ids",
+            help="Only reconcile this org and its projects (repeatable).",
+        )
+
+    def handle(self, *args, org_ids=None, **options):
+        drifted = reconcile_counts(org_ids)
+        self.stdout.write(
+            self.style.SUCCESS(f"Reconciled counters, {drifted} row(s) corrected.")
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from ct_application.cloud.producer_service import relay_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        "Send MLOutbox messages that were not relayed after their transaction "
+        "committed (e.g. SQS was unreachable) to the ML task queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=None,
+            help="Stop after this many send_message_batch calls.",
+        )
+
+    def handle(self, *args, max_batches=None, **options):
+        sent = relay_outbox(max_batches=max_batches)
+        self.stdout.write(self.style.SUCCESS(f"Relayed {sent} outbox message(s)."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from ct_application.models import Story
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-run automatic tagging over every story of the given projects (or "
+        "the given stories) using TaggingService's batch mode."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project", type=int, action="append", dest="project_ids")
+        parser.add_argument("--story", type=int, action="append", dest="story_ids")
+        parser.add_argument("--batch-size", type=int, dest="batch_size")
+        parser.add_argument("--chunk-size", type=int, dest="chunk_size")
+
+    def handle(self, *args, project_ids=None, story_ids=None, **options):
+        if not project_ids and not story_ids:
+            raise CommandError("Pass at least one --project or --story")
+
+        # Imported here so other commands do not load the NER model
+        from ct_application.ml.ml_services.tagging_service import TaggingService
+
+        ids = list(story_ids or [])
+        if project_ids:
+            ids += Story.objects.filter(proj_id__in=project_ids).values_list(
+                "id", flat=True
+            )
+        batch_options = {
+            k: options[k] for k in ("batch_size", "chunk_size") if options.get(k)
+        }
+        tagged = TaggingService().process_stories_tags(ids, **batch_options)
+        self.stdout.write(self.style.SUCCESS(f"Tagged {tagged} stories."))
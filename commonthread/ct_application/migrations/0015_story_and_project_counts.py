@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:48
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_counts(apps, schema_editor):
+    Organization = apps.get_model("ct_application", "Organization")
+    Project = apps.get_model("ct_application", "Project")
+    Story = apps.get_model("ct_application", "Story")
+
+    project_stories = dict(
+        Story.objects.values_list("proj_id").annotate(n=Count("id")).order_by()
+    )
+    org_projects = dict(
+        Project.objects.values_list("org_id").annotate(n=Count("id")).order_by()
+    )
+    org_stories = dict(
+        Story.objects.values_list("proj__org_id").annotate(n=Count("id")).order_by()
+    )
+    for project_id, n in project_stories.items():
+        Project.objects.filter(id=project_id).update(story_count=n)
+    for org_id in set(org_projects) | set(org_stories):
+        Organization.objects.filter(id=org_id).update(
+            project_count=org_projects.get(org_id, 0),
+            story_count=org_stories.get(org_id, 0),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ct_application", "0014_project_insight_json"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="organization",
+            name="project_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="organization",
+            name="story_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="story_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
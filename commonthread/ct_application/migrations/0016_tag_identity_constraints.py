@@ -0,0 +1,65 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """
+    Point StoryTag/ProjectTag rows at the oldest tag of each identity, drop
+    the other tags and any link rows that became duplicates.
+    """
+    Tag = apps.get_model("ct_application", "Tag")
+    StoryTag = apps.get_model("ct_application", "StoryTag")
+    ProjectTag = apps.get_model("ct_application", "ProjectTag")
+
+    keep = {}
+    duplicates = {}
+    for tag_id, *identity in Tag.objects.order_by("id").values_list(
+        "id", "name", "value", "created_by", "required"
+    ):
+        identity = tuple(identity)
+        if identity in keep:
+            duplicates[tag_id] = keep[identity]
+        else:
+            keep[identity] = tag_id
+
+    for duplicate_id, canonical_id in duplicates.items():
+        StoryTag.objects.filter(tag_id=duplicate_id).update(tag_id=canonical_id)
+        ProjectTag.objects.filter(tag_id=duplicate_id).update(tag_id=canonical_id)
+    Tag.objects.filter(id__in=list(duplicates)).delete()
+
+    seen = set()
+    extra_links = []
+    for link_id, story_id, tag_id in StoryTag.objects.order_by("id").values_list(
+        "id", "story_id", "tag_id"
+    ):
+        if (story_id, tag_id) in seen:
+            extra_links.append(link_id)
+        else:
+            seen.add((story_id, tag_id))
+    StoryTag.objects.filter(id__in=extra_links).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ct_application", "0015_story_and_project_counts"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="storytag",
+            constraint=models.UniqueConstraint(
+                fields=("story", "tag"), name="unique_story_tag"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="tag",
+            constraint=models.UniqueConstraint(
+                fields=("name", "value", "created_by", "required"),
+                name="unique_tag_identity",
+                nulls_distinct=False,
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct_application', '0016_tag_identity_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MLResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pipeline', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=255)),
+                ('input_hash', models.CharField(max_length=64)),
+                ('result', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('pipeline', 'model', 'input_hash'), name='unique_ml_result')],
+            },
+        ),
+    ]
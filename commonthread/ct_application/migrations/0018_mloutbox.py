@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct_application', '0017_mlresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MLOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=255)),
+                ('body', models.JSONField()),
+                ('group_id', models.CharField(max_length=128)),
+                ('deduplication_id', models.CharField(max_length=128)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+        ),
+    ]
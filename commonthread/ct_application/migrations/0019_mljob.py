@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 08:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct_application', '0018_mloutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MLJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=255, unique=True)),
+                ('body', models.JSONField()),
+                ('group_id', models.CharField(max_length=128)),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('running', 'running'), ('done', 'done'), ('failed', 'failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='mljob_claim_idx'), models.Index(fields=['group_id', 'id'], name='mljob_group_idx')],
+            },
+        ),
+    ]
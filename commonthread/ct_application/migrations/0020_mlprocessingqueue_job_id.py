@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct_application', '0019_mljob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mlprocessingqueue',
+            name='job_id',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=255),
+        ),
+    ]
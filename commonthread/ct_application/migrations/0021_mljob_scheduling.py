@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+def backfill_unfinished_jobs(apps, schema_editor):
+    MLJob = apps.get_model("ct_application", "MLJob")
+    Project = apps.get_model("ct_application", "Project")
+
+    jobs = list(MLJob.objects.filter(status__in=["pending", "running"]))
+    project_orgs = dict(
+        Project.objects.filter(
+            id__in={job.body.get("project_id") for job in jobs}
+        ).values_list("id", "org_id")
+    )
+    for job in jobs:
+        job.task_type = job.body.get("task_type", "")
+        job.org_id = project_orgs.get(job.body.get("project_id"))
+    MLJob.objects.bulk_update(jobs, ["task_type", "org_id"])
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct_application', '0020_mlprocessingqueue_job_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mljob',
+            name='org_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mljob',
+            name='priority',
+            field=models.SmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='mljob',
+            name='task_type',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.RunPython(backfill_unfinished_jobs, migrations.RunPython.noop),
+    ]
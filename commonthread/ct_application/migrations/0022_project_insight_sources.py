@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct_application', '0021_mljob_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='insight_sources',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='insight_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct_application', '0022_project_insight_sources'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='tag',
+            name='unique_tag_identity',
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(condition=models.Q(('created_by__isnull', False), ('value__isnull', False)), fields=('name', 'value', 'created_by', 'required'), name='unique_tag_identity'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(condition=models.Q(('created_by__isnull', False), ('value__isnull', True)), fields=('name', 'created_by', 'required'), name='unique_tag_identity_null_value'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(condition=models.Q(('created_by__isnull', True), ('value__isnull', False)), fields=('name', 'value', 'required'), name='unique_tag_identity_null_created_by'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(condition=models.Q(('created_by__isnull', True), ('value__isnull', True)), fields=('name', 'required'), name='unique_tag_identity_null_both'),
+        ),
+    ]
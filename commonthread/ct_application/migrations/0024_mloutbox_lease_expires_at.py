@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ct_application', '0023_tag_identity_partial_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mloutbox',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
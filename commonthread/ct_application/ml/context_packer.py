@@ -0,0 +1,160 @@
+"""
+Token-budgeted packing of story summaries into one LLM prompt.
+
+CollectiveSummarizingStrategy sends a project's story summaries to
+Perplexity in a single request. pack_summaries keeps that request under a
+token budget whatever the project size:
+
+1. Exact and near-identical summaries (word 3-shingle Jaccard similarity at
+   or above INSIGHT_NEAR_DUPLICATE_THRESHOLD) are kept once.
+2. At most INSIGHT_MAX_PER_STORYTELLER summaries per storyteller are kept.
+3. If the rest is still over budget, a diverse subset is chosen by
+   farthest-point sampling on shingle distance (roughly one representative
+   per cluster of similar stories) until the budget is full.
+
+Sizes are measured locally with a Hugging Face tokenizer (INSIGHT_TOKENIZER),
+falling back to a characters/4 estimate when it can't be loaded. It is not
+the provider's exact tokenizer, so the budget should leave some margin.
+"""
+
+import logging
+import random
+import re
+from typing import Callable, Dict, List, Optional, Sequence, Set
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_CONTEXT_TOKENS = getattr(settings, "INSIGHT_CONTEXT_TOKENS", 8000)
+INSIGHT_MAX_PER_STORYTELLER = getattr(settings, "INSIGHT_MAX_PER_STORYTELLER", 3)
+INSIGHT_NEAR_DUPLICATE_THRESHOLD = getattr(
+    settings, "INSIGHT_NEAR_DUPLICATE_THRESHOLD", 0.9
+)
+INSIGHT_TOKENIZER = getattr(
+    settings, "INSIGHT_TOKENIZER", "sshleifer/distilbart-cnn-12-6"
+)
+
+# Summaries considered for sampling; larger projects are thinned first so
+# packing time stays bounded
+MAX_CANDIDATES = 2000
+# Independent min-hashes used to find near-duplicate candidates
+_MINHASHES = 4
+
+TokenCounter = Callable[[str], int]
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def build_token_counter() -> TokenCounter:
+    """Local token counter (the registry's "token_counter" factory)."""
+    try:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(INSIGHT_TOKENIZER)
+    except Exception as e:
+        logger.warning(f"Using estimated token counts, tokenizer unavailable: {e}")
+        return estimate_tokens
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def _shingles(text: str) -> Set[str]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[i : i + 3]) for i in range(len(words) - 2)}
+
+
+def _similarity(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _dedupe(
+    indices: List[int], shingles: List[Set[str]], threshold: float
+) -> List[int]:
+    # Candidates share at least one of a few min-hashes; each candidate pair
+    # is then checked exactly, so only likely duplicates are compared
+    kept = []
+    buckets: Dict[tuple, List[int]] = {}
+    for i in indices:
+        keys = [
+            (seed, min((hash((seed, s)) for s in shingles[i]), default=0))
+            for seed in range(_MINHASHES)
+        ]
+        candidates = {j for key in keys for j in buckets.get(key, ())}
+        if any(_similarity(shingles[i], shingles[j]) >= threshold for j in candidates):
+            continue
+        kept.append(i)
+        for key in keys:
+            buckets.setdefault(key, []).append(i)
+    return kept
+
+
+def _diverse(
+    indices: List[int], shingles: List[Set[str]], sizes: List[int], budget: int
+) -> List[int]:
+    # Farthest-point sampling: repeatedly take the summary least similar to
+    # everything chosen so far that still fits the budget
+    chosen: List[int] = []
+    used = 0
+    closest = {i: 0.0 for i in indices}  # highest similarity to a chosen one
+    remaining = list(indices)
+    while remaining:
+        best = min(remaining, key=lambda i: (closest[i], i))
+        remaining.remove(best)
+        if used + sizes[best] > budget:
+            continue
+        chosen.append(best)
+        used += sizes[best]
+        for i in remaining:
+            closest[i] = max(closest[i], _similarity(shingles[i], shingles[best]))
+    return chosen
+
+
+def pack_summaries(
+    summaries: Sequence[str],
+    storytellers: Optional[Sequence[Optional[str]]] = None,
+    budget_tokens: int = INSIGHT_CONTEXT_TOKENS,
+    count_tokens: TokenCounter = estimate_tokens,
+    max_per_storyteller: Optional[int] = INSIGHT_MAX_PER_STORYTELLER,
+    near_duplicate_threshold: float = INSIGHT_NEAR_DUPLICATE_THRESHOLD,
+    per_item_overhead: int = 0,
+) -> List[str]:
+    """
+    The summaries to send, in their original order, totalling at most
+    budget_tokens (per_item_overhead is added per summary for its label).
+    """
+    storytellers = storytellers or [None] * len(summaries)
+    indices = [i for i, text in enumerate(summaries) if text and text.strip()]
+
+    shingles = [_shingles(text) if text else set() for text in summaries]
+    indices = _dedupe(indices, shingles, near_duplicate_threshold)
+
+    if max_per_storyteller:
+        per_storyteller: Dict[str, int] = {}
+        capped = []
+        for i in indices:
+            name = (storytellers[i] or "").strip().lower()
+            if name:
+                per_storyteller[name] = per_storyteller.get(name, 0) + 1
+                if per_storyteller[name] > max_per_storyteller:
+                    continue
+            capped.append(i)
+        indices = capped
+
+    if len(indices) > MAX_CANDIDATES:
+        # Seeded so the same project packs the same way between refreshes
+        indices = sorted(random.Random(len(indices)).sample(indices, MAX_CANDIDATES))
+
+    sizes = [0] * len(summaries)
+    for i in indices:
+        sizes[i] = count_tokens(summaries[i]) + per_item_overhead
+    if sum(sizes[i] for i in indices) > budget_tokens:
+        indices = sorted(_diverse(indices, shingles, sizes, budget_tokens))
+
+    if len(indices) < len(summaries):
+        logger.info(f"Packed {len(indices)} of {len(summaries)} summaries into context")
+    return [summaries[i] for i in indices]
@@ -1,10 +1,16 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from transformers import pipeline
 import requests
 import os
 import logging
 import json
+from ct_application.ml.result_cache import get_results, set_results, input_hash
+from ct_application.ml.context_packer import (
+    INSIGHT_CONTEXT_TOKENS,
+    TokenCounter,
+    pack_summaries,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -22,10 +28,40 @@ class SummarizingStrategy(ABC):
     def summarize_multiple(self, texts: List[str]) -> List[str]:
         pass
 
+    def summarize_batch(self, texts: List[str], batch_size: int = 8) -> List[str]:
+        # One summary per text; strategies with a real batch path override this
+        return [self.summarize_text(text) for text in texts]
+
 
 class LocalSummarizingStrategy(SummarizingStrategy):
+    """
+    distilbart summaries with min/max lengths set from the input length.
+
+    summarize_batch sorts texts by token length and runs them through the
+    pipeline in buckets of similar length, batch_size per generate call, so
+    padding stays small. Generation lengths are shared within a bucket: its
+    smallest per-item min_length and max_length, so no summary exceeds what
+    its own ratios allow. A bucket spans at most bucket_tokens input tokens,
+    which keeps the shared lengths close to each item's own.
+
+    Texts longer than the model's input window are summarized map-reduce
+    style instead of being truncated: they are split into windows
+    overlapping by overlap_tokens, all windows are summarized as one batch
+    (each capped so the partial summaries together fit one window), then
+    the joined partial summaries are summarized again. At most max_depth
+    reduce rounds run, and only the first max_input_tokens of a text are
+    read, so cost grows linearly with length and is bounded.
+    """
+
     def __init__(
-        self, model_name="sshleifer/distilbart-cnn-12-6", min_ratio=0.2, max_ratio=0.6
+        self,
+        model_name="sshleifer/distilbart-cnn-12-6",
+        min_ratio=0.2,
+        max_ratio=0.6,
+        bucket_tokens=64,
+        overlap_tokens=128,
+        max_depth=2,
+        max_input_tokens=16384,
     ):
         logger.info(f"Initializing LocalSummarizingStrategy with model: {model_name}")
         self.summarizer = pipeline(
@@ -34,45 +70,190 @@ class LocalSummarizingStrategy(SummarizingStrategy):
         self.tokenizer = self.summarizer.tokenizer
         self.min_ratio = min_ratio
         self.max_ratio = max_ratio
+        self.bucket_tokens = bucket_tokens
+
+        # Room for <s>/</s> within the model limit
+        model_limit = min(self.tokenizer.model_max_length, 1024)
+        self.window_tokens = model_limit - self.tokenizer.num_special_tokens_to_add()
+        self.overlap_tokens = min(overlap_tokens, self.window_tokens // 2)
+        self.max_depth = max_depth
+        self.max_input_tokens = max_input_tokens
+
+        revision = getattr(self.summarizer.model.config, "_commit_hash", None) or "local"
+        self.cache_model = (
+            f"{model_name}@{revision}:{min_ratio}/{max_ratio}:"
+            f"{self.window_tokens}/{self.overlap_tokens}/{max_depth}/{max_input_tokens}"
+        )
 
     def summarize_text(self, text: str) -> str:
-        try:
-            logger.debug("Starting text summarization with local strategy")
-            tokens = self.tokenizer.encode(
-                text, truncation=True, max_length=1024, return_tensors="pt"
+        return self.summarize_batch([text])[0]
+
+    def summarize_batch(self, texts: List[str], batch_size: int = 8) -> List[str]:
+        # Same text + same model settings -> same summary. Missing or blank
+        # texts (no hash) get "", like a failed run, without a model call.
+        hashes = [input_hash(text) if text and text.strip() else None for text in texts]
+        cached = get_results("summary", self.cache_model, [h for h in hashes if h])
+        misses = list(dict.fromkeys(h for h in hashes if h and h not in cached))
+        if misses:
+            by_hash = {h: text for h, text in zip(hashes, texts)}
+            summaries = self._summarize_batch(
+                [by_hash[h] for h in misses], batch_size
             )
-            decoded_input = self.tokenizer.decode(tokens[0], skip_special_tokens=True)
-
-            input_tokens = len(tokens[0])
-            min_length = max(20, int(input_tokens * self.min_ratio))
-            max_length = max(min_length + 20, int(input_tokens * self.max_ratio))
-
-            logger.debug(f"Generating summary with min_length={min_length}, max_length={max_length}")
-            summary = self.summarizer(
-                decoded_input,
-                max_length=max_length,
-                min_length=min_length,
-                do_sample=False,
-                no_repeat_ngram_size=3,
-                length_penalty=1.2,
-                num_beams=4,
+            fresh = dict(zip(misses, summaries))
+            # Failed runs ("") are retried next time rather than cached
+            set_results(
+                "summary", self.cache_model, {h: s for h, s in fresh.items() if s}
             )
-            return summary[0]["summary_text"]
+            cached.update(fresh)
+        return [cached[h] if h else "" for h in hashes]
+
+    def _lengths(self, input_tokens: int, cap: Optional[int] = None):
+        min_length = max(20, int(input_tokens * self.min_ratio))
+        max_length = max(min_length + 20, int(input_tokens * self.max_ratio))
+        if cap is not None and max_length > cap:
+            max_length = max(cap, 40)
+            min_length = min(min_length, max_length - 20)
+        return min_length, max_length
+
+    def _buckets(self, token_counts: List[int], batch_size: int) -> List[List[int]]:
+        # Indices sorted by length, cut every batch_size items or bucket_tokens
+        buckets = []
+        for i in sorted(range(len(token_counts)), key=token_counts.__getitem__):
+            bucket = buckets[-1] if buckets else None
+            if (
+                bucket is None
+                or len(bucket) >= batch_size
+                or token_counts[i] - token_counts[bucket[0]] > self.bucket_tokens
+            ):
+                buckets.append([i])
+            else:
+                bucket.append(i)
+        return buckets
+
+    def _windows(self, ids: List[int]) -> List[List[int]]:
+        if len(ids) <= self.window_tokens:
+            return [ids]
+        stride = self.window_tokens - self.overlap_tokens
+        starts = range(0, len(ids) - self.overlap_tokens, stride)
+        return [ids[start : start + self.window_tokens] for start in starts]
+
+    def _tokenize(self, texts: List[str]) -> List[List[int]]:
+        return self.tokenizer(
+            texts,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=self.max_input_tokens,
+        )["input_ids"]
+
+    def _generate(
+        self,
+        inputs: List[List[int]],
+        lengths: List[Tuple[int, int]],
+        batch_size: int,
+    ) -> List[str]:
+        # One summary per token-id input; "" where generation failed
+        decoded_inputs = self.tokenizer.batch_decode(
+            inputs, skip_special_tokens=True
+        )
+        summaries = [""] * len(inputs)
+        for bucket in self._buckets([len(ids) for ids in inputs], batch_size):
+            min_length = min(lengths[i][0] for i in bucket)
+            max_length = min(lengths[i][1] for i in bucket)
+            try:
+                logger.debug(
+                    f"Summarizing {len(bucket)} texts with "
+                    f"min_length={min_length}, max_length={max_length}"
+                )
+                results = self.summarizer(
+                    [decoded_inputs[i] for i in bucket],
+                    batch_size=len(bucket),
+                    truncation=True,
+                    max_length=max_length,
+                    min_length=min_length,
+                    do_sample=False,
+                    no_repeat_ngram_size=3,
+                    length_penalty=1.2,
+                    num_beams=4,
+                )
+            except Exception as e:
+                logger.error(f"Error summarizing text: {e}")
+                continue
+            for i, result in zip(bucket, results):
+                if isinstance(result, list):  # pipelines may nest per input
+                    result = result[0]
+                summaries[i] = result["summary_text"]
+        return summaries
+
+    def _summarize_batch(self, texts: List[str], batch_size: int) -> List[str]:
+        if not texts:
+            return []
+        try:
+            docs: Dict[int, List[int]] = dict(enumerate(self._tokenize(texts)))
         except Exception as e:
-            logger.error(f"Error summarizing text: {e}")
-            return ""
+            logger.error(f"Error tokenizing texts for summarization: {e}")
+            return [""] * len(texts)
 
-    # TODO remove if never used, because the signature is different
-    def summarize_multiple(self, texts: List[str]) -> List[str]:
-        return [self.summarize_text(text) for text in texts]
+        summaries = [""] * len(texts)
+        for depth in range(self.max_depth + 1):
+            # Every window of every unfinished text goes into one batch; in
+            # the last round whatever is left is truncated to one window
+            owners, inputs, lengths = [], [], []
+            for i, ids in docs.items():
+                if depth < self.max_depth:
+                    windows = self._windows(ids)
+                else:
+                    windows = [ids[: self.window_tokens]]
+                # Partial summaries together should fit the next window
+                cap = self.window_tokens // len(windows) if len(windows) > 1 else None
+                for window in windows:
+                    owners.append(i)
+                    inputs.append(window)
+                    lengths.append(self._lengths(len(window), cap))
 
+            parts: Dict[int, List[str]] = {}
+            for i, summary in zip(owners, self._generate(inputs, lengths, batch_size)):
+                parts.setdefault(i, []).append(summary)
+
+            reduce = {}
+            for i, partials in parts.items():
+                if len(partials) == 1:
+                    summaries[i] = partials[0]
+                elif all(partials):
+                    reduce[i] = " ".join(partials)
+                else:
+                    logger.error("Partial summary failed, not summarizing text further")
+            if not reduce:
+                break
+            logger.debug(f"Reducing {len(reduce)} long texts (round {depth + 1})")
+            docs = dict(zip(reduce, self._tokenize(list(reduce.values()))))
+        return summaries
+
+    def summarize_multiple(self, texts: List[str]) -> List[str]:
+        return self.summarize_batch(texts)
 
 
 class CollectiveSummarizingStrategy(SummarizingStrategy):
-    def __init__(self, api_key: str = PERPLEXITY_API_KEY, model: str = "sonar-pro"):
+    PROMPT = (
+        "Below is a collection of story summaries. Analyze them and provide a concise overview "
+        "of common themes, patterns, and insights that emerge across the stories. "
+        "Limit your response to 3-5 bullet points, each under 20 words."
+        "Limit your response to insights only, no introductory text. Do not cite specific stories."
+        "Return the output as a json where each the keys are called insight1 and the value is each bullet.\n\n"
+    )
+
+    def __init__(
+        self,
+        api_key: str = PERPLEXITY_API_KEY,
+        model: str = "sonar-pro",
+        budget_tokens: int = INSIGHT_CONTEXT_TOKENS,
+        token_counter: Optional[TokenCounter] = None,
+    ):
         """
         :param api_key: Perplexity API key
         :param model: Name of the model to use (e.g., sonar-small-online, gpt-4, etc.)
+        :param budget_tokens: Prompt size limit; summaries are packed to fit
+            (see ml/context_packer.py)
+        :param token_counter: Local token counter, the shared one by default
         """
         logger.info(f"Initializing CollectiveSummarizingStrategy with model: {model}")
         if not api_key:
@@ -80,6 +261,26 @@ class CollectiveSummarizingStrategy(SummarizingStrategy):
         self.api_key = api_key
         self.model = model
         self.api_url = "https://api.perplexity.ai/chat/completions"
+        self.budget_tokens = budget_tokens
+        self._token_counter = token_counter
+
+    @property
+    def token_counter(self) -> TokenCounter:
+        if self._token_counter is None:
+            from ct_application.registry import get_shared
+
+            self._token_counter = get_shared("token_counter")
+        return self._token_counter
+
+    def _pack(self, texts: List[str], storytellers: Optional[List[str]]) -> List[str]:
+        count = self.token_counter
+        return pack_summaries(
+            texts,
+            storytellers,
+            budget_tokens=self.budget_tokens - count(self.PROMPT),
+            count_tokens=count,
+            per_item_overhead=count(f"Story {len(texts)}: ") + 1,
+        )
 
     def summarize_text(self, text: str) -> str:
         logger.warning("Called summarize_text on CollectiveSummarizingStrategy which is not implemented")
@@ -87,21 +288,17 @@ class CollectiveSummarizingStrategy(SummarizingStrategy):
             "CollectiveSummarizingStrategy is meant for summarizing multiple texts"
         )
 
-    def summarize_multiple(self, texts: List[str]) -> str:
+    def summarize_multiple(
+        self, texts: List[str], storytellers: Optional[List[str]] = None
+    ) -> str:
         try:
             logger.debug(f"Starting collective summarization of {len(texts)} texts")
+            texts = self._pack(texts, storytellers)
             combined_input = "\n\n".join(
                 [f"Story {i+1}: {text}" for i, text in enumerate(texts)]
             )
 
-            prompt = (
-                "Below is a collection of story summaries. Analyze them and provide a concise overview "
-                "of common themes, patterns, and insights that emerge across the stories. "
-                "Limit your response to 3-5 bullet points, each under 20 words." 
-                "Limit your response to insights only, no introductory text. Do not cite specific stories."
-                "Return the output as a json where each the keys are called insight1 and the value is each bullet.\n\n"
-                f"{combined_input}"
-            )
+            prompt = self.PROMPT + combined_input
 
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
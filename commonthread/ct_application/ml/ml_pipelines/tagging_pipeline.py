@@ -1,6 +1,7 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from transformers import pipeline
 from abc import ABC, abstractmethod
+from ct_application.ml.result_cache import get_results, set_results, input_hash
 
 
 class TaggingStrategy(ABC):
@@ -11,14 +12,34 @@ class TaggingStrategy(ABC):
     def get_tags(self, story_text: str) -> List[Dict[str, str]]:
         pass
 
+    # tags for many stories, in input order; strategies that can batch
+    # inference override this
+    def get_tags_batch(
+        self, story_texts: List[str], batch_size: int = 16
+    ) -> List[List[Dict[str, str]]]:
+        return [self.get_tags(text) for text in story_texts]
+
 
 # example implementation of a tagging strategy
 class HFTaggingStrategy(TaggingStrategy):
+    """
+    Long texts are split into token windows of at most max_tokens (overlapping
+    by overlap_tokens) so nothing past the model's 512-token limit is silently
+    dropped and attention cost stays bounded. All windows go through one
+    batched pipeline call; entities are mapped back to story offsets and
+    duplicates/partial spans from the overlaps are merged.
+    """
+
+    # Bumped when window merging changes, so cached tags are recomputed
+    MERGE_VERSION = 2
+
     def __init__(
         self,
         aggregation_strategy: str = "simple",
         model_name: str = "dslim/bert-base-NER",
         tokenizer_name: str = "dslim/bert-base-NER",
+        max_tokens: Optional[int] = None,
+        overlap_tokens: int = 32,
     ):
 
         ner = pipeline(
@@ -30,7 +51,124 @@ class HFTaggingStrategy(TaggingStrategy):
 
         self.ner = ner
 
+        # Room for [CLS]/[SEP] within the model limit
+        model_limit = min(ner.tokenizer.model_max_length, 512)
+        model_limit -= ner.tokenizer.num_special_tokens_to_add()
+        self.max_tokens = min(max_tokens or model_limit, model_limit)
+        self.overlap_tokens = min(overlap_tokens, self.max_tokens // 2)
+
+        # Result cache key: anything that changes the output
+        revision = getattr(ner.model.config, "_commit_hash", None) or "local"
+        self.cache_model = (
+            f"{model_name}@{revision}:{aggregation_strategy}:"
+            f"{self.max_tokens}/{self.overlap_tokens}:v{self.MERGE_VERSION}"
+        )
+
+    def _windows(self, story_text: str) -> List[Tuple[int, str]]:
+        # [(char offset, window text), ...] covering story_text
+        if not self.ner.tokenizer.is_fast:
+            return [(0, story_text)]
+        offsets = self.ner.tokenizer(
+            story_text, add_special_tokens=False, return_offsets_mapping=True
+        )["offset_mapping"]
+        if len(offsets) <= self.max_tokens:
+            return [(0, story_text)]
+
+        windows = []
+        step = self.max_tokens - self.overlap_tokens
+        for start in range(0, len(offsets), step):
+            end = min(start + self.max_tokens, len(offsets))
+            char_start, char_end = offsets[start][0], offsets[end - 1][1]
+            windows.append((char_start, story_text[char_start:char_end]))
+            if end == len(offsets):
+                break
+        return windows
+
+    @staticmethod
+    def _merge_spans(entities: List[Dict]) -> List[Dict]:
+        """
+        entities: pipeline results with start/end already shifted to story
+        offsets. Overlapping spans come from the same mention seen by two
+        windows, possibly cut by a window edge in one or both of them; they
+        become one span covering all of them, labelled like the longest
+        (then highest scoring) one.
+        """
+        merged = []
+        for entity in sorted(entities, key=lambda e: (e["start"], -e["end"])):
+            if merged and entity["start"] < merged[-1]["end"]:
+                kept = merged[-1]
+                best = max(
+                    (kept, entity), key=lambda e: (e["end"] - e["start"], e["score"])
+                )
+                merged[-1] = {
+                    **best,
+                    "start": kept["start"],
+                    "end": max(kept["end"], entity["end"]),
+                }
+                continue
+            merged.append(entity)
+        return merged
+
+    @staticmethod
+    def _to_tags(ner_results) -> List[Dict[str, str]]:
+        return [{"word": r["word"], "label": r["entity_group"]} for r in ner_results]
+
     def get_tags(self, story_text: str) -> List[Dict[str, str]]:
-        ner_results = self.ner(story_text)
-        tags = [{"word": r["word"], "label": r["entity_group"]} for r in ner_results]
+        return self.get_tags_batch([story_text], batch_size=1)[0]
+
+    def get_tags_batch(
+        self, story_texts: List[str], batch_size: int = 16
+    ) -> List[List[Dict[str, str]]]:
+        # Texts tagged before by the same model come from the result cache
+        hashes = [input_hash(text) for text in story_texts]
+        cached = get_results("tag", self.cache_model, hashes)
+        misses = list(dict.fromkeys(h for h in hashes if h not in cached))
+        if misses:
+            texts = {h: text for h, text in zip(hashes, story_texts)}
+            results = self._run_batch([texts[h] for h in misses], batch_size)
+            fresh = dict(zip(misses, results))
+            set_results("tag", self.cache_model, fresh)
+            cached.update(fresh)
+        return [cached[h] for h in hashes]
+
+    def _run_batch(
+        self, story_texts: List[str], batch_size: int
+    ) -> List[List[Dict[str, str]]]:
+        # Every window of every story goes through one pipeline call; the
+        # pipeline pads and runs batch_size windows per forward pass
+        if not story_texts:
+            return []
+        owners, offsets, window_texts = [], [], []
+        for i, text in enumerate(story_texts):
+            for offset, window_text in self._windows(text):
+                owners.append(i)
+                offsets.append(offset)
+                window_texts.append(window_text)
+
+        ner_results = self.ner(window_texts, batch_size=batch_size)
+        if ner_results and isinstance(ner_results[0], dict):
+            ner_results = [ner_results]  # single input returns a flat list
+
+        placed = [[] for _ in story_texts]
+        unplaced = [[] for _ in story_texts]
+        for owner, offset, results in zip(owners, offsets, ner_results):
+            for r in results:
+                if r.get("start") is None:  # slow tokenizers give no offsets
+                    unplaced[owner].append(r)
+                else:
+                    placed[owner].append(
+                        {**r, "start": r["start"] + offset, "end": r["end"] + offset}
+                    )
+
+        tags = []
+        for text, spans, rest in zip(story_texts, placed, unplaced):
+            # Words are re-read from the text so a mention merged across
+            # windows is reported in full
+            tags.append(
+                [
+                    {"word": text[e["start"] : e["end"]], "label": e["entity_group"]}
+                    for e in self._merge_spans(spans)
+                ]
+                + self._to_tags(rest)
+            )
         return tags
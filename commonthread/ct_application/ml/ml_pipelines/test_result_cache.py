@@ -0,0 +1,39 @@
+# test_result_cache.py
+# MLResult memoization of pipeline outputs
+import datetime
+import pytest
+from django.utils import timezone
+from ct_application.ml import result_cache
+from ct_application.models import MLResult
+
+pytestmark = pytest.mark.django_db
+
+
+def test_ml_result_cache_memoizes():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"summary": "short"}
+
+    first = result_cache.memoize("summary", "model@1", "same text", compute)
+    second = result_cache.memoize("summary", "model@1", "same text", compute)
+    assert first == second == {"summary": "short"}
+    assert len(calls) == 1
+
+    # A different model version is a different entry
+    result_cache.memoize("summary", "model@2", "same text", compute)
+    assert len(calls) == 2
+
+    # Failed (empty) results are not stored
+    result_cache.memoize("summary", "model@1", "other", lambda: "")
+    assert MLResult.objects.count() == 2
+
+
+def test_ml_result_cache_evicts_least_recently_used():
+    result_cache.set_results("tag", "m", {f"h{i}": [i] for i in range(5)})
+    MLResult.objects.filter(input_hash="h0").update(
+        last_used_at=timezone.now() + datetime.timedelta(minutes=1)
+    )
+    assert result_cache.evict(max_entries=2) == 3
+    assert set(MLResult.objects.values_list("input_hash", flat=True)) == {"h0", "h4"}
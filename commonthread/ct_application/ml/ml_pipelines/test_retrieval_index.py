@@ -0,0 +1,105 @@
+# test_retrieval_index.py
+# Incremental per-project chunk index for project chat (no model download)
+import datetime
+import numpy as np
+import pytest
+from ct_application.ml.retrieval_index import (
+    CHAT_INDEX_MAX_AGE,
+    ProjectIndex,
+    chunk_text,
+)
+from ct_application.models import CustomUser, Organization, Project, Story
+from ct_application.story_cache import invalidate_project_stats
+
+
+class CountingEmbedder:
+    # Bag-of-words vectors; records every text embedded for the index
+    def __init__(self):
+        self.embedded = []
+
+    def _vector(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for term in text.lower().split():
+            vector[hash(term) % 64] += 1
+        return vector / max(np.linalg.norm(vector), 1.0)
+
+    def embed(self, texts):
+        self.embedded.extend(texts)
+        return np.stack([self._vector(text) for text in texts])
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture
+def project():
+    curator = CustomUser.objects.create_user(
+        username="chat", email="chat@example.com", password="pw", name="Chat"
+    )
+    org = Organization.objects.create(name="Chat Org")
+    return Project.objects.create(
+        org=org, name="Chat Project", curator=curator, date=datetime.date(2025, 4, 1)
+    )
+
+
+def make_story(project, text):
+    return Story.objects.create(
+        proj=project,
+        curator=project.curator,
+        date=datetime.date(2025, 4, 8),
+        text_content=text,
+    )
+
+
+def test_chunk_text_overlaps_windows():
+    words = " ".join(f"w{i}" for i in range(10))
+    assert chunk_text(words, size=4, overlap=1) == [
+        "w0 w1 w2 w3",
+        "w3 w4 w5 w6",
+        "w6 w7 w8 w9",
+    ]
+    assert chunk_text("a b", size=4, overlap=1) == ["a b"]
+    assert chunk_text(None) == []
+
+
+@pytest.mark.django_db
+def test_retrieval_index_updates_incrementally(project):
+    kept = make_story(project, "To be kept as is")
+    apples = make_story(project, "apples grow in the orchard")
+    boats = make_story(project, "boats sail on the river")
+    embedder = CountingEmbedder()
+    index = ProjectIndex(embedder)
+
+    index.sync(project.id)
+    assert len(index.chunks) == 3 and index.vectors.shape == (3, 64)
+
+    # Nothing changed: no query for story texts, nothing re-embedded
+    embedder.embedded.clear()
+    index.sync(project.id)
+    assert embedder.embedded == []
+
+    apples.text_content = "apples and pears"
+    apples.save()
+    boats.delete()
+    invalidate_project_stats(project.id)
+    index.sync(project.id)
+    assert embedder.embedded == ["apples and pears"]
+    assert sorted(index.chunks) == [kept.text_content, "apples and pears"]
+    assert index.vectors.shape == (2, 64)
+    assert index.top_k("pears", 1) == [(apples.id, "apples and pears")]
+
+
+@pytest.mark.django_db
+def test_retrieval_index_rechecks_stories_once_stale(project):
+    story = make_story(project, "before the transcript")
+    index = ProjectIndex(CountingEmbedder())
+    index.sync(project.id)
+
+    # Written by the ML worker: its version bump stays in the worker's cache
+    Story.objects.filter(id=story.id).update(text_content="the transcript")
+    index.sync(project.id)
+    assert index.chunks == ["before the transcript"]
+
+    index.synced_at -= CHAT_INDEX_MAX_AGE
+    index.sync(project.id)
+    assert index.chunks == ["the transcript"]
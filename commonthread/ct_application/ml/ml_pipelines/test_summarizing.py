@@ -0,0 +1,142 @@
+# test_summarizing.py
+# Summary batching, map-reduce and insight prompt packing (no model download)
+from unittest.mock import MagicMock
+import pytest
+from ct_application.ml.context_packer import pack_summaries
+
+pytestmark = pytest.mark.django_db
+
+
+def fake_local_summarizer(summarize, window_tokens=1022, overlap_tokens=128):
+    # LocalSummarizingStrategy over a whitespace "tokenizer", no model loaded
+    from ct_application.ml.ml_pipelines.summarizing_pipeline import (
+        LocalSummarizingStrategy,
+    )
+
+    strategy = LocalSummarizingStrategy.__new__(LocalSummarizingStrategy)
+    strategy.min_ratio, strategy.max_ratio, strategy.bucket_tokens = 0.2, 0.6, 64
+    strategy.window_tokens, strategy.overlap_tokens = window_tokens, overlap_tokens
+    strategy.max_depth, strategy.max_input_tokens = 2, 16384
+    strategy.cache_model = f"fake@{window_tokens}"
+    strategy.tokenizer = MagicMock()
+    strategy.tokenizer.side_effect = lambda texts, **kw: {
+        "input_ids": [t.split()[: kw["max_length"]] for t in texts]
+    }
+    strategy.tokenizer.batch_decode.side_effect = lambda ids, **kw: [
+        " ".join(i) for i in ids
+    ]
+    strategy.summarizer = summarize
+    return strategy
+
+
+def test_pack_summaries_dedupes_caps_and_fits_budget():
+    words = lambda n, w: " ".join(f"{w}{i}" for i in range(n))
+    summaries = [
+        words(20, "farm"),
+        words(20, "farm") + ".",  # near-identical
+        words(20, "city"),
+        words(20, "sea"),
+        words(20, "sky"),
+        "",
+    ]
+    storytellers = ["Ann", "Bo", "Ann", "Ann", "Cy", "Cy"]
+
+    packed = pack_summaries(
+        summaries, storytellers, budget_tokens=10**6, max_per_storyteller=2
+    )
+    assert packed == [summaries[0], summaries[2], summaries[4]]
+
+    count_words = lambda text: len(text.split())
+    packed = pack_summaries(
+        summaries * 50,
+        budget_tokens=70,
+        count_tokens=count_words,
+        per_item_overhead=2,
+        max_per_storyteller=None,
+    )
+    # duplicates collapse to the four distinct summaries, three of which fit
+    assert sum(count_words(text) + 2 for text in packed) <= 70
+    assert len(packed) == 3 and len(set(packed)) == 3
+
+
+def test_collective_summary_prompt_is_packed(monkeypatch):
+    pytest.importorskip("transformers")
+    from ct_application.ml.ml_pipelines.summarizing_pipeline import (
+        CollectiveSummarizingStrategy,
+    )
+
+    response = MagicMock()
+    response.json.return_value = {
+        "choices": [{"message": {"content": '{"insight1": "ok"}'}}]
+    }
+    post = MagicMock(return_value=response)
+    monkeypatch.setattr("requests.post", post)
+    strategy = CollectiveSummarizingStrategy(
+        api_key="k", budget_tokens=400, token_counter=lambda t: len(t.split())
+    )
+
+    filler = " ".join(["word"] * 30)
+    texts = [f"story number {i} {filler} end{i}" for i in range(100)]
+    assert strategy.summarize_multiple(texts) == {"insight1": "ok"}
+    prompt = post.call_args.kwargs["json"]["messages"][0]["content"]
+    assert len(prompt.split()) <= 400
+    assert "Story 1:" in prompt
+
+
+def test_local_summarizer_buckets_by_length():
+    pytest.importorskip("transformers")
+    calls = []
+
+    def summarizer(inputs, **kwargs):
+        calls.append((len(inputs), kwargs["min_length"], kwargs["max_length"]))
+        return [{"summary_text": f"s{len(t.split())}"} for t in inputs]
+
+    strategy = fake_local_summarizer(summarizer)
+    texts = [" ".join(["w"] * n) for n in (300, 10, 320, 12, 900)]
+
+    assert strategy.summarize_batch(texts, batch_size=8) == [
+        "s300",
+        "s10",
+        "s320",
+        "s12",
+        "s900",
+    ]
+    # short, medium and long texts are generated separately, each bucket
+    # with its shortest member's lengths
+    assert calls == [(2, 20, 40), (2, 60, 180), (1, 180, 540)]
+    # cached: nothing is generated again
+    strategy.summarize_batch(texts[:2], batch_size=8)
+    assert len(calls) == 3
+
+
+def test_local_summarizer_skips_missing_texts():
+    pytest.importorskip("transformers")
+    calls = []
+
+    def summarizer(inputs, **kwargs):
+        calls.append(inputs)
+        return [{"summary_text": "s"} for _ in inputs]
+
+    strategy = fake_local_summarizer(summarizer)
+    text = " ".join(["w"] * 30)
+    assert strategy.summarize_batch([None, text, "  "]) == ["", "s", ""]
+    assert calls == [[text]]
+    assert strategy.summarize_text(None) == ""
+
+
+def test_local_summarizer_map_reduces_long_texts():
+    pytest.importorskip("transformers")
+    calls = []
+
+    def summarizer(inputs, **kwargs):
+        calls.append(([len(t.split()) for t in inputs], kwargs["max_length"]))
+        summary = " ".join(["w"] * kwargs["max_length"])
+        return [{"summary_text": summary} for _ in inputs]
+
+    strategy = fake_local_summarizer(summarizer, window_tokens=200, overlap_tokens=40)
+    (summary,) = strategy.summarize_batch([" ".join(["x"] * 500)])
+
+    # three overlapping windows summarized together, each short enough that
+    # the joined partials fit one window, then one reduce pass
+    assert calls == [([180, 200, 200], 66), ([198], 118)]
+    assert len(summary.split()) == 118
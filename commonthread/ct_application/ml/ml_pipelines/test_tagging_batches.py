@@ -0,0 +1,213 @@
+# test_tagging_batches.py
+# Batched and windowed NER tagging over a stub pipeline (no model download)
+import datetime
+import re
+from types import SimpleNamespace
+import pytest
+from django.core.management import call_command
+
+pytest.importorskip("transformers")
+
+from ct_application import registry  # noqa: E402
+from ct_application.ml.ml_pipelines import tagging_pipeline  # noqa: E402
+from ct_application.ml.ml_services.tagging_service import TaggingService  # noqa: E402
+from ct_application.models import (  # noqa: E402
+    CustomUser,
+    Organization,
+    Project,
+    Story,
+    StoryTag,
+)
+
+
+class FakeTokenizer:
+    # One token per whitespace-separated word
+    is_fast = True
+    model_max_length = 512
+
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=True):
+        return {"offset_mapping": [m.span() for m in re.finditer(r"\S+", text)]}
+
+
+class FakeNER:
+    """Aggregated NER pipeline stand-in: every capitalized word is a PER."""
+
+    def __init__(self, fail_on=None, pattern=r"\b[A-Z]\w*"):
+        self.tokenizer = FakeTokenizer()
+        self.model = SimpleNamespace(config=SimpleNamespace(_commit_hash="fake"))
+        self.calls = []
+        self.fail_on = fail_on
+        self.pattern = pattern
+
+    def __call__(self, texts, batch_size):
+        self.calls.append((list(texts), batch_size))
+        if self.fail_on and any(self.fail_on in text for text in texts):
+            raise RuntimeError("NER failed")
+        return [
+            [
+                {
+                    "entity_group": "PER",
+                    "word": m.group(),
+                    "start": m.start(),
+                    "end": m.end(),
+                    "score": 0.9,
+                }
+                for m in re.finditer(self.pattern, text)
+            ]
+            for text in texts
+        ]
+
+
+def fake_tagger(monkeypatch, ner, **kwargs):
+    monkeypatch.setattr(tagging_pipeline, "pipeline", lambda *a, **k: ner)
+    return tagging_pipeline.HFTaggingStrategy(**kwargs)
+
+
+def run_tagger(tagger, text):
+    # Tags for one text, bypassing the result cache
+    return tagger._run_batch([text], batch_size=1)[0]
+
+
+@pytest.fixture
+def project():
+    curator = CustomUser.objects.create_user(
+        username="tagger", email="tagger@example.com", password="pw", name="Tagger"
+    )
+    org = Organization.objects.create(name="Tag Org")
+    return Project.objects.create(
+        org=org, name="Tag Project", curator=curator, date=datetime.date(2025, 4, 1)
+    )
+
+
+def make_story(project, text):
+    return Story.objects.create(
+        proj=project,
+        curator=project.curator,
+        date=datetime.date(2025, 4, 2),
+        text_content=text,
+    )
+
+
+def tag_words(story):
+    return sorted(
+        StoryTag.objects.filter(story=story).values_list("tag__value", flat=True)
+    )
+
+
+@pytest.mark.django_db
+def test_process_stories_tags_batches_chunks(project, monkeypatch):
+    ner = FakeNER()
+    service = TaggingService(fake_tagger(monkeypatch, ner))
+    ann = make_story(project, "Ann met Bo in town")
+    cy = make_story(project, "then Cy left")
+    dee = make_story(project, "Dee stayed")
+
+    # Duplicates are tagged once; two stories per chunk
+    tagged = service.process_stories_tags(
+        [ann.id, cy.id, dee.id, ann.id], batch_size=4, chunk_size=2
+    )
+
+    assert tagged == 3
+    assert ner.calls == [
+        (["Ann met Bo in town", "then Cy left"], 4),
+        (["Dee stayed"], 4),
+    ]
+    assert tag_words(ann) == ["Ann", "Bo"]
+    assert tag_words(cy) == ["Cy"]
+    assert tag_words(dee) == ["Dee"]
+    assert set(
+        StoryTag.objects.values_list("tag__name", "tag__created_by", "tag__required")
+    ) == {("PER", "computer", False)}
+
+
+@pytest.mark.django_db
+def test_process_stories_tags_skips_empty_and_keeps_earlier_chunks(
+    project, monkeypatch
+):
+    ner = FakeNER(fail_on="Broken")
+    service = TaggingService(fake_tagger(monkeypatch, ner))
+    empty = make_story(project, "")
+    ann = make_story(project, "Ann spoke")
+    broken = make_story(project, "Broken Record")
+
+    # The empty story is never sent to the model
+    assert service.process_stories_tags([empty.id, ann.id], chunk_size=2) == 1
+    assert ner.calls[0][0] == ["Ann spoke"]
+    assert tag_words(empty) == []
+
+    # A failing chunk raises; chunks written before it are kept
+    with pytest.raises(RuntimeError):
+        service.process_stories_tags([ann.id, broken.id], chunk_size=1)
+    assert tag_words(ann) == ["Ann"]
+    assert tag_words(broken) == []
+
+
+@pytest.mark.django_db
+def test_retag_stories_command_tags_whole_project(project, monkeypatch):
+    ner = FakeNER()
+    monkeypatch.setattr(
+        registry, "_instances", {"tagging": fake_tagger(monkeypatch, ner)}
+    )
+    stories = [make_story(project, f"Story by Teller{i}") for i in range(3)]
+
+    call_command("retag_stories", "--project", str(project.id), "--batch-size", "8")
+
+    assert [batch for _, batch in ner.calls] == [8]
+    assert [tag_words(story) for story in stories] == [
+        ["Story", f"Teller{i}"] for i in range(3)
+    ]
+
+
+def test_windows_overlap_and_cover_the_text(monkeypatch):
+    tagger = fake_tagger(monkeypatch, FakeNER(), max_tokens=4, overlap_tokens=1)
+    text = " ".join(f"w{i}" for i in range(10))
+    assert tagger._windows(text) == [
+        (0, "w0 w1 w2 w3"),
+        (9, "w3 w4 w5 w6"),
+        (18, "w6 w7 w8 w9"),
+    ]
+    # One token over the limit: a last window of the overlap plus the rest
+    assert tagger._windows("a b c d e") == [(0, "a b c d"), (6, "d e")]
+    # Up to one window of text is not split
+    assert tagger._windows("a b c d") == [(0, "a b c d")]
+    assert tagger._windows("a") == [(0, "a")]
+
+
+def test_window_sizes_capped_by_model(monkeypatch):
+    assert fake_tagger(monkeypatch, FakeNER()).max_tokens == 510
+    tagger = fake_tagger(monkeypatch, FakeNER(), max_tokens=4, overlap_tokens=10)
+    assert (tagger.max_tokens, tagger.overlap_tokens) == (4, 2)
+
+
+def test_mentions_in_window_overlap_are_tagged_once(monkeypatch):
+    tagger = fake_tagger(monkeypatch, FakeNER(), max_tokens=4, overlap_tokens=2)
+    # "Bo" sits in the overlap of the first two windows
+    assert len(tagger._windows("a b c Bo d e f")) == 3
+    assert run_tagger(tagger, "a b c Bo d e f") == [{"word": "Bo", "label": "PER"}]
+    # The same name at two places is two mentions
+    assert run_tagger(tagger, "Bo a b c d e Bo") == [
+        {"word": "Bo", "label": "PER"},
+        {"word": "Bo", "label": "PER"},
+    ]
+
+
+def test_mention_cut_by_window_edges_is_reported_whole(monkeypatch):
+    ner = FakeNER(pattern=r"[A-Z]\w*(?: [A-Z]\w*)*")
+    tagger = fake_tagger(monkeypatch, ner, max_tokens=4, overlap_tokens=1)
+    # Neither window holds the whole name
+    text = "a b Mary Ann Smith c"
+    assert tagger._windows(text) == [(0, "a b Mary Ann"), (9, "Ann Smith c")]
+    assert run_tagger(tagger, text) == [{"word": "Mary Ann Smith", "label": "PER"}]
+
+
+def test_merge_spans_labels_by_longest_and_keeps_adjacent_apart():
+    def span(start, end, label, score):
+        return {"start": start, "end": end, "entity_group": label, "score": score}
+
+    merged = tagging_pipeline.HFTaggingStrategy._merge_spans(
+        [span(5, 9, "PER", 0.99), span(0, 7, "ORG", 0.5), span(9, 12, "LOC", 0.8)]
+    )
+    assert merged == [span(0, 9, "ORG", 0.5), span(9, 12, "LOC", 0.8)]
@@ -2,6 +2,7 @@ from typing import Union, BinaryIO, Optional
 from transformers import pipeline
 from abc import ABC, abstractmethod
 from deepgram import DeepgramClient, PrerecordedOptions
+from ct_application.ml.result_cache import memoize
 import os
 
 DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
@@ -13,11 +14,17 @@ class AudioInput:
         self,
         audio_file: Optional[Union[str, BinaryIO]] = None,
         presigned_url: Optional[str] = None,
+        cache_key: Optional[str] = None,
     ):
+        """
+        cache_key: stable id of the audio (e.g. its S3 key); transcripts of
+        inputs with a cache_key are memoized, presigned URLs change per signing.
+        """
         if not audio_file and not presigned_url:
             raise ValueError("Either audio_file or presigned_url must be provided")
         self.audio_file = audio_file
         self.presigned_url = presigned_url
+        self.cache_key = cache_key
 
     @property
     def is_presigned(self) -> bool:
@@ -25,11 +32,23 @@ class AudioInput:
 
 
 class TranscribingStrategy(ABC):
+    # result cache key for the model/options; None disables memoization
+    cache_model: Optional[str] = None
 
     @abstractmethod
     def transcribe(self, audio_input: AudioInput) -> str:
         pass
 
+    def transcribe_cached(self, audio_input: AudioInput) -> str:
+        if not audio_input.cache_key or not self.cache_model:
+            return self.transcribe(audio_input)
+        return memoize(
+            "transcription",
+            self.cache_model,
+            audio_input.cache_key,
+            lambda: self.transcribe(audio_input),
+        )
+
 
 class HFTranscribingStrategy(TranscribingStrategy):
     def __init__(self, model_name: str = "openai/whisper-base"):
@@ -39,6 +58,7 @@ class HFTranscribingStrategy(TranscribingStrategy):
             chunk_length_s=30,
             stride_length_s=5,
         )
+        self.cache_model = f"{model_name}:30/5"
 
     def transcribe(self, audio_input: AudioInput) -> str:
         if audio_input.is_presigned:
@@ -53,6 +73,7 @@ class DeepgramTranscribingStrategy(TranscribingStrategy):
         if not DEEPGRAM_API_KEY:
             raise ValueError("DEEPGRAM_API_KEY environment variable is not set")
         self.deepgram = DeepgramClient(DEEPGRAM_API_KEY)
+        self.cache_model = "deepgram:nova-3:smart_format,paragraphs"
 
     def transcribe(self, audio_input: AudioInput) -> str:
         options = PrerecordedOptions(
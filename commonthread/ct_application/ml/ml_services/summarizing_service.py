@@ -1,48 +1,123 @@
-from ct_application.models import Story, Project
-from ..ml_pipelines.summarizing_pipeline import (
-    LocalSummarizingStrategy,
-    CollectiveSummarizingStrategy,
-)
-from typing import List
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from ct_application.models import Story, Project, MLProcessingQueue
+from ct_application.story_cache import invalidate_story_cache
+from ct_application.registry import get_shared
+from ct_application.ml.result_cache import input_hash
+from typing import Dict, List
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Stories per summarization generate call
+SUMMARIZING_BATCH_SIZE = getattr(settings, "SUMMARIZING_BATCH_SIZE", 8)
+# A project summarization queued within this many seconds supersedes the one
+# running now (see process_project_summary)
+INSIGHT_DEBOUNCE_SECONDS = getattr(settings, "INSIGHT_DEBOUNCE_SECONDS", 15 * 60)
+
 
 class SummarizingService:
-    def __init__(self):
-        self.local_strategy = LocalSummarizingStrategy()
-        self.collective_strategy = CollectiveSummarizingStrategy()
+    # Strategies are shared across instances and built on first use
+
+    @property
+    def local_strategy(self):
+        return get_shared("local_summarizing")
+
+    @property
+    def collective_strategy(self):
+        return get_shared("collective_summarizing")
 
     def get_or_generate_story_summaries(self, project_id: int) -> List[str]:
-        summaries = []
-        stories = Story.objects.filter(proj_id=project_id)
-
-        for story in stories:
-            if story.summary:
-                summaries.append(story.summary)
-            else:
-                generated_summary = self.local_strategy.summarize_text(
-                    story.text_content
-                )
-                story.summary = generated_summary
-                story.save(update_fields=["summary"])
-                summaries.append(generated_summary)
+        return list(self.story_summaries_by_id(project_id).values())
+
+    def story_summaries_by_id(self, project_id: int) -> Dict[int, str]:
+        stories = self._summarized_stories(project_id)
+        return {story.id: story.summary for story in stories}
+
+    def _summarized_stories(self, project_id: int) -> List[Story]:
+        stories = list(
+            Story.objects.filter(proj_id=project_id).only(
+                "id", "summary", "text_content", "storyteller"
+            )
+        )
 
-        return summaries
+        # All missing summaries go through the local model in one batch
+        missing = [story for story in stories if not story.summary]
+        if missing:
+            generated = self.local_strategy.summarize_batch(
+                [story.text_content for story in missing],
+                batch_size=SUMMARIZING_BATCH_SIZE,
+            )
+            for story, summary in zip(missing, generated):
+                story.summary = summary
+            Story.objects.bulk_update(missing, ["summary"])
+            for story in missing:
+                invalidate_story_cache(story.id)
+            logger.info(
+                f"Generated {len(missing)} story summaries for project {project_id}"
+            )
 
-    def process_project_summary(self, project_id: int) -> bool:
+        return stories
+
+    def _superseded(self, project_id: int) -> bool:
+        """
+        True when another summarization for the project is still queued
+        (its entry not yet picked up by a worker). That job runs after this
+        one and after its own story's transcription, so it sees everything
+        this one would; a bulk upload thus refreshes the insight once, from
+        its last job. Entries older than INSIGHT_DEBOUNCE_SECONDS are
+        ignored, so a lost message can't block refreshes for good.
+        """
+        cutoff = timezone.now() - timedelta(seconds=INSIGHT_DEBOUNCE_SECONDS)
+        return MLProcessingQueue.objects.filter(
+            project_id=project_id,
+            task_type="summarization",
+            status="initialized",
+            timestamp__gte=cutoff,
+        ).exists()
+
+    def process_project_summary(self, project_id: int, force: bool = False) -> bool:
+        """
+        Refresh the project insight, incrementally: skipped while a newer
+        summarization for the project is queued, and when the story
+        summaries are the same ones the current insight was built from.
+        force rebuilds it regardless.
+        """
         try:
             project = Project.objects.get(id=project_id)
-            story_summaries = self.get_or_generate_story_summaries(project_id)
+            if not force and self._superseded(project_id):
+                logger.info(
+                    f"Project {project_id} insight deferred to a queued summarization"
+                )
+                return True
 
-            if not story_summaries:
+            stories = self._summarized_stories(project_id)
+
+            if not stories:
                 logger.warning(f"No stories found for project {project_id}.")
                 return False
 
-            trend_summary = self.collective_strategy.summarize_multiple(story_summaries)
+            sources = {
+                str(story.id): input_hash(story.summary or "") for story in stories
+            }
+            unchanged = project.insight_json and project.insight_sources == sources
+            if unchanged and not force:
+                logger.info(f"Project {project_id} insight is up to date")
+                return True
+
+            # Packed to the insight token budget by the strategy
+            trend_summary = self.collective_strategy.summarize_multiple(
+                [story.summary for story in stories],
+                storytellers=[story.storyteller for story in stories],
+            )
             project.insight_json = trend_summary
-            project.save(update_fields=["insight_json"])
+            # An empty result (failed request) is retried on the next refresh
+            project.insight_sources = sources if trend_summary else None
+            project.insight_updated_at = timezone.now()
+            project.save(
+                update_fields=["insight_json", "insight_sources", "insight_updated_at"]
+            )
             return True
 
         except Project.DoesNotExist:
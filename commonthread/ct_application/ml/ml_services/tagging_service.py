@@ -1,12 +1,28 @@
-from typing import List, Dict, Optional
+from functools import partial
+from typing import List, Dict, Iterable, Optional
+from django.conf import settings
 from django.db import transaction
 from django.core.exceptions import ObjectDoesNotExist
-from ct_application.models import Story, Tag, StoryTag
-from ..ml_pipelines.tagging_pipeline import HFTaggingStrategy, TaggingStrategy
+from ct_application.models import Story, StoryTag
+from ct_application.tags import upsert_tags
+from ct_application.story_cache import invalidate_story_cache, invalidate_project_stats
+from ct_application.registry import get_shared
+from ..ml_pipelines.tagging_pipeline import TaggingStrategy
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Texts per NER forward pass, and stories loaded/written per transaction
+TAGGING_BATCH_SIZE = getattr(settings, "TAGGING_BATCH_SIZE", 16)
+TAGGING_CHUNK_SIZE = getattr(settings, "TAGGING_CHUNK_SIZE", 256)
+
+
+def _invalidate_caches(story_ids: Iterable[int], project_ids: Iterable[int]) -> None:
+    for story_id in story_ids:
+        invalidate_story_cache(story_id)
+    for project_id in project_ids:
+        invalidate_project_stats(project_id)
+
 
 def get_story_text(story_id: int) -> Optional[str]:
     try:
@@ -18,14 +34,39 @@ def get_story_text(story_id: int) -> Optional[str]:
 
 
 class TaggingService:
-    def __init__(self, tagging_strategy: TaggingStrategy = HFTaggingStrategy()):
+    def __init__(self, tagging_strategy: Optional[TaggingStrategy] = None):
+        # None: the shared HF NER strategy, loaded on first use
+        self._tagging_strategy = tagging_strategy
 
-        self.tagging_strategy = tagging_strategy
+    @property
+    def tagging_strategy(self) -> TaggingStrategy:
+        if self._tagging_strategy is None:
+            self._tagging_strategy = get_shared("tagging")
+        return self._tagging_strategy
 
     def _get_ml_tags_for_story(self, story_text: str) -> List[Dict[str, str]]:
 
         return self.tagging_strategy.get_tags(story_text)
 
+    def _save_tags(self, tags_by_story: Dict[int, List[Dict[str, str]]]) -> int:
+        """
+        Writes the tags of many stories with one tag upsert and one StoryTag
+        bulk insert. Returns the number of story-tag links written.
+        """
+        identities = {
+            story_id: {(tag["label"], tag["word"], "computer", False) for tag in tags}
+            for story_id, tags in tags_by_story.items()
+        }
+        tag_ids = upsert_tags(i for found in identities.values() for i in found)
+        links = [
+            StoryTag(story_id=story_id, tag_id=tag_ids[identity])
+            for story_id, found in identities.items()
+            for identity in found
+            if identity in tag_ids
+        ]
+        StoryTag.objects.bulk_create(links, ignore_conflicts=True)
+        return len(links)
+
     @transaction.atomic
     def process_story_tags(self, story_id: int) -> bool:
 
@@ -36,23 +77,63 @@ class TaggingService:
         try:
             suggested_tags = self._get_ml_tags_for_story(story_text)
 
-            created_tags = []
-
-            for tag in suggested_tags:
-                tag_name = tag["label"]
-                tag_value = tag["word"]
-
-                tag, _ = Tag.objects.get_or_create(
-                    name=tag_name, value=tag_value, created_by="computer",required=False
-                )
-
-                story = Story.objects.get(id=story_id)
-                StoryTag.objects.get_or_create(story=story, tag=tag)
-
-                created_tags.append(tag)
-            logger.info(f"Created {len(created_tags)} tags for story {story_id}")
+            created = self._save_tags({story_id: suggested_tags})
+            logger.info(f"Created {created} tags for story {story_id}")
+            project_id = (
+                Story.objects.filter(id=story_id).values_list("proj_id", flat=True).first()
+            )
+            transaction.on_commit(partial(_invalidate_caches, [story_id], [project_id]))
             return True
 
         except Exception as e:
             logger.error(f"Error processing tags for story {story_id}: {str(e)}")
             return False
+
+    def process_stories_tags(
+        self,
+        story_ids: Iterable[int],
+        batch_size: int = TAGGING_BATCH_SIZE,
+        chunk_size: int = TAGGING_CHUNK_SIZE,
+    ) -> int:
+        """
+        Batch mode for re-tagging many stories (e.g. a whole project after a
+        model change). Each chunk of stories is loaded in one query, tagged in
+        one batched strategy call and written in bulk inside its own
+        transaction, so a failure only loses the current chunk.
+
+        Returns the number of stories tagged.
+        """
+        story_ids = list(dict.fromkeys(story_ids))
+        tagged = 0
+        for start in range(0, len(story_ids), chunk_size):
+            chunk = story_ids[start : start + chunk_size]
+            rows = list(
+                Story.objects.filter(id__in=chunk)
+                .exclude(text_content="")
+                .values_list("id", "proj_id", "text_content")
+            )
+            if not rows:
+                continue
+
+            results = self.tagging_strategy.get_tags_batch(
+                [text for _, _, text in rows], batch_size=batch_size
+            )
+            tags_by_story = {
+                story_id: tags for (story_id, _, _), tags in zip(rows, results)
+            }
+
+            with transaction.atomic():
+                created = self._save_tags(tags_by_story)
+                transaction.on_commit(
+                    partial(
+                        _invalidate_caches,
+                        [story_id for story_id, _, _ in rows],
+                        {project_id for _, project_id, _ in rows},
+                    )
+                )
+            tagged += len(rows)
+            logger.info(
+                f"Tagged {tagged}/{len(story_ids)} stories "
+                f"({created} tag links in last chunk)"
+            )
+        return tagged
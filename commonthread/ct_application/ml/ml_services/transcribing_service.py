@@ -1,14 +1,14 @@
-from typing import BinaryIO
+from typing import BinaryIO, Optional
 import logging
 from ..ml_pipelines.transcribing_pipeline import (
-    HFTranscribingStrategy,
     TranscribingStrategy,
-    DeepgramTranscribingStrategy,
     AudioInput,
 )
 from ct_application.models import Story
 from commonthread.settings import CT_BUCKET_STORY_AUDIO
 from ct_application.utils import generate_s3_presigned
+from ct_application.story_cache import invalidate_story_cache, invalidate_project_stats
+from ct_application.registry import get_shared
 
 logger = logging.getLogger(__name__)
 
@@ -25,11 +25,15 @@ def get_story_presigned_url(story_id: int) -> BinaryIO:
 
 
 class TranscribingService:
-    def __init__(
-        self,
-        transcribing_strategy: TranscribingStrategy = DeepgramTranscribingStrategy(),
-    ):
-        self.transcribing_strategy = transcribing_strategy
+    def __init__(self, transcribing_strategy: Optional[TranscribingStrategy] = None):
+        # None: the shared Deepgram strategy, created on first use
+        self._transcribing_strategy = transcribing_strategy
+
+    @property
+    def transcribing_strategy(self) -> TranscribingStrategy:
+        if self._transcribing_strategy is None:
+            self._transcribing_strategy = get_shared("transcribing")
+        return self._transcribing_strategy
 
     def process_story_transcription(
         self, story_id: int, use_presigned: bool = True
@@ -40,14 +44,20 @@ class TranscribingService:
         """
         try:
             audio_source = get_story_presigned_url(story_id)
-            audio_input = AudioInput(presigned_url=audio_source)
-            transcribed_text = self.transcribing_strategy.transcribe(audio_input)
-            
-            # Overwrite the Story.text_content with the transcription
             story = Story.objects.get(id=story_id)
+            # Uploaded audio keys are never reused, so the key identifies the audio
+            audio_input = AudioInput(
+                presigned_url=audio_source, cache_key=str(story.audio_content)
+            )
+            transcribed_text = self.transcribing_strategy.transcribe_cached(audio_input)
+
+            # Overwrite the Story.text_content with the transcription
             story.text_content = transcribed_text
             story.save(update_fields=["text_content"])
+            invalidate_story_cache(story_id)
+            invalidate_project_stats(story.proj_id)
             logger.info(f"Saved transcription into text_content for story {story_id}")
+            return True
 
         except Exception as e:
             logger.exception(f"Failed to process transcription for story {story_id},{str(e)}")
@@ -10,7 +10,7 @@ def get_perplexity_chat_response(api_key: str, context: str, user_message: str)
 
     Args:
         api_key: The Perplexity API key.
-        context: The project context (concatenated stories).
+        context: The project context (the story excerpts relevant to the question).
         user_message: The user's message/question.
 
     Returns:
@@ -0,0 +1,118 @@
+"""
+Persistent memoization of ML pipeline outputs.
+
+Results are stored in the MLResult table keyed by (pipeline, model, SHA-256
+of the input), so re-queued or duplicate work is a lookup instead of another
+inference pass. The model string should change whenever the output would
+(model name, revision, generation parameters).
+
+The table is bounded to ML_RESULT_CACHE_MAX_ENTRIES rows; every
+ML_RESULT_CACHE_EVICT_EVERY inserts the least recently used rows beyond the
+bound are deleted.
+
+Outside a configured Django process (e.g. running a pipeline's test script
+directly) every lookup misses and nothing is stored.
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ML_RESULT_CACHE_MAX_ENTRIES = getattr(settings, "ML_RESULT_CACHE_MAX_ENTRIES", 50000)
+ML_RESULT_CACHE_EVICT_EVERY = getattr(settings, "ML_RESULT_CACHE_EVICT_EVERY", 100)
+
+_lock = threading.Lock()
+_inserts_since_evict = 0
+
+
+def input_hash(payload: str) -> str:
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _model():
+    if not apps.ready:
+        return None
+    return apps.get_model("ct_application", "MLResult")
+
+
+def get_results(pipeline: str, model: str, hashes: Iterable[str]) -> Dict[str, Any]:
+    # {input hash: result} for the hashes that are cached, in one query
+    MLResult = _model()
+    hashes = list(set(hashes))
+    if MLResult is None or not hashes:
+        return {}
+    rows = list(
+        MLResult.objects.filter(
+            pipeline=pipeline, model=model, input_hash__in=hashes
+        ).values_list("id", "input_hash", "result")
+    )
+    if rows:
+        MLResult.objects.filter(id__in=[row[0] for row in rows]).update(
+            last_used_at=timezone.now()
+        )
+    return {digest: result for _, digest, result in rows}
+
+
+def set_results(pipeline: str, model: str, results: Dict[str, Any]) -> None:
+    global _inserts_since_evict
+    MLResult = _model()
+    if MLResult is None or not results:
+        return
+    now = timezone.now()
+    MLResult.objects.bulk_create(
+        [
+            MLResult(
+                pipeline=pipeline,
+                model=model,
+                input_hash=digest,
+                result=result,
+                last_used_at=now,
+            )
+            for digest, result in results.items()
+        ],
+        ignore_conflicts=True,
+    )
+    with _lock:
+        _inserts_since_evict += len(results)
+        if _inserts_since_evict < ML_RESULT_CACHE_EVICT_EVERY:
+            return
+        _inserts_since_evict = 0
+    evict()
+
+
+def evict(max_entries: Optional[int] = None) -> int:
+    # Drop the least recently used rows beyond max_entries
+    MLResult = _model()
+    if MLResult is None:
+        return 0
+    max_entries = ML_RESULT_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    stale = list(
+        MLResult.objects.order_by("-last_used_at", "-id").values_list("id", flat=True)[
+            max_entries:
+        ]
+    )
+    if stale:
+        MLResult.objects.filter(id__in=stale).delete()
+        logger.info("Evicted %d cached ML results", len(stale))
+    return len(stale)
+
+
+def memoize(pipeline: str, model: str, payload: str, compute: Callable[[], Any]) -> Any:
+    """
+    Returns the cached result for payload, or compute() stored for next time.
+    Falsy results (failed runs) are not stored.
+    """
+    digest = input_hash(payload)
+    cached = get_results(pipeline, model, [digest])
+    if digest in cached:
+        return cached[digest]
+    result = compute()
+    if result:
+        set_results(pipeline, model, {digest: result})
+    return result
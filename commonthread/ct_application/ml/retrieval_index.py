@@ -0,0 +1,264 @@
+"""
+Per-project retrieval index for project chat.
+
+Stories are split into overlapping word windows (CHAT_CHUNK_WORDS words,
+CHAT_CHUNK_OVERLAP shared with the previous window) and each chat turn sends
+only the CHAT_TOP_K chunks most relevant to the question, so a turn's prompt
+size no longer depends on how many stories the project has.
+
+Chunks are embedded with a local sentence-transformer (CHAT_EMBEDDING_MODEL)
+into one float32 matrix per project and ranked by cosine similarity. When the
+model can't be loaded, chunks are ranked with BM25 instead.
+
+Indexes are kept in process memory for the CHAT_INDEX_MAX_PROJECTS most
+recently used projects and updated lazily: a turn compares the project's
+cache version (bumped by invalidate_project_stats) with the one the index was
+synced at, and only when it moved re-reads the stories' MD5s and re-chunks the
+stories that were added or edited. The MD5s are also re-read once the index is
+CHAT_INDEX_MAX_AGE seconds old, since a version bump made by the ML worker
+(e.g. after a transcription) doesn't reach the web processes unless they
+share its cache backend. Chunk embeddings are memoized in MLResult, so
+another worker process rebuilds an index without re-running the model.
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from django.conf import settings
+from django.db.models.functions import MD5
+from ct_application.ml.result_cache import get_results, input_hash, set_results
+from ct_application.models import Story
+from ct_application.registry import get_shared
+from ct_application.story_cache import get_project_version
+
+logger = logging.getLogger(__name__)
+
+CHAT_CHUNK_WORDS = getattr(settings, "CHAT_CHUNK_WORDS", 150)
+CHAT_CHUNK_OVERLAP = getattr(settings, "CHAT_CHUNK_OVERLAP", 30)
+CHAT_TOP_K = getattr(settings, "CHAT_TOP_K", 8)
+CHAT_INDEX_MAX_PROJECTS = getattr(settings, "CHAT_INDEX_MAX_PROJECTS", 32)
+CHAT_INDEX_MAX_AGE = getattr(settings, "CHAT_INDEX_MAX_AGE", 60)
+CHAT_EMBEDDING_MODEL = getattr(
+    settings, "CHAT_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
+)
+
+# BM25 parameters
+_K1 = 1.5
+_B = 0.75
+
+
+def chunk_text(
+    text: str, size: int = CHAT_CHUNK_WORDS, overlap: int = CHAT_CHUNK_OVERLAP
+) -> List[str]:
+    words = (text or "").split()
+    if not words:
+        return []
+    step = max(size - overlap, 1)
+    return [
+        " ".join(words[i : i + size])
+        for i in range(0, max(len(words) - overlap, 1), step)
+    ]
+
+
+def _terms(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+class SentenceTransformerEmbedder:
+    """Normalized sentence-transformer embeddings, memoized per chunk."""
+
+    def __init__(self, model_name: str = CHAT_EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts, normalize_embeddings=True, convert_to_numpy=True
+        ).astype(np.float32)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        hashes = [input_hash(text) for text in texts]
+        vectors = get_results("embedding", self.model_name, hashes)
+        missing = {h: text for h, text in zip(hashes, texts) if h not in vectors}
+        if missing:
+            computed = self._encode(list(missing.values()))
+            new = {h: v.tolist() for h, v in zip(missing, computed)}
+            set_results("embedding", self.model_name, new)
+            vectors.update(new)
+        return np.asarray([vectors[h] for h in hashes], dtype=np.float32)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._encode([text])[0]
+
+
+def build_embedder() -> Optional[SentenceTransformerEmbedder]:
+    """The registry's "chat_embedder" factory; None means rank with BM25."""
+    try:
+        return SentenceTransformerEmbedder()
+    except Exception as e:
+        logger.warning(f"Ranking chat context with BM25, embedder unavailable: {e}")
+        return None
+
+
+class ProjectIndex:
+    """The chunks of one project's stories and their embeddings or BM25 terms."""
+
+    def __init__(self, embedder: Optional[SentenceTransformerEmbedder] = None):
+        self.embedder = embedder
+        self.lock = threading.Lock()
+        self.version: Optional[int] = None
+        self.synced_at = float("-inf")  # time.monotonic() of the last MD5 read
+        self.story_hashes: Dict[int, Optional[str]] = {}
+        self.chunks: List[str] = []
+        self.story_ids = np.empty(0, dtype=np.int64)
+        self.vectors: Optional[np.ndarray] = None  # (chunks, dim) float32
+        self.terms: List[Counter] = []
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lengths = np.empty(0, dtype=np.float32)
+
+    def sync(self, project_id: int, max_age: float = CHAT_INDEX_MAX_AGE) -> None:
+        """Re-chunk the stories added or edited since the last sync."""
+        # Read before the stories, so a change made meanwhile bumps it again
+        version = get_project_version(project_id)
+        now = time.monotonic()
+        if version == self.version and now - self.synced_at < max_age:
+            return
+        current = dict(
+            Story.objects.filter(proj_id=project_id)
+            .annotate(digest=MD5("text_content"))
+            .values_list("id", "digest")
+        )
+        changed = [
+            story_id
+            for story_id, digest in current.items()
+            if self.story_hashes.get(story_id, "") != digest
+        ]
+        texts = dict(
+            Story.objects.filter(id__in=changed).values_list("id", "text_content")
+        )
+        removed = {story_id for story_id in self.story_hashes if story_id not in current}
+        if changed or removed:
+            self.update(removed | set(changed), texts)
+            logger.info(
+                f"Chat index for project {project_id}: {len(texts)} stories "
+                f"re-chunked, {len(removed)} removed, {len(self.chunks)} chunks"
+            )
+        self.story_hashes = {
+            story_id: digest
+            for story_id, digest in current.items()
+            if story_id in texts or story_id not in changed
+        }
+        self.version = version
+        self.synced_at = now
+
+    def update(self, stale: Set[int], texts: Dict[int, str]) -> None:
+        """Drop the chunks of the stale stories and add those of texts."""
+        keep = ~np.isin(self.story_ids, list(stale))
+        new_chunks, new_ids = [], []
+        for story_id, text in texts.items():
+            for chunk in chunk_text(text):
+                new_chunks.append(chunk)
+                new_ids.append(story_id)
+
+        self.chunks = [c for c, kept in zip(self.chunks, keep) if kept] + new_chunks
+        self.story_ids = np.concatenate(
+            [self.story_ids[keep], np.asarray(new_ids, dtype=np.int64)]
+        )
+        if self.embedder is not None:
+            parts = [] if self.vectors is None else [self.vectors[keep]]
+            if new_chunks:
+                parts.append(self.embedder.embed(new_chunks))
+            self.vectors = np.vstack(parts) if parts else None
+        else:
+            self.terms = [t for t, kept in zip(self.terms, keep) if kept] + [
+                Counter(_terms(chunk)) for chunk in new_chunks
+            ]
+            self._index_terms()
+
+    def _index_terms(self) -> None:
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for row, counts in enumerate(self.terms):
+            for term, count in counts.items():
+                rows, tfs = postings.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(count)
+        self._postings = {
+            term: (np.asarray(rows), np.asarray(tfs, dtype=np.float32))
+            for term, (rows, tfs) in postings.items()
+        }
+        self._lengths = np.asarray(
+            [sum(counts.values()) for counts in self.terms], dtype=np.float32
+        )
+
+    def _bm25(self, question: str) -> np.ndarray:
+        n = len(self.terms)
+        scores = np.zeros(n, dtype=np.float32)
+        norm = _K1 * (1 - _B + _B * self._lengths / max(self._lengths.mean(), 1.0))
+        for term in set(_terms(question)):
+            if term not in self._postings:
+                continue
+            rows, tfs = self._postings[term]
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * tfs * (_K1 + 1) / (tfs + norm[rows])
+        return scores
+
+    def top_k(self, question: str, k: int = CHAT_TOP_K) -> List[Tuple[int, str]]:
+        """(story id, chunk) of the k chunks that best match question."""
+        if not self.chunks or k <= 0:
+            return []
+        if self.embedder is not None:
+            scores = self.vectors @ self.embedder.embed_query(question)
+        else:
+            scores = self._bm25(question)
+        k = min(k, len(self.chunks))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        if self.embedder is None:
+            # No shared terms: nothing relevant to send
+            best = best[scores[best] > 0]
+        return [(int(self.story_ids[i]), self.chunks[i]) for i in best]
+
+
+_indexes: "OrderedDict[int, ProjectIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _index_for(project_id: int) -> ProjectIndex:
+    # Load the embedder before taking the lock: the first call can take a while,
+    # and get_shared has its own per-name lock, so other projects' lookups
+    # shouldn't wait on it
+    embedder = get_shared("chat_embedder")
+    with _indexes_lock:
+        index = _indexes.get(project_id)
+        if index is None:
+            index = _indexes[project_id] = ProjectIndex(embedder)
+        _indexes.move_to_end(project_id)
+        while len(_indexes) > CHAT_INDEX_MAX_PROJECTS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def retrieve_chunks(
+    project_id: int, question: str, k: int = CHAT_TOP_K
+) -> List[Tuple[int, str]]:
+    """The k chunks of the project's stories most relevant to question."""
+    index = _index_for(project_id)
+    with index.lock:
+        index.sync(project_id)
+        return index.top_k(question, k)
+
+
+def reset_indexes(project_ids: Optional[Iterable[int]] = None) -> None:
+    # Forget the in-memory indexes (all, or those of project_ids)
+    with _indexes_lock:
+        if project_ids is None:
+            _indexes.clear()
+        for project_id in project_ids or ():
+            _indexes.pop(project_id, None)
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 # consider use of uniqueconstraints
@@ -25,6 +27,9 @@ class Organization(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField(default="")
     profile = models.FileField(upload_to="org_pics/", default="org_default.jpg")
+    # Maintained by ct_application.counters, see reconcile_counts command
+    project_count = models.PositiveIntegerField(default=0)
+    story_count = models.PositiveIntegerField(default=0)
 
 
 # project
@@ -36,6 +41,10 @@ class Project(models.Model):
     date = models.DateField()
     insight = models.TextField(null=True, blank=True)
     insight_json = models.JSONField(null=True, blank=True)
+    # {story id: summary hash} the current insight was built from
+    insight_sources = models.JSONField(null=True, blank=True)
+    insight_updated_at = models.DateTimeField(null=True, blank=True)
+    story_count = models.PositiveIntegerField(default=0)
 
 
 # story
@@ -64,11 +73,44 @@ class Tag(models.Model):
     created_at = models.DateTimeField(auto_now=True)
     created_by = models.TextField(choices=[('user', 'user'), ('computer', 'computer')], null=True)
 
+    class Meta:
+        # Tag identity used by tags.upsert_tags. NULL value/created_by must
+        # compare equal so project tags without a value are shared too; one
+        # partial index per NULL combination does that on every Postgres
+        # version (nulls_distinct=False needs Postgres 15).
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "value", "created_by", "required"],
+                condition=Q(value__isnull=False, created_by__isnull=False),
+                name="unique_tag_identity",
+            ),
+            models.UniqueConstraint(
+                fields=["name", "created_by", "required"],
+                condition=Q(value__isnull=True, created_by__isnull=False),
+                name="unique_tag_identity_null_value",
+            ),
+            models.UniqueConstraint(
+                fields=["name", "value", "required"],
+                condition=Q(value__isnull=False, created_by__isnull=True),
+                name="unique_tag_identity_null_created_by",
+            ),
+            models.UniqueConstraint(
+                fields=["name", "required"],
+                condition=Q(value__isnull=True, created_by__isnull=True),
+                name="unique_tag_identity_null_both",
+            ),
+        ]
+
 # story-tag
 class StoryTag(models.Model):
     story = models.ForeignKey(Story, on_delete=models.CASCADE)
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["story", "tag"], name="unique_story_tag")
+        ]
+
 
 # project-tag
 class ProjectTag(models.Model):
@@ -93,4 +135,67 @@ class MLProcessingQueue(models.Model):
     story = models.ForeignKey(Story, null=True, on_delete=models.CASCADE)
     task_type = models.TextField(choices=[('tag', 'tag'), ('summary', 'summary'), ('insight', 'insight')])
     status = models.TextField(choices=[('processing', 'processing'), ('completed', 'completed'), ('failed', 'failed')])
-    timestamp = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    timestamp = models.DateTimeField(auto_now_add=True)
+    # queue message job_id last dispatched for this entry; a redelivered
+    # message whose job already completed is skipped
+    job_id = models.CharField(max_length=255, blank=True, default="", db_index=True)
+
+# SQS messages written with the story transaction and sent after commit by
+# cloud.producer_service.relay_outbox
+class MLOutbox(models.Model):
+    job_id = models.CharField(max_length=255)
+    body = models.JSONField()
+    group_id = models.CharField(max_length=128)
+    deduplication_id = models.CharField(max_length=128)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # set while a relay is sending the row (see relay_outbox)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+
+# jobs of the database queue backend, see cloud/db_queue.py
+class MLJob(models.Model):
+    job_id = models.CharField(max_length=255, unique=True)
+    body = models.JSONField()
+    # jobs sharing a group (one story) run one at a time, in id order
+    group_id = models.CharField(max_length=128)
+    # scheduling metadata set by QueueProducer: lower priority runs first,
+    # orgs get a fair share of workers
+    task_type = models.CharField(max_length=50, blank=True, default="")
+    priority = models.SmallIntegerField(default=0)
+    org_id = models.IntegerField(null=True, blank=True)
+    status = models.CharField(
+        max_length=20,
+        choices=[("pending", "pending"), ("running", "running"), ("done", "done"), ("failed", "failed")],
+        default="pending",
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at"], name="mljob_claim_idx"),
+            models.Index(fields=["group_id", "id"], name="mljob_group_idx"),
+        ]
+
+
+# memoized ML pipeline outputs, see ml/result_cache.py
+class MLResult(models.Model):
+    pipeline = models.CharField(max_length=50)
+    model = models.CharField(max_length=255)
+    input_hash = models.CharField(max_length=64)  # sha256 of text / audio key
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["pipeline", "model", "input_hash"], name="unique_ml_result"
+            )
+        ]
@@ -0,0 +1,76 @@
+"""
+Process-wide registry of expensive shared objects: ML pipeline strategies,
+API clients and the SQS client/queue strategy.
+
+Entries are registered by dotted path and built on first use, once per
+process, then shared by every service instance. Importing a service (or
+views.py) therefore never loads a model or opens a client; a web worker that
+never tags a story never loads BERT.
+
+settings.SHARED_INSTANCE_FACTORIES can point any name at another factory,
+e.g. {"queue": "ct_application.cloud.producer_service.SimpleQueueStrategy"}.
+"""
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Union
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_PIPELINES = "ct_application.ml.ml_pipelines"
+_PRODUCER = "ct_application.cloud.producer_service"
+
+FACTORIES: Dict[str, Union[str, Callable[[], Any]]] = {
+    "tagging": f"{_PIPELINES}.tagging_pipeline.HFTaggingStrategy",
+    "local_summarizing": f"{_PIPELINES}.summarizing_pipeline.LocalSummarizingStrategy",
+    "collective_summarizing": f"{_PIPELINES}.summarizing_pipeline.CollectiveSummarizingStrategy",
+    "transcribing": f"{_PIPELINES}.transcribing_pipeline.DeepgramTranscribingStrategy",
+    "token_counter": "ct_application.ml.context_packer.build_token_counter",
+    "chat_embedder": "ct_application.ml.retrieval_index.build_embedder",
+    "sqs_client": f"{_PRODUCER}.build_sqs_client",
+    "queue": f"{_PRODUCER}.build_queue_strategy",
+}
+FACTORIES.update(getattr(settings, "SHARED_INSTANCE_FACTORIES", {}))
+
+_instances: Dict[str, Any] = {}
+_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def _lock_for(name: str) -> threading.Lock:
+    with _registry_lock:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def get_shared(name: str) -> Any:
+    """
+    The process-wide instance for name, built on first use. Building is
+    serialized per name, so two threads never load the same model twice.
+    """
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    with _lock_for(name):
+        if name not in _instances:
+            factory = FACTORIES[name]
+            if isinstance(factory, str):
+                factory = import_string(factory)
+            logger.info("Building shared instance %r", name)
+            _instances[name] = factory()
+    return _instances[name]
+
+
+def set_shared(name: str, instance: Any) -> None:
+    # Install a ready-made instance (tests, warm-up scripts)
+    _instances[name] = instance
+
+
+def reset_shared(name: Optional[str] = None) -> None:
+    # Forget one (or every) instance; the next get_shared rebuilds it
+    if name is None:
+        _instances.clear()
+    else:
+        _instances.pop(name, None)
@@ -0,0 +1,132 @@
+"""
+Response caches for get_story and get_project_stats.
+
+The story body (everything except media links) is cached under the story id
+and a content version. Writers bump the version through
+invalidate_story_cache, so a stale body is never read again even if a slow
+request stores it after the bump. Project dashboard stats follow the same
+scheme with a per-project version bumped by invalidate_project_stats.
+
+The ML worker bumps versions from its own process, so bodies and stats are
+only cached when STORY_CACHE_ALIAS is a shared backend. With a per-process
+backend (LocMemCache) every read misses and nothing is stored (system check
+ct_application.W002).
+
+Presigned media URLs are not part of the cached body; they come from the
+presigned URL cache in utils.generate_s3_presigned.
+"""
+
+import logging
+import time
+from typing import Iterable, Optional
+from django.conf import settings
+from django.core.cache import caches
+from .checks import is_process_local
+
+logger = logging.getLogger(__name__)
+
+STORY_CACHE_ALIAS = getattr(settings, "STORY_CACHE_ALIAS", "default")
+STORY_CACHE_TIMEOUT = getattr(settings, "STORY_CACHE_TIMEOUT", 60 * 15)
+
+
+def _cache():
+    return caches[STORY_CACHE_ALIAS]
+
+
+def _enabled() -> bool:
+    return not is_process_local(STORY_CACHE_ALIAS)
+
+
+def _version_key(story_id) -> str:
+    return f"story:version:{story_id}"
+
+
+def _body_key(story_id, version) -> str:
+    return f"story:body:{story_id}:{version}"
+
+
+def _project_version_key(project_id) -> str:
+    return f"project:version:{project_id}"
+
+
+def _stats_key(project_id, version) -> str:
+    return f"project:stats:{project_id}:{version}"
+
+
+def _new_version() -> int:
+    # Time based, so an evicted version counter never restarts at a number an
+    # old body is still stored under.
+    return time.time_ns()
+
+
+def _get_version(key) -> int:
+    version = _cache().get(key)
+    if version is None:
+        version = _new_version()
+        if not _cache().add(key, version, None):
+            version = _cache().get(key, version)
+    return version
+
+
+def get_story_version(story_id) -> int:
+    return _get_version(_version_key(story_id))
+
+
+def get_project_version(project_id) -> int:
+    return _get_version(_project_version_key(project_id))
+
+
+## Story body ------------------------------------------------------------------
+
+
+def get_story_body(story_id) -> Optional[dict]:
+    if not _enabled():
+        return None
+    return _cache().get(_body_key(story_id, get_story_version(story_id)))
+
+
+def set_story_body(story_id, version, body: dict) -> None:
+    """
+    version: the value of get_story_version read *before* the story was
+    loaded, so a concurrent invalidation wins over this write.
+    """
+    if _enabled():
+        _cache().set(_body_key(story_id, version), body, STORY_CACHE_TIMEOUT)
+
+
+def invalidate_story_cache(story_id) -> None:
+    # Called by every writer of story fields, tags or media
+    logger.debug("Invalidating story cache for story %s", story_id)
+    _cache().set(_version_key(story_id), _new_version(), None)
+
+
+def invalidate_story_caches(story_ids: Iterable) -> None:
+    # Many stories at once, e.g. those of a renamed project (its name is part
+    # of every story body)
+    version = _new_version()
+    keys = {_version_key(story_id): version for story_id in story_ids}
+    logger.debug("Invalidating story cache for %d stories", len(keys))
+    if keys:
+        _cache().set_many(keys, None)
+
+
+## Project stats ---------------------------------------------------------------
+
+
+def get_project_stats_body(project_id) -> Optional[dict]:
+    if not _enabled():
+        return None
+    return _cache().get(_stats_key(project_id, get_project_version(project_id)))
+
+
+def set_project_stats_body(project_id, version, stats: dict) -> None:
+    # version: get_project_version read before the aggregates were computed
+    if _enabled():
+        _cache().set(_stats_key(project_id, version), stats, STORY_CACHE_TIMEOUT)
+
+
+def invalidate_project_stats(project_id) -> None:
+    # Called whenever a story of the project is added, edited, re-tagged or
+    # deleted
+    logger.debug("Invalidating stats cache for project %s", project_id)
+    _cache().set(_project_version_key(project_id), _new_version(), None)
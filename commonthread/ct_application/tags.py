@@ -0,0 +1,67 @@
+"""
+Bulk tag upsert shared by create_story, create_project and TaggingService.
+
+A tag is identified by (name, value, created_by, required), enforced by the
+unique_tag_identity* constraints on Tag. upsert_tags resolves a whole batch of
+identities with one SELECT for the tags that already exist and a single
+bulk_create for the rest (plus one SELECT for the new ids), instead of a
+get_or_create round trip per tag.
+"""
+
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+from django.db.models import Q
+from .models import Tag
+
+logger = logging.getLogger(__name__)
+
+TagIdentity = Tuple[str, Optional[str], Optional[str], bool]
+
+TAG_IDENTITY_FIELDS = ["name", "value", "created_by", "required"]
+
+
+def _identity(tag: Tag) -> TagIdentity:
+    return (tag.name, tag.value, tag.created_by, tag.required)
+
+
+def _normalize(identity) -> TagIdentity:
+    # Form/model values may be numbers; keys must match what the DB returns
+    name, value, created_by, required = identity
+    return (str(name), None if value is None else str(value), created_by, bool(required))
+
+
+def _select(identities) -> Dict[TagIdentity, int]:
+    match = Q()
+    for name, value, created_by, required in identities:
+        # value=None / created_by=None become IS NULL lookups
+        match |= Q(name=name, value=value, created_by=created_by, required=required)
+    return {
+        _identity(tag): tag.id
+        for tag in Tag.objects.filter(match).only(*TAG_IDENTITY_FIELDS)
+    }
+
+
+def upsert_tags(identities: Iterable[TagIdentity]) -> Dict[TagIdentity, int]:
+    """
+    identities: (name, value, created_by, required) tuples, duplicates allowed.
+    Returns {identity: tag id} for every distinct identity, creating the
+    missing tags.
+    """
+    identities = list(dict.fromkeys(_normalize(i) for i in identities))
+    if not identities:
+        return {}
+
+    tag_ids = _select(identities)
+    missing = [
+        Tag(**dict(zip(TAG_IDENTITY_FIELDS, identity)))
+        for identity in identities
+        if identity not in tag_ids
+    ]
+    if missing:
+        # ON CONFLICT DO NOTHING: a concurrent writer may have inserted the
+        # same identity since the select. Inserted ids are not returned with
+        # ignore_conflicts, so read them back in one more select.
+        Tag.objects.bulk_create(missing, ignore_conflicts=True)
+        tag_ids.update(_select([_identity(tag) for tag in missing]))
+        logger.debug("Created %d of %d tag(s)", len(missing), len(identities))
+    return tag_ids
@@ -0,0 +1,29 @@
+# Fixtures for the backend test modules that don't go through the API
+import datetime
+import pytest
+from ct_application.models import CustomUser, Organization, Project, Story
+
+
+@pytest.fixture
+def project():
+    curator = CustomUser.objects.create_user(
+        username="worker", email="worker@example.com", password="pw", name="Worker"
+    )
+    org = Organization.objects.create(name="Worker Org")
+    return Project.objects.create(
+        org=org, name="Worker Project", curator=curator, date=datetime.date(2025, 4, 1)
+    )
+
+
+@pytest.fixture
+def make_story(project):
+    def make(text="A story", **fields):
+        return Story.objects.create(
+            proj=project,
+            curator=project.curator,
+            date=datetime.date(2025, 4, 2),
+            text_content=text,
+            **fields,
+        )
+
+    return make
@@ -0,0 +1,112 @@
+# test_db_queue.py
+# Database-backed ML job queue (cloud/db_queue.py)
+from unittest.mock import MagicMock
+import pytest
+from ct_application.cloud import db_queue
+from ct_application.cloud.producer_service import DatabaseQueueStrategy, QueueProducer
+from ct_application.models import MLJob, Story
+
+pytestmark = pytest.mark.django_db
+
+
+def test_database_queue_runs_story_jobs_in_order(make_story):
+    stories = [make_story(), make_story()]
+    for story in stories:
+        result = QueueProducer(DatabaseQueueStrategy()).add_to_queue(story)
+        assert result["success"]
+
+    # one job per story at a time, oldest first
+    first = db_queue.claim_jobs(10)
+    assert [j.group_id for j in first] == [str(story.id) for story in stories]
+    assert [j.body["task_type"] for j in first] == ["summarization", "summarization"]
+    assert db_queue.claim_jobs(10) == []
+
+    assert db_queue.complete_job(first[0])
+    (second,) = db_queue.claim_jobs(10)
+    assert second.group_id == str(stories[0].id) and second.body["task_type"] == "tag"
+
+
+def test_database_queue_retries_and_expired_leases():
+    job = MLJob.objects.create(job_id="j1", body={"task_type": "tag"}, group_id="1")
+    MLJob.objects.create(job_id="j2", body={"task_type": "tag"}, group_id="1")
+
+    (claimed,) = db_queue.claim_jobs(1, max_attempts=3)
+    assert db_queue.fail_job(claimed, "boom", max_attempts=3, backoff=0)
+    job.refresh_from_db()
+    assert (job.status, job.attempts, job.last_error) == ("pending", 1, "boom")
+
+    # a worker that dies leaves its lease to expire; the job is claimed again
+    (claimed,) = db_queue.claim_jobs(1, lease_seconds=0, max_attempts=3)
+    (reclaimed,) = db_queue.claim_jobs(1, max_attempts=3)
+    assert reclaimed.id == job.id and reclaimed.attempts == 3
+    # the first worker no longer owns it
+    assert not db_queue.complete_job(claimed)
+    assert not db_queue.extend_lease(claimed, 60)
+
+    assert db_queue.fail_job(reclaimed, "boom again", max_attempts=3)
+    job.refresh_from_db()
+    assert job.status == "failed"
+    (next_job,) = db_queue.claim_jobs(1, max_attempts=3)
+    assert next_job.job_id == "j2"
+
+
+def test_database_queue_claims_by_priority_and_org_fair_share():
+    def job(n, org, task_type="tag", priority=0):
+        return MLJob.objects.create(
+            job_id=f"j{n}",
+            body={"task_type": task_type},
+            group_id=f"s{n}",
+            task_type=task_type,
+            priority=priority,
+            org_id=org,
+        )
+
+    # a large import from org 1, queued before org 2's story
+    for n in range(6):
+        job(n, org=1)
+    job(6, org=1, task_type="summarization", priority=2)
+    job(7, org=2)
+
+    claimed = db_queue.claim_jobs(2)
+    assert [j.org_id for j in claimed] == [1, 2]
+    # org 1 already has a job running, so it does not get both next slots
+    assert [j.job_id for j in db_queue.claim_jobs(1)] == ["j1"]
+
+    remaining = db_queue.claim_jobs(10, type_limits={"summarization": 0})
+    assert [j.job_id for j in remaining] == ["j2", "j3", "j4", "j5"]
+    assert [j.job_id for j in db_queue.claim_jobs(10)] == ["j6"]
+
+
+def test_database_queue_completes_transcription_jobs(make_story, monkeypatch):
+    pytest.importorskip("transformers")
+    pytest.importorskip("deepgram")
+    from ct_application.cloud import consumer_service
+    from ct_application.ml.ml_services.transcribing_service import (
+        TranscribingService,
+    )
+
+    story = make_story("", audio_content="audio/upload-1.mp3")
+    assert QueueProducer(DatabaseQueueStrategy()).add_to_queue(story)["success"]
+    completed = []
+    monkeypatch.setattr(
+        consumer_service,
+        "complete_job",
+        lambda job: completed.append(job.job_id) or db_queue.complete_job(job),
+    )
+    # The real TranscribingService over a stubbed Deepgram strategy
+    strategy = MagicMock()
+    strategy.transcribe_cached.return_value = "the transcript"
+    worker = consumer_service.MLWorkerService()
+    worker.transcribing_service = TranscribingService(strategy)
+
+    (job,) = db_queue.claim_jobs(1)
+    assert job.body["task_type"] == "transcription"
+    assert worker._process_job(job)
+
+    assert completed == [job.job_id]
+    job.refresh_from_db()
+    assert (job.status, job.attempts) == ("done", 1)
+    assert Story.objects.get(id=story.id).text_content == "the transcript"
+    # The story's next job is claimable right away, not after a retry
+    (next_job,) = db_queue.claim_jobs(1)
+    assert next_job.body["task_type"] == "summarization"
@@ -20,11 +20,27 @@ from ct_application.models import (
 from commonthread.settings import JWT_SECRET_KEY
 from unittest.mock import patch, MagicMock
 from django.conf import settings
-from ct_application import views
+from django.core.cache import cache
+from django.core.cache.backends.filebased import FileBasedCache
+from ct_application import views, utils
+from ct_application.counters import reconcile_counts
+from ct_application import story_cache
+from ct_application.tags import upsert_tags
+from ct_application.ml import retrieval_index
+from ct_application import registry
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 
 pytestmark = pytest.mark.django_db
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # Ids are reused between tests, so cached auth/story entries must not leak
+    cache.clear()
+    retrieval_index.reset_indexes()
+
+
 # ────────────── seed data ──────────────
 @pytest.fixture
 def seed():
@@ -95,6 +111,9 @@ def seed():
     StoryTag.objects.create(story=story2, tag=tag)
     ProjectTag.objects.create(proj=proj_edit_delete, tag=tag)
 
+    # Rows above bypass the views, so fill in the maintained counters
+    reconcile_counts()
+
     return {
         "alice": alice,
         "brenda": brenda,
@@ -115,6 +134,19 @@ def client():
     return Client()
 
 
+@pytest.fixture
+def shared_cache(settings, tmp_path):
+    # A backend every process sees, as in a multi-process deployment
+    location = str(tmp_path / "cache")
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": location,
+        }
+    }
+    return location
+
+
 # ─────────── auth helpers ────────────
 @pytest.fixture
 def auth_headers(seed, client):
@@ -349,6 +381,47 @@ def test_create_story_basic(client, auth_headers, basic_story_payload):
     assert story_tags.count() == 2
 
 
+def test_create_story_reuses_tags(client, auth_headers, basic_story_payload):
+    hdrs = auth_headers()
+    for _ in range(2):
+        r = client.post(
+            "/story/create",
+            data=json.dumps(basic_story_payload),
+            content_type="application/json",
+            **hdrs,
+        )
+        assert r.status_code == 200
+    assert Tag.objects.filter(name="tag1", value="value1").count() == 1
+    assert StoryTag.objects.filter(tag__name="tag1").count() == 2
+
+
+@pytest.mark.parametrize("value", [None, "v"])
+@pytest.mark.parametrize("created_by", [None, "user"])
+def test_tag_identity_unique_with_nulls(value, created_by):
+    identity = dict(name="t", value=value, created_by=created_by, required=False)
+    Tag.objects.create(**identity)
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Tag.objects.create(**identity)
+    assert upsert_tags([("t", value, created_by, False)]) == {
+        ("t", value, created_by, False): Tag.objects.get(**identity).id
+    }
+
+
+def test_upsert_tags_batches_queries(seed, django_assert_num_queries):
+    identities = [(f"name{i}", i, "user", False) for i in range(20)]
+    identities += [("location", None, None, True), ("fun", "yes", None, False)]
+
+    # select existing, insert the rest, read back the new ids
+    with django_assert_num_queries(3):
+        tag_ids = upsert_tags(identities)
+    assert len(tag_ids) == 22
+    assert tag_ids[("fun", "yes", None, False)] == seed["tag"].id
+    assert tag_ids[("name3", "3", "user", False)] == Tag.objects.get(name="name3").id
+
+    with django_assert_num_queries(1):
+        assert upsert_tags(identities) == tag_ids
+
+
 def test_create_story_with_media(client, auth_headers, basic_story_payload):
     payload = basic_story_payload.copy()
     payload.update(
@@ -495,7 +568,10 @@ def test_get_stories_by_story_id(client, seed, auth_headers):
     story1 = seed["story1"]
     tag = seed["tag"]
 
-    resp = client.get(f"/stories/?story_id={story1.id}", **auth_headers())
+    fields = "storyteller,project_id,project_name,curator,date,summary,text_content,tags"
+    resp = client.get(
+        f"/stories/?story_id={story1.id}&fields={fields}", **auth_headers()
+    )
     assert resp.status_code == 200
 
     data = resp.json()
@@ -525,6 +601,103 @@ def test_get_stories_by_story_id(client, seed, auth_headers):
     )
 
 
+def test_get_stories_default_fields_skip_text(client, seed, auth_headers):
+    story1 = seed["story1"]
+    resp = client.get(f"/stories/?story_id={story1.id}", **auth_headers())
+    assert resp.status_code == 200
+    s = resp.json()["stories"][0]
+    assert "text_content" not in s
+    assert s["storyteller"] == story1.storyteller
+
+    resp = client.get(
+        f"/stories/?story_id={story1.id}&fields=text_content", **auth_headers()
+    )
+    assert resp.json()["stories"] == [
+        {"story_id": story1.id, "text_content": story1.text_content}
+    ]
+
+
+def test_get_stories_text_preview(client, seed, auth_headers, settings):
+    settings.STORY_PREVIEW_CHARS = 4
+    story1 = seed["story1"]  # "Hello!"
+    resp = client.get(
+        f"/stories/?story_id={story1.id}&fields=text_preview", **auth_headers()
+    )
+    assert resp.json()["stories"] == [
+        {"story_id": story1.id, "text_preview": "Hell..."}
+    ]
+
+    settings.STORY_PREVIEW_CHARS = 6
+    resp = client.get(
+        f"/stories/?story_id={story1.id}&fields=text_preview", **auth_headers()
+    )
+    assert resp.json()["stories"][0]["text_preview"] == "Hello!"
+
+
+def test_get_stories_cursor_pagination(client, seed, auth_headers):
+    proj1, alice = seed["proj1"], seed["alice"]
+    for day in (3, 1, 2, 2):
+        Story.objects.create(
+            proj=proj1,
+            storyteller=f"teller-{day}",
+            curator=alice,
+            date=datetime.date(2025, 5, day),
+            text_content="paged",
+        )
+    expected = list(
+        Story.objects.filter(proj=proj1).order_by("date", "id").values_list("id", flat=True)
+    )
+
+    seen = []
+    url = f"/stories/?project_id={proj1.id}&limit=2&fields=date"
+    cursor = None
+    while True:
+        page_url = url + (f"&cursor={cursor}" if cursor else "")
+        data = client.get(page_url, **auth_headers()).json()
+        assert len(data["stories"]) <= 2
+        seen += [s["story_id"] for s in data["stories"]]
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+
+def test_get_stories_stream_ndjson(client, seed, auth_headers):
+    proj1 = seed["proj1"]
+    resp = client.get(
+        f"/stories/?project_id={proj1.id}&stream=ndjson&fields=text_content,tags",
+        **auth_headers(),
+    )
+    assert resp.status_code == 200
+    assert resp["Content-Type"] == "application/x-ndjson"
+    lines = b"".join(resp.streaming_content).decode().splitlines()
+    rows = [json.loads(line) for line in lines]
+    assert [r["story_id"] for r in rows] == [seed["story1"].id]
+    assert rows[0]["text_content"] == seed["story1"].text_content
+    assert rows[0]["tags"][0]["name"] == seed["tag"].name
+
+
+def test_get_stories_stream_json_matches_page(client, seed, auth_headers):
+    org1 = seed["org1"]
+    paged = client.get(f"/stories/?org_id={org1.id}", **auth_headers()).json()
+    resp = client.get(f"/stories/?org_id={org1.id}&stream=json", **auth_headers())
+    streamed = json.loads(b"".join(resp.streaming_content))
+    assert streamed == paged
+
+
+def test_get_stories_bad_params(client, seed, auth_headers):
+    proj1 = seed["proj1"]
+    for params in (
+        "limit=0",
+        "limit=abc",
+        "cursor=nope",
+        "fields=password",
+        "stream=csv",
+    ):
+        resp = client.get(f"/stories/?project_id={proj1.id}&{params}", **auth_headers())
+        assert resp.status_code == 400, params
+
+
 @pytest.mark.django_db
 def test_get_story_ok(client, seed, auth_headers):
     """
@@ -594,6 +767,324 @@ def test_get_story_with_media(client, seed, monkeypatch, auth_headers):
     assert data["image_path"] == "http://example.com/media"
 
 
+def test_get_story_cached_media_signed_once(client, seed, monkeypatch, auth_headers):
+    story = seed["story1"]
+    story.audio_content.name = "foo.mp3"
+    story.save()
+
+    calls = []
+    fake_client = MagicMock()
+
+    def fake_presign(ClientMethod, Params, ExpiresIn):
+        calls.append(Params["Key"])
+        return f"http://example.com/{len(calls)}"
+
+    fake_client.generate_presigned_url.side_effect = fake_presign
+    monkeypatch.setattr(utils, "get_s3_client", lambda: fake_client)
+    hdrs = auth_headers()
+
+    first = client.get(f"/story/{story.id}", **hdrs).json()
+    second = client.get(f"/story/{story.id}", **hdrs).json()
+    assert calls == ["foo.mp3"]
+    assert first == second
+
+
+def test_edit_story_invalidates_cached_story(
+    client, seed, auth_headers_user3, shared_cache
+):
+    s, deleto = seed["story2"], seed["deleto"]
+    hdrs = auth_headers_user3()
+    assert client.get(f"/story/{s.id}", **hdrs).json()["storyteller"] == "Delly"
+
+    payload = {
+        "storyteller": "Testy",
+        "curator": deleto.id,
+        "text_content": "Content has been Edited",
+    }
+    r = client.post(
+        f"/story/{s.id}/edit", json.dumps(payload), content_type="application/json", **hdrs
+    )
+    assert r.status_code == 200
+
+    data = client.get(f"/story/{s.id}", **hdrs).json()
+    assert data["storyteller"] == "Testy"
+    assert data["text_content"] == "Content has been Edited"
+
+
+def test_rename_project_invalidates_cached_stories(
+    client, seed, auth_headers_user3, shared_cache
+):
+    p, s, org3 = seed["proj_edit_delete"], seed["story2"], seed["org3"]
+    hdrs = auth_headers_user3()
+    old_name = client.get(f"/story/{s.id}", **hdrs).json()["project_name"]
+    assert old_name == p.name
+
+    payload = {
+        "org_id": org3.id,
+        "name": "Renamed Project",
+        "curator": seed["deleto"].id,
+        "date": "2025-05-08",
+    }
+    r = client.post(
+        f"/project/{p.id}/edit",
+        json.dumps(payload),
+        content_type="application/json",
+        **hdrs,
+    )
+    assert r.status_code == 200
+    data = client.get(f"/story/{s.id}", **hdrs).json()
+    assert data["project_name"] == "Renamed Project"
+
+
+def test_story_cache_sees_invalidation_from_another_process(shared_cache, monkeypatch):
+    story_cache.set_story_body(7, story_cache.get_story_version(7), {"summary": None})
+    assert story_cache.get_story_body(7) == {"summary": None}
+
+    # The ML worker bumps the version through its own connection
+    worker_cache = FileBasedCache(shared_cache, {})
+    with monkeypatch.context() as m:
+        m.setattr(story_cache, "_cache", lambda: worker_cache)
+        story_cache.invalidate_story_cache(7)
+    assert story_cache.get_story_body(7) is None
+
+
+def test_story_cache_off_with_per_process_backend():
+    from ct_application.checks import check_story_cache
+
+    # LocMem (the test default) would never see the worker's invalidation
+    story_cache.set_story_body(7, story_cache.get_story_version(7), {"x": 1})
+    assert story_cache.get_story_body(7) is None
+    assert [w.id for w in check_story_cache(None)] == ["ct_application.W002"]
+
+
+def test_project_stats(client, seed, auth_headers):
+    proj1, alice = seed["proj1"], seed["alice"]
+    for day, teller in [(6, "Bob"), (6, "Alice"), (9, "Bob")]:
+        Story.objects.create(
+            proj=proj1,
+            storyteller=teller,
+            curator=alice,
+            date=datetime.date(2025, 4, day),
+            text_content="x",
+        )
+    r = client.get(f"/project/{proj1.id}/stats", **auth_headers())
+    assert r.status_code == 200
+    data = r.json()
+    assert data["story_count"] == 4
+    assert data["storyteller_count"] == 2
+    assert data["latest_date"] == "2025-04-09"
+    assert data["by_storyteller"] == [["Alice", 2], ["Bob", 2]]
+    assert data["by_curator"] == [["Alice", 4]]
+    assert data["by_tag"] == {"fun": [["yes", 1], ["Unknown", 3]]}
+    assert data["running_total"] == [
+        ["2025-04-05", 1, 1],
+        ["2025-04-06", 2, 3],
+        ["2025-04-09", 1, 4],
+    ]
+    assert "text_content" not in r.content.decode()
+
+
+def test_project_stats_cached_until_story_changes(
+    client, seed, auth_headers_user3, django_assert_num_queries, shared_cache
+):
+    proj, s, deleto = seed["proj_edit_delete"], seed["story2"], seed["deleto"]
+    hdrs = auth_headers_user3()
+    url = f"/project/{proj.id}/stats"
+    first = client.get(url, **hdrs).json()
+    assert first["by_storyteller"] == [["Delly", 1]]
+    client.get(url, **hdrs)  # fills the membership map
+
+    # Cached auth and stats: no queries at all
+    with django_assert_num_queries(0):
+        assert client.get(url, **hdrs).json() == first
+
+    payload = {"storyteller": "Testy", "curator": deleto.id, "text_content": "x"}
+    r = client.post(
+        f"/story/{s.id}/edit", json.dumps(payload), content_type="application/json", **hdrs
+    )
+    assert r.status_code == 200
+    assert client.get(url, **hdrs).json()["by_storyteller"] == [["Testy", 1]]
+
+
+def test_edit_story_clears_stale_summary(client, seed, auth_headers_user3):
+    s, deleto = seed["story2"], seed["deleto"]
+    payload = {"storyteller": "Delly", "curator": deleto.id, "text_content": "New text"}
+    r = client.post(
+        f"/story/{s.id}/edit",
+        json.dumps(payload),
+        content_type="application/json",
+        **auth_headers_user3(),
+    )
+    assert r.status_code == 200
+    s.refresh_from_db()
+    assert s.summary is None
+
+
+def test_edit_story_queues_summary_only_when_text_changes(
+    client, seed, auth_headers_user3, monkeypatch
+):
+    strategy = MagicMock()
+    strategy.add_to_queue.return_value = {"success": True}
+    monkeypatch.setattr(registry, "_instances", {"queue": strategy})
+    s, deleto = seed["story2"], seed["deleto"]
+
+    def edit(text):
+        payload = {"storyteller": "Delly", "curator": deleto.id, "text_content": text}
+        return client.post(
+            f"/story/{s.id}/edit",
+            json.dumps(payload),
+            content_type="application/json",
+            **auth_headers_user3(),
+        )
+
+    assert edit("New text").status_code == 200
+    tasks, story = strategy.add_to_queue.call_args.args
+    assert [t.task_type for t in tasks] == ["summarization"]
+    assert story.id == s.id
+    assert MLProcessingQueue.objects.filter(
+        project_id=s.proj_id, task_type="summarization", status="initialized"
+    ).exists()
+
+    # Same text again: the summary is kept, nothing is queued
+    assert edit("New text").status_code == 200
+    strategy.add_to_queue.assert_called_once()
+
+
+def test_edited_story_summary_regenerated_by_worker(
+    client, seed, auth_headers_user3, monkeypatch
+):
+    pytest.importorskip("transformers")
+    pytest.importorskip("deepgram")
+    from ct_application.cloud import db_queue
+    from ct_application.cloud.consumer_service import MLWorkerService
+    from ct_application.cloud.producer_service import DatabaseQueueStrategy
+
+    local = MagicMock()
+    local.summarize_batch.side_effect = lambda texts, **kw: [
+        f"summary of {text}" for text in texts
+    ]
+    collective = MagicMock()
+    collective.summarize_multiple.return_value = {"insight1": "ok"}
+    monkeypatch.setattr(
+        registry,
+        "_instances",
+        {
+            "queue": DatabaseQueueStrategy(),
+            "local_summarizing": local,
+            "collective_summarizing": collective,
+        },
+    )
+    s, deleto = seed["story2"], seed["deleto"]
+    # Left by the summarization queued when the story was created
+    MLProcessingQueue.objects.create(
+        story=s, project=s.proj, task_type="summarization", status="completed"
+    )
+
+    payload = {"storyteller": "Delly", "curator": deleto.id, "text_content": "New text"}
+    r = client.post(
+        f"/story/{s.id}/edit",
+        json.dumps(payload),
+        content_type="application/json",
+        **auth_headers_user3(),
+    )
+    assert r.status_code == 200
+
+    (job,) = db_queue.claim_jobs(10)
+    assert job.body["task_type"] == "summarization"
+    assert MLWorkerService()._process_job(job)
+    s.refresh_from_db()
+    assert s.summary == "summary of New text"
+    (entry,) = MLProcessingQueue.objects.filter(story=s, task_type="summarization")
+    assert (entry.status, entry.job_id) == ("completed", job.job_id)
+
+
+def test_story_summaries_generated_in_one_batch(seed, monkeypatch):
+    from ct_application.ml.ml_services.summarizing_service import SummarizingService
+
+    proj = seed["story1"].proj
+    Story.objects.filter(proj=proj).update(summary="kept")
+    for n in range(3):
+        Story.objects.create(
+            proj=proj,
+            storyteller="x",
+            curator=seed["alice"],
+            date=datetime.date(2025, 4, 5),
+            text_content=f"story {n}",
+        )
+    strategy = MagicMock()
+    strategy.summarize_batch.side_effect = lambda texts, batch_size: [
+        f"summary of {t}" for t in texts
+    ]
+    monkeypatch.setattr(registry, "_instances", {"local_summarizing": strategy})
+
+    summaries = SummarizingService().get_or_generate_story_summaries(proj.id)
+
+    strategy.summarize_batch.assert_called_once()
+    texts = strategy.summarize_batch.call_args.args[0]
+    assert sorted(texts) == ["story 0", "story 1", "story 2"]
+    assert "kept" in summaries and "summary of story 2" in summaries
+    assert Story.objects.get(text_content="story 1").summary == "summary of story 1"
+
+
+def test_project_insight_refreshes_incrementally(seed, monkeypatch):
+    from ct_application.ml.ml_services.summarizing_service import SummarizingService
+
+    proj = seed["story1"].proj
+    collective = MagicMock()
+    collective.summarize_multiple.return_value = {"insight1": "people say hello"}
+    monkeypatch.setattr(registry, "_instances", {"collective_summarizing": collective})
+    service = SummarizingService()
+
+    assert service.process_project_summary(proj.id)
+    assert service.process_project_summary(proj.id)
+    # same stories, same summaries: one insight call
+    assert collective.summarize_multiple.call_count == 1
+    proj.refresh_from_db()
+    assert proj.insight_json == {"insight1": "people say hello"}
+
+    Story.objects.filter(id=seed["story1"].id).update(summary="a new summary")
+    assert service.process_project_summary(proj.id)
+    assert collective.summarize_multiple.call_count == 2
+
+    # a later summarization is still queued: it will refresh instead
+    Story.objects.filter(id=seed["story1"].id).update(summary="edited again")
+    MLProcessingQueue.objects.create(
+        project=proj,
+        story=seed["story1"],
+        task_type="summarization",
+        status="initialized",
+    )
+    assert service.process_project_summary(proj.id)
+    assert collective.summarize_multiple.call_count == 2
+    assert service.process_project_summary(proj.id, force=True)
+    assert collective.summarize_multiple.call_count == 3
+
+
+def test_project_chat_sends_only_relevant_chunks(
+    seed, client, auth_headers, monkeypatch
+):
+    # No embedder: chunks are ranked with BM25
+    monkeypatch.setattr(registry, "_instances", {"chat_embedder": None})
+    project = seed["proj1"]
+    common = dict(proj=project, curator=seed["alice"], date=datetime.date(2025, 4, 8))
+    Story.objects.bulk_create(
+        [Story(text_content=f"harvest season number {i}", **common) for i in range(40)]
+        + [Story(text_content="The old lighthouse keeper rang the bell", **common)]
+    )
+    chat = MagicMock(return_value={"choices": [{"message": {"content": "Ed"}}]})
+    monkeypatch.setattr(views, "get_perplexity_chat_response", chat)
+
+    resp = client.post(
+        f"/project/{project.id}/chat",
+        json.dumps({"user_message": "Who kept the lighthouse?"}),
+        content_type="application/json",
+        **auth_headers(),
+    )
+    assert resp.status_code == 200, resp.content
+    assert resp.json() == {"reply": "Ed"}
+    assert chat.call_args.args[1] == "The old lighthouse keeper rang the bell"
+
+
 # -----------error tests-------------------
 
 
@@ -855,6 +1346,61 @@ def test_delete_project(client, seed, auth_headers_user3):
     assert r.status_code == 200
 
 
+def test_counters_follow_story_and_project_writes(client, seed, auth_headers_user3):
+    org3, proj = seed["org3"], seed["proj_edit_delete"]
+    hdrs = auth_headers_user3()
+
+    def counts():
+        org = client.get(f"/org/{org3.id}", **hdrs).json()
+        project = client.get(f"/project/{proj.id}", **hdrs).json()
+        return org["project_count"], org["story_count"], project["stories"]
+
+    assert counts() == (1, 1, 1)
+
+    with patch("ct_application.views.QueueProducer"):
+        r = client.post(
+            "/story/create",
+            json.dumps({"project_id": proj.id, "storyteller": "x", "text_content": "y"}),
+            content_type="application/json",
+            **hdrs,
+        )
+    assert r.status_code == 200
+    assert counts() == (1, 2, 2)
+
+    r = client.delete(f"/story/{seed['story2'].id}/delete", **hdrs)
+    assert r.status_code == 200
+    assert counts() == (1, 1, 1)
+
+    r = client.post(
+        "/project/create",
+        json.dumps(
+            {"org_id": org3.id, "project_name": "Second", "description": "d"}
+        ),
+        content_type="application/json",
+        **hdrs,
+    )
+    assert r.status_code == 201
+    assert counts() == (2, 1, 1)
+
+    r = client.delete(f"/project/{proj.id}/delete", **hdrs)
+    assert r.status_code == 200
+    org3.refresh_from_db()
+    assert (org3.project_count, org3.story_count) == (1, 0)
+
+
+def test_reconcile_counts_command(seed):
+    org1, proj1 = seed["org1"], seed["proj1"]
+    Organization.objects.filter(id=org1.id).update(project_count=7, story_count=9)
+    Project.objects.filter(id=proj1.id).update(story_count=0)
+
+    call_command("reconcile_counts", "--org", str(org1.id))
+
+    org1.refresh_from_db()
+    proj1.refresh_from_db()
+    assert (org1.project_count, org1.story_count, proj1.story_count) == (1, 1, 1)
+    assert reconcile_counts() == 0
+
+
 def test_delete_org(client, seed, auth_headers_user3):
     o = seed["org3"]
     r = client.delete(f"/org/{o.id}/delete", **auth_headers_user3())
@@ -898,6 +1444,77 @@ def test_project_forbidden_403(client, seed, auth_headers):
     assert r.status_code == 403
 
 
+def test_story_forbidden_403(client, seed, auth_headers):
+    s = seed["story1"]
+    hdrs = auth_headers("brenda", "secret456")
+    r = client.get(f"/story/{s.id}", **hdrs)
+    assert r.status_code == 403
+    assert r.json()["error"]["code"] == "USER_NOT_IN_ORG"
+
+
+def test_story_auth_single_query(seed, django_assert_num_queries):
+    alice, s = seed["alice"], seed["story1"]
+    with django_assert_num_queries(1):
+        assert views.check_story_auth(alice.id, s.id) == ("admin", True)
+    with django_assert_num_queries(1):
+        response, ok = views.check_story_auth(alice.id, 9999)
+    assert not ok and response.status_code == 404
+
+
+def test_story_auth_cached(seed, shared_cache, django_assert_num_queries):
+    alice, s = seed["alice"], seed["story1"]
+    views.check_story_auth(alice.id, s.id)
+    views.check_org_auth(alice.id, seed["org1"].id)
+    with django_assert_num_queries(0):
+        assert views.check_story_auth(alice.id, s.id) == ("admin", True)
+
+
+def test_access_cache_off_with_per_process_backend(seed, django_assert_num_queries):
+    alice, s = seed["alice"], seed["story1"]
+    assert views.check_story_auth(alice.id, s.id) == ("admin", True)
+    with django_assert_num_queries(1):
+        assert views.check_story_auth(alice.id, s.id) == ("admin", True)
+
+    # Revoked by another process, whose invalidation this one never sees
+    OrgUser.objects.filter(user=alice, org=s.proj.org).delete()
+    response, ok = views.check_story_auth(alice.id, s.id)
+    assert not ok and response.status_code == 403
+
+
+def test_delete_user_from_org_invalidates_access(
+    client,
+    seed,
+    shared_cache,
+    auth_headers,
+    auth_headers_user3,
+    django_capture_on_commit_callbacks,
+):
+    alice, org, p = seed["alice"], seed["org3"], seed["proj_edit_delete"]
+    assert client.get(f"/project/{p.id}", **auth_headers()).status_code == 200
+    with django_capture_on_commit_callbacks(execute=True):
+        r = client.delete(
+            f"/org/{org.id}/delete-user/{alice.id}", **auth_headers_user3()
+        )
+    assert r.status_code == 200
+    assert client.get(f"/project/{p.id}", **auth_headers()).status_code == 403
+
+
+def test_access_cache_check_requires_shared_backend(settings):
+    from ct_application.checks import check_access_cache
+
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    assert [w.id for w in check_access_cache(None)] == ["ct_application.W001"]
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://cache:6379",
+        }
+    }
+    assert check_access_cache(None) == []
+
+
 # ───────── validation edges ─────────
 def test_create_project_missing_org_400(client, auth_headers):
     r = client.post(
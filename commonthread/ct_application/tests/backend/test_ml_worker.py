@@ -0,0 +1,280 @@
+# test_ml_worker.py
+# ML worker (cloud/consumer_service.py) against fake SQS clients and services
+import json
+import threading
+import time
+from contextlib import nullcontext
+from unittest.mock import MagicMock
+import pytest
+from ct_application.models import MLOutbox, MLProcessingQueue, Story
+
+pytest.importorskip("transformers")
+pytest.importorskip("deepgram")
+
+from ct_application.cloud.consumer_service import (  # noqa: E402
+    FairScheduler,
+    MLWorkerService,
+    VisibilityHeartbeat,
+)
+from ct_application.ml.ml_services.transcribing_service import (  # noqa: E402
+    TranscribingService,
+)
+
+
+class StopPolling(BaseException):
+    # Ends MLWorkerService._poll, which retries on any Exception
+    pass
+
+
+class FakeSQS:
+    """SQS client stand-in: one batch of messages, then stops the poll loop
+    once every message was deleted."""
+
+    def __init__(self, messages):
+        self.batches = [messages]
+        self.expected = len(messages)
+        self.deleted = []
+        self.extended = []
+        self.all_deleted = threading.Event()
+        if not messages:
+            self.all_deleted.set()
+        self.sent = []
+
+    def receive_message(self, **kwargs):
+        if self.batches:
+            return {"Messages": self.batches.pop(0)}
+        self.all_deleted.wait(5)
+        raise StopPolling
+
+    def change_message_visibility(self, QueueUrl, ReceiptHandle, VisibilityTimeout):
+        self.extended.append(ReceiptHandle)
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self.deleted.append(ReceiptHandle)
+        if len(self.deleted) == self.expected:
+            self.all_deleted.set()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.sent.extend(json.loads(e["MessageBody"]) for e in Entries)
+        return {"Successful": [{"Id": e["Id"]} for e in Entries]}
+
+
+def sqs_message(job_id, group, task_type="tag", story_id=1, project_id=1):
+    body = {
+        "job_id": job_id,
+        "task_type": task_type,
+        "story_id": story_id,
+        "project_id": project_id,
+    }
+    return {
+        "MessageId": f"m-{job_id}",
+        "ReceiptHandle": f"r-{job_id}",
+        "Body": json.dumps(body),
+        "Attributes": {"MessageGroupId": group},
+    }
+
+
+def test_fair_scheduler_priority_org_and_type_caps():
+    started = []
+    release = threading.Event()
+
+    def handler(item):
+        started.append(item)
+        release.wait(5)
+
+    scheduler = FairScheduler(1, handler, type_caps={"transcription": 1}, prefetch=10)
+    scheduler.submit("blocker", "blocker", task_type="transcription", org=1)
+    scheduler.submit("a1", "import-tag-1", task_type="tag", org=1)
+    scheduler.submit("a2", "import-tag-2", task_type="tag", org=1)
+    scheduler.submit(
+        "a3", "import-summary", task_type="summarization", priority=2, org=1
+    )
+    scheduler.submit("b1", "small-org-tag", task_type="tag", org=2)
+    scheduler.submit("blocker", "blocker-tag", task_type="tag", org=1)
+    release.set()
+    for _ in range(500):
+        if len(started) == 6:
+            break
+        time.sleep(0.01)
+    scheduler.shutdown()
+
+    assert started == [
+        "blocker",
+        # org 1 was just served, so org 2's tag goes first
+        "small-org-tag",
+        "import-tag-1",
+        "import-tag-2",
+        "blocker-tag",
+        "import-summary",
+    ]
+
+
+def test_sqs_poll_orders_groups_and_runs_groups_concurrently():
+    events = []
+    # a1 and b1 only get past the barrier if they run at the same time
+    both_groups = threading.Barrier(2, timeout=5)
+
+    def dispatch(body):
+        job_id = body["job_id"]
+        events.append(("start", job_id))
+        if job_id in ("a1", "b1"):
+            both_groups.wait()
+        time.sleep(0.05)
+        events.append(("end", job_id))
+        return True
+
+    worker = MLWorkerService()
+    worker._dispatch = dispatch
+    worker._relay_outbox = lambda sqs: None
+    sqs = FakeSQS(
+        [sqs_message("a1", "A"), sqs_message("a2", "A"), sqs_message("b1", "B")]
+    )
+    with pytest.raises(StopPolling):
+        worker._poll(sqs, max_in_flight=4)
+
+    assert sorted(sqs.deleted) == ["r-a1", "r-a2", "r-b1"]
+    # Same group: a2 starts only after a1 is done, although slots were free
+    assert events.index(("end", "a1")) < events.index(("start", "a2"))
+    assert {("start", "a1"), ("start", "b1")} <= set(events[:2])
+
+
+def test_sqs_failed_message_is_not_deleted():
+    worker = MLWorkerService()
+    worker._dispatch = lambda body: body["job_id"] == "ok"
+    sqs = FakeSQS([])
+
+    assert not worker._process_message(sqs, sqs_message("failed", "1"))
+    assert worker._process_message(sqs, sqs_message("ok", "1"))
+    # The failed one comes back after its visibility timeout
+    assert sqs.deleted == ["r-ok"]
+
+
+@pytest.mark.django_db
+def test_sqs_poll_relays_leftover_outbox_rows():
+    # Written by a request whose relay couldn't reach SQS
+    MLOutbox.objects.create(
+        job_id="j1", body={"job_id": "j1"}, group_id="1", deduplication_id="d1"
+    )
+    sqs = FakeSQS([])
+    with pytest.raises(StopPolling):
+        MLWorkerService()._poll(sqs, max_in_flight=1)
+
+    assert sqs.sent == [{"job_id": "j1"}]
+    assert not MLOutbox.objects.filter(sent_at__isnull=True).exists()
+
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_visibility_heartbeat_extends_while_task_runs(fails):
+    sqs = FakeSQS([])
+    heartbeat = VisibilityHeartbeat(sqs, "r-1", "tag")
+    heartbeat.interval = 0.01
+
+    with pytest.raises(RuntimeError) if fails else nullcontext():
+        with heartbeat:
+            time.sleep(0.1)
+            extended_while_running = len(sqs.extended)
+            if fails:
+                raise RuntimeError("task failed")
+
+    # Once on entry, then every interval until the task is done
+    assert extended_while_running >= 3
+    assert not heartbeat._thread.is_alive()
+    extended = len(sqs.extended)
+    time.sleep(0.05)
+    assert len(sqs.extended) == extended
+
+
+@pytest.mark.django_db
+def test_lambda_reports_failed_records_and_skips_completed_jobs(project, make_story):
+    worker = MLWorkerService()
+    tag = MagicMock(return_value=True)
+    worker.tagging_service = MagicMock(process_story_tags=tag)
+    worker.summarizing_service = MagicMock(
+        process_project_summary=MagicMock(return_value=False)
+    )
+    one, two = make_story(), make_story()
+
+    def record(message_id, story, task_type, job_id):
+        body = {"job_id": job_id, "project_id": project.id, "story_id": story.id}
+        body["task_type"] = task_type
+        return {
+            "messageId": message_id,
+            "attributes": {"MessageGroupId": str(story.id)},
+            "body": json.dumps(body),
+        }
+
+    event = {
+        "Records": [
+            record("m1", one, "tag", "j1"),
+            record("m2", two, "summarization", "j2"),
+            record("m3", two, "tag", "j3"),
+        ]
+    }
+    result = worker.process_messages(use_lambda=True, event=event)
+    # m3 waits behind the failed m2 of the same story
+    assert result == {
+        "batchItemFailures": [{"itemIdentifier": "m2"}, {"itemIdentifier": "m3"}]
+    }
+    assert tag.call_count == 1
+    assert MLProcessingQueue.objects.get(job_id="j1").status == "completed"
+
+    # a redelivered, already completed job does not run again
+    worker.process_messages(use_lambda=True, event={"Records": event["Records"][:1]})
+    assert tag.call_count == 1
+
+
+def transcribing_worker(transcript="the transcript"):
+    # The real TranscribingService over a stubbed Deepgram strategy
+    strategy = MagicMock()
+    strategy.transcribe_cached.return_value = transcript
+    worker = MLWorkerService()
+    worker.transcribing_service = TranscribingService(strategy)
+    worker.tagging_service = MagicMock(
+        process_story_tags=MagicMock(return_value=True)
+    )
+    return worker
+
+
+def lambda_record(message_id, story, task_type):
+    body = {
+        "job_id": f"j-{message_id}",
+        "task_type": task_type,
+        "story_id": story.id,
+        "project_id": story.proj_id,
+    }
+    return {
+        "messageId": message_id,
+        "attributes": {"MessageGroupId": str(story.id)},
+        "body": json.dumps(body),
+    }
+
+
+@pytest.mark.django_db
+def test_lambda_transcription_succeeds_and_releases_its_group(make_story):
+    story = make_story("", audio_content="audio/upload-1.mp3")
+    worker = transcribing_worker()
+    event = {
+        "Records": [
+            lambda_record("m1", story, "transcription"),
+            lambda_record("m2", story, "tag"),
+        ]
+    }
+
+    assert worker.process_messages(use_lambda=True, event=event) == {
+        "batchItemFailures": []
+    }
+    assert Story.objects.get(id=story.id).text_content == "the transcript"
+    assert MLProcessingQueue.objects.get(job_id="j-m1").status == "completed"
+    worker.tagging_service.process_story_tags.assert_called_once_with(story.id)
+
+
+@pytest.mark.django_db
+def test_sqs_transcription_message_is_deleted(make_story):
+    story = make_story("", audio_content="audio/upload-1.mp3")
+    message = sqs_message(
+        "t1", str(story.id), "transcription", story.id, story.proj_id
+    )
+    sqs = FakeSQS([])
+
+    assert transcribing_worker()._process_message(sqs, message)
+    assert sqs.deleted == ["r-t1"]
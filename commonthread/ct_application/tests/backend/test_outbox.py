@@ -0,0 +1,118 @@
+# test_outbox.py
+# SQS outbox: MLOutbox rows written with the story, relayed after commit
+import datetime
+import json
+from unittest.mock import MagicMock
+import pytest
+from django.db.models import Q
+from django.utils import timezone
+from ct_application import registry
+from ct_application.cloud.producer_service import (
+    QueueProducer,
+    SQSStrategy,
+    relay_outbox,
+)
+from ct_application.models import MLOutbox
+
+pytestmark = pytest.mark.django_db
+
+
+def sending_sqs():
+    sqs = MagicMock()
+    sqs.send_message_batch.side_effect = lambda QueueUrl, Entries: {
+        "Successful": [{"Id": e["Id"]} for e in Entries]
+    }
+    return sqs
+
+
+def outbox(job_id, group):
+    return MLOutbox.objects.create(
+        job_id=job_id, body={}, group_id=group, deduplication_id=job_id
+    )
+
+
+def test_sqs_strategy_writes_outbox_and_relays_after_commit(
+    make_story, monkeypatch, django_capture_on_commit_callbacks
+):
+    sqs = sending_sqs()
+    monkeypatch.setattr(registry, "_instances", {"sqs_client": sqs})
+    story = make_story()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        result = QueueProducer(SQSStrategy()).add_to_queue(story)
+        assert result["success"]
+        sqs.send_message_batch.assert_not_called()
+        assert MLOutbox.objects.filter(sent_at__isnull=True).count() == 2
+
+    sqs.send_message_batch.assert_called_once()
+    entries = sqs.send_message_batch.call_args.kwargs["Entries"]
+    assert [json.loads(e["MessageBody"])["task_type"] for e in entries] == [
+        "summarization",
+        "tag",
+    ]
+    assert all(e["MessageGroupId"] == str(story.id) for e in entries)
+    assert not MLOutbox.objects.filter(sent_at__isnull=True).exists()
+
+
+def test_relay_outbox_batches_and_keeps_failures():
+    MLOutbox.objects.bulk_create(
+        MLOutbox(job_id=f"j{i}", body={"i": i}, group_id="1", deduplication_id=f"d{i}")
+        for i in range(23)
+    )
+    failing = MLOutbox.objects.order_by("id")[21].id
+    sqs = MagicMock()
+    sqs.send_message_batch.side_effect = lambda QueueUrl, Entries: {
+        "Successful": [{"Id": e["Id"]} for e in Entries if e["Id"] != str(failing)],
+        "Failed": [
+            {"Id": e["Id"], "Code": "InternalError"}
+            for e in Entries
+            if e["Id"] == str(failing)
+        ],
+    }
+
+    assert relay_outbox(sqs) == 22
+    calls = sqs.send_message_batch.call_args_list
+    assert [len(c.kwargs["Entries"]) for c in calls] == [10, 10, 3]
+    row = MLOutbox.objects.get(sent_at__isnull=True)
+    assert row.id == failing
+    assert row.attempts == 1 and row.last_error == "InternalError"
+    assert row.lease_expires_at is None
+
+
+def test_relay_outbox_leases_rows_and_keeps_group_order():
+    first, second, other_group = outbox("j0", "1"), outbox("j1", "1"), outbox("j2", "2")
+    sqs = sending_sqs()
+
+    # j1 waits behind the unsent j0 of its story
+    assert relay_outbox(sqs, ids=[second.id, other_group.id]) == 1
+    assert MLOutbox.objects.get(sent_at__isnull=False).id == other_group.id
+
+    other = MagicMock()
+
+    def send(QueueUrl, Entries):
+        # Claimed rows are leased and committed, not locked during the call:
+        # a concurrent relay skips them
+        assert all(
+            row.lease_expires_at
+            for row in MLOutbox.objects.filter(id__in=[first.id, second.id])
+        )
+        assert relay_outbox(other) == 0
+        return {"Successful": [{"Id": e["Id"]} for e in Entries]}
+
+    assert relay_outbox(MagicMock(send_message_batch=send)) == 2
+    other.send_message_batch.assert_not_called()
+    assert not MLOutbox.objects.filter(
+        Q(sent_at__isnull=True) | Q(lease_expires_at__isnull=False)
+    ).exists()
+
+    # A lease left by a relay that died is claimed again once it expires
+    now = timezone.now()
+    expired, held = outbox("j3", "3"), outbox("j4", "4")
+    MLOutbox.objects.filter(id=expired.id).update(
+        lease_expires_at=now - datetime.timedelta(seconds=1)
+    )
+    MLOutbox.objects.filter(id=held.id).update(
+        lease_expires_at=now + datetime.timedelta(minutes=1)
+    )
+    assert relay_outbox(sqs) == 1
+    assert MLOutbox.objects.get(sent_at__isnull=True).id == held.id
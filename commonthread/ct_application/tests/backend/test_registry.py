@@ -0,0 +1,43 @@
+# test_registry.py
+# Process-wide shared instances (ct_application.registry)
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from ct_application import registry
+from ct_application.cloud.producer_service import QueueProducer, SimpleQueueStrategy
+from ct_application.ml import retrieval_index
+
+
+def test_registry_builds_once_across_threads(monkeypatch):
+    built = []
+    monkeypatch.setattr(registry, "_instances", {})
+    monkeypatch.setitem(
+        registry.FACTORIES, "thing", lambda: built.append(1) or object()
+    )
+    with ThreadPoolExecutor(8) as pool:
+        instances = list(pool.map(lambda _: registry.get_shared("thing"), range(32)))
+    assert len(built) == 1
+    assert all(i is instances[0] for i in instances)
+
+
+def test_queue_producer_builds_strategy_lazily(monkeypatch):
+    monkeypatch.setattr(registry, "_instances", {})
+    producer = QueueProducer()
+    assert "queue" not in registry._instances
+
+    strategy = SimpleQueueStrategy()
+    registry.set_shared("queue", strategy)
+    assert producer.queue_strategy is strategy
+    assert QueueProducer().queue_strategy is strategy
+
+
+def test_chat_index_builds_embedder_outside_index_lock(monkeypatch):
+    locked = []
+
+    def embedder():
+        locked.append(retrieval_index._indexes_lock.locked())
+
+    monkeypatch.setattr(registry, "_instances", {})
+    monkeypatch.setitem(registry.FACTORIES, "chat_embedder", embedder)
+    monkeypatch.setattr(retrieval_index, "_indexes", OrderedDict())
+    retrieval_index._index_for(1)
+    assert locked == [False]
@@ -0,0 +1,36 @@
+# test_s3_utils.py
+# Shared S3 client and presigned URL signing and reuse
+from ct_application import utils
+from ct_application.utils import get_s3_client, generate_s3_presigned_batch
+
+
+def test_s3_client_reused():
+    assert get_s3_client() is get_s3_client()
+
+
+def test_s3_presigned_batch():
+    objects = [
+        ("bucket-a", "one.png"),
+        ("bucket-b", "two.png"),
+        ("bucket-a", "one.png"),
+    ]
+    urls = generate_s3_presigned_batch(objects, expiration=60)
+    assert set(urls) == {("bucket-a", "one.png"), ("bucket-b", "two.png")}
+    assert urls[("bucket-b", "two.png")].startswith(
+        "https://bucket-b.s3.amazonaws.com/two.png?"
+    )
+
+
+def test_s3_presigned_download_reused(monkeypatch):
+    before = utils.get_presigned_cache_stats()
+    first = utils.generate_s3_presigned("bucket-a", "pic.png", "download")
+    second = utils.generate_s3_presigned("bucket-a", "pic.png", "download")
+    assert first == second
+    after = utils.get_presigned_cache_stats()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+    # Past the reuse window a fresh URL is signed
+    monkeypatch.setattr(utils, "PRESIGNED_URL_MIN_REMAINING", 1.0)
+    utils.generate_s3_presigned("bucket-a", "pic.png", "download")
+    assert utils.get_presigned_cache_stats()["misses"] - after["misses"] == 1
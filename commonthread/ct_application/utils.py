@@ -1,13 +1,101 @@
 from commonthread.settings import JWT_SECRET_KEY, JWT_REFRESH_SECRET_KEY
 import datetime
+import hashlib
+import threading
+import time
 import jwt
 import boto3
 from django.conf import settings
-from typing import Optional
+from django.core.cache import caches
+from typing import Dict, Iterable, Optional, Tuple
 from django.utils import timezone
 from django.http import JsonResponse
 
 
+_s3_clients = {}
+_s3_clients_lock = threading.Lock()
+
+
+def get_s3_client(
+    region_name: Optional[str] = None,
+    aws_access_key_id: Optional[str] = None,
+    aws_secret_access_key: Optional[str] = None,
+):
+    """
+    Return the process-wide S3 client for the given region and credentials,
+    building it on first use. Defaults come from settings.
+
+    Building a client costs milliseconds and a lot of allocations, while a
+    built client is thread-safe, so one is kept per (region, credentials).
+    Presigning with it is local computation, no request is sent to S3.
+    """
+    client_key = (
+        region_name or settings.AWS_S3_REGION_NAME,
+        aws_access_key_id or settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key or settings.AWS_SECRET_ACCESS_KEY,
+    )
+    client = _s3_clients.get(client_key)
+    if client is None:
+        with _s3_clients_lock:
+            client = _s3_clients.get(client_key)
+            if client is None:
+                # boto3's default session is not thread-safe, use a fresh one
+                client = boto3.session.Session().client(
+                    "s3",
+                    region_name=client_key[0],
+                    aws_access_key_id=client_key[1],
+                    aws_secret_access_key=client_key[2],
+                )
+                _s3_clients[client_key] = client
+    return client
+
+
+## Presigned download URL cache ------------------------------------------------
+
+PRESIGNED_URL_CACHE_ALIAS = getattr(settings, "PRESIGNED_URL_CACHE_ALIAS", "default")
+PRESIGNED_URL_MIN_REMAINING = getattr(settings, "PRESIGNED_URL_MIN_REMAINING", 0.5)
+
+_presigned_stats = {"hits": 0, "misses": 0}
+_presigned_stats_lock = threading.Lock()
+
+
+def _presigned_cache_key(bucket_name: str, key: str) -> str:
+    # Object keys are user supplied, hash them into a backend-safe cache key
+    digest = hashlib.sha256(f"{bucket_name}/{key}".encode()).hexdigest()
+    return f"presigned:{digest}"
+
+
+def _count_presigned(hits: int, misses: int) -> None:
+    with _presigned_stats_lock:
+        _presigned_stats["hits"] += hits
+        _presigned_stats["misses"] += misses
+
+
+def get_presigned_cache_stats() -> dict:
+    """
+    Hit/miss counters of the presigned download URL cache for this process.
+    """
+    with _presigned_stats_lock:
+        return dict(_presigned_stats)
+
+
+def _reusable_url(entry: Optional[dict], expiration: int) -> Optional[str]:
+    """
+    A cached URL is handed back only while more than
+    PRESIGNED_URL_MIN_REMAINING of the requested lifetime is still left on it.
+    """
+    if entry is None:
+        return None
+    remaining = entry["expires_at"] - time.time()
+    if remaining <= expiration * PRESIGNED_URL_MIN_REMAINING:
+        return None
+    return entry["url"]
+
+
+def _presigned_entry(url: str, expiration: int) -> dict:
+    return {"url": url, "expires_at": time.time() + expiration}
+
+
 def generate_s3_presigned(
     bucket_name: str,
     key: str,
@@ -18,12 +106,7 @@ def generate_s3_presigned(
     """
     Generate S3 presigned POST (upload) or GET (download).
     """
-    client = boto3.client(
-        "s3",
-        region_name=settings.AWS_S3_REGION_NAME,
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-    )
+    client = get_s3_client()
 
     if operation == "upload":
         if not content_type:
@@ -49,16 +132,67 @@ def generate_s3_presigned(
         )
 
     if operation == "download":
+        # Downloads reuse a cached URL so repeated responses stay byte-stable
+        cache = caches[PRESIGNED_URL_CACHE_ALIAS]
+        cache_key = _presigned_cache_key(bucket_name, key)
+        url = _reusable_url(cache.get(cache_key), expiration)
+        if url is not None:
+            _count_presigned(hits=1, misses=0)
+            return {"url": url}
+
+        _count_presigned(hits=0, misses=1)
         url = client.generate_presigned_url(
             ClientMethod="get_object",
             Params={"Bucket": bucket_name, "Key": key},
             ExpiresIn=expiration,
         )
+        cache.set(cache_key, _presigned_entry(url, expiration), expiration)
         return {"url": url}
 
     raise ValueError(f"Unsupported operation: {operation}")
 
 
+def generate_s3_presigned_batch(
+    objects: Iterable[Tuple[str, str]],
+    expiration: int = 3600,
+) -> Dict[Tuple[str, str], str]:
+    """
+    Generate presigned GET (download) URLs for many objects in one call.
+    Cached URLs are reused under the same rule as generate_s3_presigned.
+
+    Args:
+        objects: (bucket_name, key) pairs; duplicates are signed once
+        expiration: lifetime of each URL in seconds
+
+    Returns:
+        Dict mapping each (bucket_name, key) pair to its URL
+    """
+    objects = list(dict.fromkeys(objects))
+    cache = caches[PRESIGNED_URL_CACHE_ALIAS]
+    cache_keys = {obj: _presigned_cache_key(*obj) for obj in objects}
+    cached = cache.get_many(cache_keys.values())
+
+    urls = {}
+    new_entries = {}
+    client = get_s3_client()
+    for obj in objects:
+        url = _reusable_url(cached.get(cache_keys[obj]), expiration)
+        if url is None:
+            bucket_name, key = obj
+            url = client.generate_presigned_url(
+                ClientMethod="get_object",
+                Params={"Bucket": bucket_name, "Key": key},
+                ExpiresIn=expiration,
+            )
+            new_entries[cache_keys[obj]] = _presigned_entry(url, expiration)
+        urls[obj] = url
+
+    _count_presigned(hits=len(urls) - len(new_entries), misses=len(new_entries))
+    if new_entries:
+        cache.set_many(new_entries, expiration)
+    return urls
+
+
 def generate_access_token(user_id: int) -> str:
     payload = {
         "sub": str(user_id),
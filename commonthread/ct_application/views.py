@@ -2,6 +2,8 @@
 
 import logging
 import json
+import base64
+import binascii
 import datetime
 import jwt
 from commonthread.settings import JWT_SECRET_KEY
@@ -10,7 +12,7 @@ from datetime import date
 from django.shortcuts import get_object_or_404
 from django.views.decorators.http import require_GET, require_POST, require_http_methods
 from django.views.decorators.csrf import ensure_csrf_cookie, csrf_exempt
-from django.views.decorators.cache import cache_page
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.http import (
     HttpResponse,
     HttpRequest,
@@ -18,10 +20,14 @@ from django.http import (
     HttpResponseNotFound,
     HttpResponseForbidden,
     HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    StreamingHttpResponse,
 )
+from django.core.serializers.json import DjangoJSONEncoder
 from django.conf import settings
 from .utils import (
     generate_s3_presigned,
+    generate_s3_presigned_batch,
     generate_access_token,
     generate_refresh_token,
     decode_refresh_token,
@@ -34,13 +40,36 @@ from .utils import (
     BUSINESS_ERRORS,
     SERVER_ERRORS,
 )
+from .access_cache import (
+    get_org_access,
+    get_project_org,
+    set_project_org,
+    get_story_project,
+    set_story_project,
+    invalidate_user,
+    invalidate_org,
+    invalidate_project,
+    invalidate_story,
+)
+from .counters import story_added, story_removed, project_added, project_removed
+from .tags import upsert_tags
+from .story_cache import (
+    get_story_body,
+    get_story_version,
+    set_story_body,
+    invalidate_story_cache,
+    invalidate_story_caches,
+    get_project_version,
+    get_project_stats_body,
+    set_project_stats_body,
+    invalidate_project_stats,
+)
 from django.contrib.auth import authenticate, get_user_model
 from .models import (
     Organization,
     OrgUser,
     Project,
     Story,
-    Tag,
     ProjectTag,
     StoryTag,
     CustomUser,
@@ -49,11 +78,12 @@ from .models import (
 from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import Prefetch
-feat/project-chat-perplexity
+from django.db.models import Prefetch, OuterRef, Subquery, Q, Count, Max, F, Window
+from django.db.models.functions import Length, Substr
 # import requests # Removed, as it's now in perplexity_service
 from django.conf import settings
 from .ml.perplexity_service import get_perplexity_chat_response # Added
+from .ml.retrieval_index import retrieve_chunks
 from botocore.exceptions import ClientError, ParamValidationError
 
 
@@ -72,98 +102,6 @@ logger = logging.getLogger(__name__)
 
 # VIEWS ------------------------------------------------------------------------
 
-@csrf_exempt
-@verify_user('user')
-def project_chat_api(request, project_id):
-    if request.method != "POST":
-        return HttpResponseNotAllowed(["POST"])
-
-    try:
-        data = json.loads(request.body)
-        user_message = data.get("user_message")
-        if not user_message:
-            return JsonResponse({"error": "Missing user_message"}, status=400)
-    except json.JSONDecodeError:
-        return JsonResponse({"error": "Invalid JSON"}, status=400)
-
-    stories = Story.objects.filter(proj_id=project_id).values_list('text_content', flat=True)
-    context = "\n\n".join(stories)
-    # TODO: Implement truncation or summarization if context exceeds Perplexity's limits.
-
-    # Call the Perplexity service
-    response_data = get_perplexity_chat_response(settings.PERPLEXITY_API_KEY, context, user_message)
-
-    if "error" in response_data:
-        logger.error(f"Error from Perplexity service: {response_data}")
-        return JsonResponse(
-            {"error": "Failed to get response from AI service", "details": response_data.get("details", response_data.get("error"))},
-            status=response_data.get("status_code", 500)
-        )
-
-    try:
-        # Adjust the following line based on the actual structure of Perplexity's response
-        # This structure is based on the successful response from the service
-        ai_response = response_data.get('choices', [{}])[0].get('message', {}).get('content', '')
-        if not ai_response:
-            logger.error(f"Perplexity service response did not contain the expected data structure: {response_data}")
-            api_error_message = response_data.get('error', {}).get('message', 'Error processing Perplexity response.')
-            return JsonResponse({"error": f"Failed to get a valid response from AI service: {api_error_message}"}, status=500)
-        
-        return JsonResponse({"reply": ai_response})
-
-    except Exception as e: # Catch any other unexpected errors during response parsing
-        logger.error(f"Unexpected error processing Perplexity service response in view: {e}. Response data: {response_data}")
-        return JsonResponse({"error": "An unexpected server error occurred while processing AI response."}, status=500)
-
-@csrf_exempt
-@verify_user('user')
-def story_chat_api(request, story_id):
-    if request.method != "POST":
-        return HttpResponseNotAllowed(["POST"])
-
-    try:
-        data = json.loads(request.body)
-        user_message = data.get("user_message")
-        if not user_message:
-            return JsonResponse({"error": "Missing user_message"}, status=400)
-    except json.JSONDecodeError:
-        return JsonResponse({"error": "Invalid JSON"}, status=400)
-
-    try:
-        story = Story.objects.get(id=story_id)
-        context = story.text_content
-        if not context.strip(): 
-            logger.warning(f"Story {story_id} has no text_content. Chat context will be empty.")
-            # Proceeding with potentially empty context as per instructions
-    except Story.DoesNotExist:
-        logger.error(f"Story with id={story_id} not found for chat.")
-        return JsonResponse({"error": "Story not found."}, status=404)
-
-    # Temporary logging
-    logger.info(f"[STORY_CHAT_DEBUG] Story ID: {story_id}")
-    logger.info(f"[STORY_CHAT_DEBUG] Context preview (first 500 chars): {context[:500]}")
-
-    # Call the Perplexity service
-    response_data = get_perplexity_chat_response(settings.PERPLEXITY_API_KEY, context, user_message)
-
-    if "error" in response_data:
-        logger.error(f"Error from Perplexity service for story {story_id}: {response_data}")
-        return JsonResponse({
-            "error": "Failed to get response from AI service.",
-            "details": response_data.get("error") # Matching the structure from project_chat_api's error details
-        }, status=response_data.get("status_code", 500))
-
-    try:
-        ai_reply = response_data.get("choices", [{}])[0].get("message", {}).get("content")
-        if not ai_reply:
-            logger.error(f"Could not extract AI reply from Perplexity response for story {story_id}: {response_data}")
-            return JsonResponse({"error": "Failed to parse AI response."}, status=500)
-        
-        return JsonResponse({"reply": ai_reply})
-    except Exception as e: # Catch any other unexpected errors during response parsing
-        logger.error(f"Unexpected error processing Perplexity service response in story_chat_api view: {e}. Response data: {response_data}")
-        return JsonResponse({"error": "An unexpected server error occurred while processing AI response."}, status=500)
-
 ## Home test -------------------------------------------------------------------
 
 
@@ -292,36 +230,69 @@ def id_searcher(real_user_id, id_set, required_access):
         return create_error_response("INVALID_JSON", VALIDATION_ERRORS), False
 
 
+def resolve_access(user_id: str, rows, org_field: str, *fields):
+    """
+    Resolves a user's access level for a story, project or org in one query.
+
+    rows: single-row queryset for the resource being requested
+    org_field: path from that row to its organization id (OuterRef syntax)
+    fields: extra values to return alongside, for filling the access cache
+
+    The OrgUser lookup is annotated onto the resource row as a subquery, so
+    "resource missing" (None) and "not a member" (row with a null access)
+    come back from the same round trip.
+    """
+    membership = OrgUser.objects.filter(
+        user_id=user_id, org_id=OuterRef(org_field)
+    ).values("access")[:1]
+    return (
+        rows.annotate(access=Subquery(membership))
+        .values("access", org_field, *fields)
+        .first()
+    )
+
+
+def access_response(row, not_found: str):
+    # Maps a resolve_access row onto the (access|error response, success) pair
+    if row is None:
+        return create_error_response(not_found, RESOURCE_ERRORS), False
+    if row["access"] is None:
+        return create_error_response("USER_NOT_IN_ORG", AUTH_ERRORS), False
+    return row["access"], True
+
+
 def check_org_auth(user_id: str, org_id: str):
     # Checks if user has access to an organization, returns True if the link exists
-    try:
-        row = OrgUser.objects.get(user_id=user_id, org_id=org_id)
-        return row.access, True
-    except OrgUser.DoesNotExist:
-        try:
-            org = Organization.objects.get(id=org_id)
-        except:
-            return create_error_response("ORG_NOT_FOUND", RESOURCE_ERRORS), False
-        return create_error_response("USER_NOT_IN_ORG", AUTH_ERRORS), False
+    access = get_org_access(user_id, org_id)
+    if access is not None:
+        return access, True
+    row = resolve_access(user_id, Organization.objects.filter(id=org_id), "id")
+    return access_response(row, "ORG_NOT_FOUND")
 
 
 def check_project_auth(user_id: str, project_id: str):
     # Checks if user has access through proj->org link, returns True if the link exists
-    try:
-        project = Project.objects.get(id=project_id)
-        logger.debug("Found Project, looking for org")
-        return check_org_auth(user_id, project.org.id)
-    except Project.DoesNotExist:
-        return create_error_response("PROJECT_NOT_FOUND", RESOURCE_ERRORS), False
+    org_id = get_project_org(project_id)
+    if org_id is not None:
+        return check_org_auth(user_id, org_id)
+    row = resolve_access(user_id, Project.objects.filter(id=project_id), "org_id")
+    if row is not None:
+        set_project_org(project_id, row["org_id"])
+    return access_response(row, "PROJECT_NOT_FOUND")
 
 
 def check_story_auth(user_id: str, story_id: str):
     # Checks if user has access through story->proj->org link, returns True if the link exists
-    try:
-        story = Story.objects.get(id=story_id)
-        return check_project_auth(user_id, story.proj.id)
-    except Story.DoesNotExist:
-        return create_error_response("STORY_NOT_FOUND", RESOURCE_ERRORS), False
+    project_id = get_story_project(story_id)
+    if project_id is not None:
+        return check_project_auth(user_id, project_id)
+    row = resolve_access(
+        user_id, Story.objects.filter(id=story_id), "proj__org_id", "proj_id"
+    )
+    if row is not None:
+        set_story_project(story_id, row["proj_id"])
+        set_project_org(row["proj_id"], row["proj__org_id"])
+    return access_response(row, "STORY_NOT_FOUND")
 
 
 def auth_level_check(user_level: str, required_level: str):
@@ -489,7 +460,6 @@ def get_new_access_token(request):
 def get_project(request, project_id):
     try:
         project = Project.objects.select_related("org", "curator").get(id=project_id)
-        story_count = Story.objects.filter(proj=project).count()
 
         # Get associated ProjectTag objects
         project_tags = (
@@ -518,7 +488,7 @@ def get_project(request, project_id):
             "curator": project.curator.name if project.curator else None,
             "required_tags": list(required_tags),
             "optional_tags": list(optional_tags),
-            "stories": story_count,
+            "stories": project.story_count,
         }
 
         return JsonResponse(data)
@@ -532,6 +502,108 @@ def get_project(request, project_id):
         return create_error_response("INTERNAL_ERROR", SERVER_ERRORS)
 
 
+def count_pairs(rows) -> list:
+    # [(key, count), ...] -> [[key, count], ...], merging empty keys into "Unknown"
+    counts = {}
+    for key, count in rows:
+        key = key or "Unknown"
+        counts[key] = counts.get(key, 0) + count
+    return [[key, count] for key, count in counts.items()]
+
+
+def project_stats(project_id) -> dict:
+    """
+    Aggregates behind the project dashboard. Every series is computed in the
+    database and returned as compact [key, count] pairs; running_total rows
+    are [date, count, total].
+    """
+    stories = Story.objects.filter(proj_id=project_id)
+
+    totals = stories.aggregate(
+        story_count=Count("id"),
+        storyteller_count=Count("storyteller", distinct=True),
+        latest_date=Max("date"),
+    )
+
+    by_storyteller = count_pairs(
+        stories.values_list("storyteller")
+        .annotate(count=Count("id"))
+        .order_by("-count", "storyteller")
+    )
+    by_curator = count_pairs(
+        stories.values_list("curator__name")
+        .annotate(count=Count("id"))
+        .order_by("-count", "curator__name")
+    )
+
+    # Stories lacking a tag count as "Unknown" for that tag name
+    project_tags = StoryTag.objects.filter(story__proj_id=project_id)
+    by_tag = {}
+    for name, value, count in (
+        project_tags.values_list("tag__name", "tag__value")
+        .annotate(count=Count("story", distinct=True))
+        .order_by("tag__name", "-count", "tag__value")
+    ):
+        by_tag.setdefault(name, []).append((value, count))
+    for name, tagged in (
+        project_tags.values_list("tag__name")
+        .annotate(count=Count("story", distinct=True))
+        .order_by()
+    ):
+        if tagged < totals["story_count"]:
+            by_tag[name].append(("Unknown", totals["story_count"] - tagged))
+    by_tag = {name: count_pairs(rows) for name, rows in by_tag.items()}
+
+    # COUNT() OVER (ORDER BY date) includes same-day peers, so each distinct
+    # date carries the cumulative total up to the end of that day.
+    running_total = []
+    previous = 0
+    for day, total in (
+        stories.annotate(total=Window(Count("id"), order_by=F("date").asc()))
+        .values_list("date", "total")
+        .distinct()
+        .order_by("date")
+    ):
+        running_total.append([day.isoformat(), total - previous, total])
+        previous = total
+
+    latest_date = totals["latest_date"]
+    return {
+        "project_id": int(project_id),
+        "story_count": totals["story_count"],
+        "storyteller_count": totals["storyteller_count"],
+        "latest_date": latest_date.isoformat() if latest_date else None,
+        "by_storyteller": by_storyteller,
+        "by_curator": by_curator,
+        "by_tag": by_tag,
+        "running_total": running_total,
+    }
+
+
+@require_GET
+@verify_user("user")
+def get_project_stats(request, project_id):
+    """
+    Dashboard counts for a project, cached per project version (bumped by
+    invalidate_project_stats whenever one of its stories changes).
+    """
+    try:
+        stats = get_project_stats_body(project_id)
+        if stats is None:
+            version = get_project_version(project_id)
+            stats = project_stats(project_id)
+            set_project_stats_body(project_id, version, stats)
+
+        response = JsonResponse(stats, status=200)
+        patch_cache_control(response, private=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+    except Exception as e:
+        logger.error(f"Error in get_project_stats: {e}", exc_info=True)
+        return create_error_response("INTERNAL_ERROR", SERVER_ERRORS)
+
+
 @require_GET
 @verify_user("user")
 def get_org(request, org_id):
@@ -541,13 +613,10 @@ def get_org(request, org_id):
         except Organization.DoesNotExist:
             return create_error_response("ORG_NOT_FOUND", RESOURCE_ERRORS)
 
-        # Get all projects and stories
-        projects = Project.objects.filter(org=org).only("id", "curator")
-        stories = Story.objects.filter(proj__in=projects).only("id", "curator")
-
-        project_count = projects.count()
-        story_count = stories.count()
-        project_ids = list(projects.values_list("id", flat=True))
+        # Counts are maintained on the org row (see counters.py)
+        project_ids = list(
+            Project.objects.filter(org=org).values_list("id", flat=True)
+        )
 
         # get all users from OrgUser table
         org_users = OrgUser.objects.filter(org=org).values_list("user_id", flat=True)
@@ -589,9 +658,9 @@ def get_org(request, org_id):
                 "name": org.name,
                 "description": org.description,
                 "profile_pic_path": profile_pic_url,
-                "project_count": project_count,
+                "project_count": org.project_count,
                 "project_ids": project_ids,
-                "story_count": story_count,
+                "story_count": org.story_count,
                 "users": users_data,
             },
             status=200,
@@ -602,6 +671,152 @@ def get_org(request, org_id):
         return create_error_response("INTERNAL_ERROR", SERVER_ERRORS)
 
 
+## Story list helpers ----------------------------------------------------------
+
+# get_stories fields; story_id is always returned. text_content is only sent
+# when asked for through ?fields=, it is most of the payload. text_preview is
+# its first STORY_PREVIEW_CHARS characters, cut in the database, for lists.
+STORY_LIST_FIELDS = {
+    "storyteller": lambda story: story.storyteller,
+    "project_id": lambda story: story.proj.id,
+    "project_name": lambda story: story.proj.name,
+    "curator": lambda story: story.curator.name if story.curator else None,
+    "date": lambda story: str(story.date),
+    "summary": lambda story: story.summary,
+    "text_content": lambda story: story.text_content,
+    "text_preview": lambda story: (story.text_preview or "")
+    + ("..." if (story.text_length or 0) > settings.STORY_PREVIEW_CHARS else ""),
+    "tags": lambda story: [
+        {
+            "name": st.tag.name,
+            "value": st.tag.value,
+            "created_by": st.tag.created_by,
+        }
+        for st in getattr(story, "prefetched_story_tags", [])
+        if st.tag  # ensure tag exists
+    ],
+}
+DEFAULT_STORY_FIELDS = [
+    f for f in STORY_LIST_FIELDS if f not in ("text_content", "text_preview")
+]
+
+
+def parse_story_fields(raw) -> list:
+    # ?fields=storyteller,date,... -> validated field list (defaults without text)
+    if not raw:
+        return DEFAULT_STORY_FIELDS
+    fields = [f.strip() for f in raw.split(",") if f.strip() and f.strip() != "story_id"]
+    unknown = set(fields) - set(STORY_LIST_FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields {sorted(unknown)}")
+    return fields
+
+
+def parse_story_limit(raw) -> int:
+    # ?limit= page size, capped at settings.STORIES_PAGE_MAX
+    if raw is None:
+        return settings.STORIES_PAGE_SIZE
+    limit = int(raw)
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, settings.STORIES_PAGE_MAX)
+
+
+def encode_story_cursor(story) -> str:
+    # Opaque cursor pointing just past story in (date, id) order
+    raw = json.dumps([story.date.isoformat(), story.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def apply_story_cursor(stories, cursor):
+    """
+    Orders stories by (date, id) and, given a cursor from a previous page,
+    keeps only the rows after it.
+    """
+    stories = stories.order_by("date", "id")
+    if not cursor:
+        return stories
+    try:
+        cursor_date, cursor_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        cursor_date = datetime.date.fromisoformat(cursor_date)
+        cursor_id = int(cursor_id)
+    except (TypeError, ValueError, binascii.Error) as e:
+        raise ValueError(f"invalid cursor {cursor!r}") from e
+    return stories.filter(
+        Q(date__gt=cursor_date) | Q(date=cursor_date, id__gt=cursor_id)
+    )
+
+
+def story_list_queryset(stories, fields):
+    # Loads only what the requested fields need
+    stories = stories.select_related("proj", "curator")
+    if "text_content" not in fields:
+        stories = stories.defer("text_content")
+    if "text_preview" in fields:
+        stories = stories.annotate(
+            text_preview=Substr("text_content", 1, settings.STORY_PREVIEW_CHARS),
+            text_length=Length("text_content"),
+        )
+    if "tags" in fields:
+        stories = stories.prefetch_related(
+            Prefetch(
+                "storytag_set",
+                queryset=StoryTag.objects.select_related("tag"),
+                to_attr="prefetched_story_tags",
+            )
+        )
+    return stories
+
+
+def serialize_story(story, fields) -> dict:
+    data = {"story_id": story.id}
+    for field in fields:
+        data[field] = STORY_LIST_FIELDS[field](story)
+    return data
+
+
+def stream_stories(stories, fields, stream_format, id_type, id_value):
+    """
+    Streams get_stories results without building the list in memory.
+
+    The queryset is walked with .iterator(chunk_size=...), which also runs the
+    tag prefetch one chunk at a time, and each story is serialized as it is
+    written out:
+        - ndjson: one story object per line
+        - json: the regular get_stories body with the stories array streamed
+    """
+    rows = (
+        serialize_story(story, fields)
+        for story in stories.iterator(chunk_size=settings.STORIES_STREAM_CHUNK_SIZE)
+    )
+
+    def ndjson_body():
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+    def json_body():
+        yield '{"id_type": %s, "id_value": %s, "stories": [' % (
+            json.dumps([id_type]),
+            json.dumps([id_value]),
+        )
+        for i, row in enumerate(rows):
+            yield ("," if i else "") + json.dumps(row, cls=DjangoJSONEncoder)
+        yield '], "next_cursor": null}'
+
+    def logged(body):
+        # Headers are already sent, so a failure can only be logged and end the stream
+        try:
+            yield from body
+        except Exception as e:
+            logger.error(f"Error streaming get_stories: {e}")
+
+    if stream_format == "ndjson":
+        return StreamingHttpResponse(
+            logged(ndjson_body()), content_type="application/x-ndjson"
+        )
+    return StreamingHttpResponse(logged(json_body()), content_type="application/json")
+
+
 @require_GET
 @verify_user("user")
 def get_stories(request):
@@ -645,46 +860,44 @@ def get_stories(request):
     else:
         return create_error_response("INVALID_QUERY_PARAM", RESOURCE_ERRORS)
 
+    stream = request.GET.get("stream")
     try:
-        # Optimize tag fetching
-        stories = stories.select_related("proj", "curator").prefetch_related(
-            Prefetch(
-                "storytag_set",
-                queryset=StoryTag.objects.select_related("tag"),
-                to_attr="prefetched_story_tags",
-            )
+        if stream not in (None, "ndjson", "json"):
+            raise ValueError(f"unknown stream format {stream!r}")
+        fields = parse_story_fields(request.GET.get("fields"))
+        stories = apply_story_cursor(stories, request.GET.get("cursor"))
+        # Streams run to the end of the queryset unless a limit is given
+        limit = (
+            None
+            if stream and "limit" not in request.GET
+            else parse_story_limit(request.GET.get("limit"))
         )
+    except ValueError as e:
+        logger.debug("Bad get_stories pagination params: %s", e)
+        return create_error_response("INVALID_QUERY_PARAM", RESOURCE_ERRORS)
 
-        # Prepare the output with presigned URLs
-        stories_data = []
-        for story in stories.select_related("proj", "curator"):
-            tag_list = [
-                {
-                    "name": st.tag.name,
-                    "value": st.tag.value,
-                    "created_by": st.tag.created_by,
-                }
-                for st in getattr(story, "prefetched_story_tags", [])
-                if st.tag  # ensure tag exists
-            ]
-            stories_data.append(
-                {
-                    "story_id": story.id,
-                    "storyteller": story.storyteller,
-                    "project_id": story.proj.id,
-                    "project_name": story.proj.name,
-                    "curator": story.curator.name if story.curator else None,
-                    "date": str(story.date),
-                    "summary": story.summary,
-                    "text_content": story.text_content,
-                    "tags": tag_list,
-                }
-            )
+    try:
+        stories = story_list_queryset(stories, fields)
+
+        if stream:
+            if limit is not None:
+                stories = stories[:limit]
+            return stream_stories(stories, fields, stream, id_type, id_value)
+
+        # Keyset pagination: one extra row tells us whether a next page exists
+        page = list(stories[: limit + 1])
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_story_cursor(page[-1])
+
+        stories_data = [serialize_story(story, fields) for story in page]
 
         response = {
             "id_type": [id_type],
             "id_value": [id_value],
             "stories": stories_data,
+            "next_cursor": next_cursor,
         }
 
         return JsonResponse(response, safe=False)
@@ -694,61 +907,79 @@ def get_stories(request):
         return create_error_response("INTERNAL_ERROR", SERVER_ERRORS)
 
 
+def story_media_url(bucket_name: str, key: str) -> str:
+    # Presigned download URL for story media, reused while enough lifetime remains
+    presign = generate_s3_presigned(
+        bucket_name=bucket_name,
+        key=key,
+        operation="download",
+        expiration=3600,
+    )
+    return presign["url"] if presign else ""
+
+
 @require_GET
 @verify_user("user")
-@cache_page(60 * 15)  # Cache for 15 minutes
 def get_story(request, story_id):
-    print(request.headers)
-
+    """
+    The story body is served from story_cache (keyed by story id and content
+    version); media links come from the presigned URL cache and are only
+    re-signed when the cached ones are close to expiring.
+    """
     try:
-        story = Story.objects.select_related("proj", "curator").get(id=story_id)
-        story_tags = StoryTag.objects.filter(story=story).select_related("tag")
+        cached = get_story_body(story_id)
+        if cached is None:
+            version = get_story_version(story_id)
+            story = Story.objects.select_related("proj", "curator").get(id=story_id)
+            story_tags = StoryTag.objects.filter(story=story).select_related("tag")
 
-        tags = [
-            {
-                "name": st.tag.name,
-                "value": st.tag.value,
-                "created_by": st.tag.created_by,
+            tags = [
+                {
+                    "name": st.tag.name,
+                    "value": st.tag.value,
+                    "created_by": st.tag.created_by,
+                }
+                for st in story_tags
+            ]
+
+            cached = {
+                "story": {
+                    "story_id": story.id,
+                    "project_id": story.proj.id,
+                    "project_name": story.proj.name,
+                    "storyteller": story.storyteller,
+                    "curator": story.curator.id if story.curator else None,
+                    "date": story.date,
+                    "text_content": story.text_content,
+                    "summary": story.summary,
+                    "tags": tags,
+                },
+                "audio_key": story.audio_content.name if story.audio_content else "",
+                "image_key": story.image_content.name if story.image_content else "",
             }
-            for st in story_tags
-        ]
+            set_story_body(story_id, version, cached)
 
         audio_url = ""
-        if story.audio_content:
-            audio_presign = generate_s3_presigned(
-                bucket_name=settings.CT_BUCKET_STORY_AUDIO,
-                key=story.audio_content.name,
-                operation="download",
-                expiration=3600,
+        if cached["audio_key"]:
+            audio_url = story_media_url(
+                settings.CT_BUCKET_STORY_AUDIO, cached["audio_key"]
             )
-            audio_url = audio_presign["url"] if audio_presign else ""
 
         image_url = ""
-        if story.image_content:
-            image_presign = generate_s3_presigned(
-                bucket_name=settings.CT_BUCKET_STORY_IMAGES,
-                key=story.image_content.name,
-                operation="download",
-                expiration=3600,
+        if cached["image_key"]:
+            image_url = story_media_url(
+                settings.CT_BUCKET_STORY_IMAGES, cached["image_key"]
             )
-            image_url = image_presign["url"] if image_presign else ""
 
-        return JsonResponse(
-            {
-                "story_id": story.id,
-                "project_id": story.proj.id,
-                "project_name": story.proj.name,
-                "storyteller": story.storyteller,
-                "curator": story.curator.id if story.curator else None,
-                "date": story.date,
-                "text_content": story.text_content,
-                "summary": story.summary,
-                "tags": tags,
-                "audio_path": audio_url,
-                "image_path": image_url,
-            },
+        response = JsonResponse(
+            {**cached["story"], "audio_path": audio_url, "image_path": image_url},
             status=200,
         )
+        # Body depends on the caller's token passing verify_user, so keep it
+        # out of shared HTTP caches.
+        patch_cache_control(response, private=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
 
     except Story.DoesNotExist:
         logging.debug("Story not found with ID: %s", story_id)
@@ -861,6 +1092,7 @@ def create_story(request):
                     audio_content=story_data.get("audio_path"),
                     image_content=story_data.get("image_path"),
                 )
+                story_added(project.id, project.org_id)
                 logger.debug("Created story: %s", story)
 
                 # Handle tags
@@ -871,7 +1103,7 @@ def create_story(request):
                     for tag_data in story_data.get("optional_tags", [])
                 ]
 
-                story_tags_to_create = []
+                identities = []
                 for tag_data, is_required in all_tags:
                     if (
                         not isinstance(tag_data, dict)
@@ -880,26 +1112,16 @@ def create_story(request):
                     ):
                         logger.warning("Invalid tag format: %s", tag_data)
                         continue
+                    identities.append(
+                        (tag_data["name"], tag_data["value"], "user", is_required)
+                    )
 
-                    try:
-                        tag, created = Tag.objects.get_or_create(
-                            name=tag_data["name"],
-                            value=tag_data["value"],
-                            created_by="user",
-                            required=is_required,
-                        )
-                        if created:
-                            logger.debug(
-                                "Created new tag: name=%s, value=%s, required=%s",
-                                tag.name,
-                                tag.value,
-                                is_required,
-                            )
-                        story_tags_to_create.append(
-                            StoryTag(story_id=story.id, tag_id=tag.id)
-                        )
-                    except Exception as e:
-                        logger.warning("Failed to create tag %s: %s", tag_data, str(e))
+                # One select + one insert for the whole form
+                tag_ids = upsert_tags(identities)
+                story_tags_to_create = [
+                    StoryTag(story_id=story.id, tag_id=tag_id)
+                    for tag_id in tag_ids.values()
+                ]
 
                 if story_tags_to_create:
                     StoryTag.objects.bulk_create(story_tags_to_create)
@@ -915,6 +1137,8 @@ def create_story(request):
                 logger.error("Database operation failed: %s", str(e))
                 return create_error_response("DATABASE_ERROR", SERVER_ERRORS)
 
+        invalidate_project_stats(project.id)
+
         # Queue ML processing
         # For now, we are not giving back error for ML queue failure to the client
         # They can use the ml_status endpoint to check the status of the ML processing
@@ -1014,6 +1238,7 @@ def add_user_to_org(request, org_id):
                 orguser = OrgUser.objects.create(
                     user_id=user.id, org_id=org_id, access=org_user_data["access"]
                 )
+                invalidate_user(user.id)
                 logger.debug("Created OrgUser relationship %s", orguser)
 
             except Exception as e:
@@ -1056,6 +1281,7 @@ def delete_user_from_org(request, org_id, del_user_id):
     try:
         user_to_delete = OrgUser.objects.get(org_id=org_id, user_id=del_user_id)
         user_to_delete.delete()
+        invalidate_user(del_user_id)
         return JsonResponse({"success": True}, status=200)
     except:
         return create_error_response("DATABASE_ERROR", SERVER_ERRORS)
@@ -1086,6 +1312,10 @@ def edit_story(request, story_id):
         story.curator = curator
         if "date" in story_updates:
             story.date = story_updates["date"]
+        text_changed = story.text_content != story_updates["text_content"]
+        if text_changed:
+            # Stale summary; regenerated by the summarization job queued below
+            story.summary = None
         story.text_content = story_updates["text_content"]
 
         if "image_content" in story_updates:
@@ -1098,18 +1328,38 @@ def edit_story(request, story_id):
         return create_error_response("DATABASE_ERROR", SERVER_ERRORS)
     try:
         story.save()
-        return JsonResponse({"success": True}, status=200)
+        invalidate_story_cache(story_id)
+        invalidate_project_stats(story.proj_id)
     except:
         return create_error_response("DATABASE_ERROR", SERVER_ERRORS)
 
+    if text_changed:
+        # Queue only the summary; like create_story, a queue failure isn't
+        # reported to the client (see the ml_status endpoint)
+        try:
+            producer = QueueProducer()
+            producer.disable_task("transcription")
+            producer.disable_task("tag")
+            if not producer.add_to_queue(story)["success"]:
+                logger.error("Failed to queue summarization for story %s", story.id)
+        except Exception as e:
+            logger.error("Queue service error: %s", str(e))
+
+    return JsonResponse({"success": True}, status=200)
+
 
 @csrf_exempt
 @require_http_methods(["DELETE"])
 @verify_user("admin")
 def delete_story(request, story_id):
     try:
-        org_to_delete = Story.objects.get(id=story_id)
-        org_to_delete.delete()
+        org_to_delete = Story.objects.select_related("proj").get(id=story_id)
+        with transaction.atomic():
+            org_to_delete.delete()
+            story_removed(org_to_delete.proj_id, org_to_delete.proj.org_id)
+        invalidate_story(story_id)
+        invalidate_story_cache(story_id)
+        invalidate_project_stats(org_to_delete.proj_id)
         return JsonResponse({"success": True}, status=200)
     except:
         return create_error_response("DATABASE_ERROR", SERVER_ERRORS)
@@ -1155,6 +1405,7 @@ def create_project(request):
             org=org,
             date=str(date.today()),
         )
+        project_added(org.id)
         # move the tag loop inside the try
         required_tags = project_data.get("required_tags", [])
         optional_tags = project_data.get("optional_tags", [])
@@ -1162,18 +1413,13 @@ def create_project(request):
         logger.debug("Creating tags for project %s", project.id)
         logger.debug("Required tags: %s", required_tags)
         logger.debug("Optional tags: %s", optional_tags)
-        for rtag in required_tags:
-            tag = Tag.objects.create(name=rtag, required=True)
-            ProjectTag.objects.create(
-                tag=tag,
-                proj=project,
-            )
-        for otag in optional_tags:
-            tag = Tag.objects.create(name=otag, required=False)
-            ProjectTag.objects.create(
-                tag=tag,
-                proj=project,
-            )
+        tag_ids = upsert_tags(
+            [(rtag, None, None, True) for rtag in required_tags]
+            + [(otag, None, None, False) for otag in optional_tags]
+        )
+        ProjectTag.objects.bulk_create(
+            [ProjectTag(tag_id=tag_id, proj=project) for tag_id in tag_ids.values()]
+        )
 
         return JsonResponse(
             {
@@ -1218,6 +1464,7 @@ def edit_project(request, project_id):
         return create_error_response("PROJECT_NOT_FOUND", RESOURCE_ERRORS)
 
     # 3) assign new values
+    renamed = project.name != name
     project.name = name
     try:
         project.curator = CustomUser.objects.get(pk=curator_id)
@@ -1235,6 +1482,11 @@ def edit_project(request, project_id):
     # 4) save
     try:
         project.save()
+        if renamed:
+            # Cached get_story bodies carry the project name
+            invalidate_story_caches(
+                Story.objects.filter(proj_id=project.id).values_list("id", flat=True)
+            )
         return JsonResponse({"success": True}, status=200)
     except:
         return create_error_response("DATABASE_ERROR", SERVER_ERRORS)
@@ -1247,7 +1499,10 @@ def delete_project(request, project_id):
     try:
         proj_to_delete = Project.objects.get(id=project_id)
 
-        proj_to_delete.delete()
+        invalidate_project(project_id)
+        with transaction.atomic():
+            project_removed(project_id)
+            proj_to_delete.delete()
         return JsonResponse({"success": True}, status=200)
     except:
         return create_error_response("DATABASE_ERROR", SERVER_ERRORS)
@@ -1310,6 +1565,7 @@ def create_org(request: HttpRequest) -> JsonResponse:
         user = get_user_model().objects.get(pk=request.user_id)
 
         OrgUser.objects.create(org=org, user=user, access="admin")
+        invalidate_user(user.id)
 
     except KeyError as e:
         logger.error("KeyError: %s", str(e))
@@ -1355,6 +1611,7 @@ def edit_org(request, org_id):
 def delete_org(request, org_id):
     try:
         org_to_delete = Organization.objects.get(id=org_id)
+        invalidate_org(org_id)
         org_to_delete.delete()
         return JsonResponse({"success": True}, status=200)
     except:
@@ -1382,38 +1639,37 @@ def get_user(request):
 
     try:
         user = User.objects.get(pk=user_id)
+        org_users = OrgUser.objects.filter(user=user).select_related("org")
 
-        # Generate presigned URL for user profile picture
-        user_profile_url = ""
+        # Sign the user's and every org's profile picture in one batch
+        profile_objects = []
         if user.profile:
-            try:
-                user_presign = generate_s3_presigned(
-                    bucket_name=settings.CT_BUCKET_USER_PROFILES,
-                    key=user.profile.name,
-                    operation="download",
-                    expiration=3600,
+            profile_objects.append((settings.CT_BUCKET_USER_PROFILES, user.profile.name))
+        for org_user in org_users:
+            if org_user.org.profile:
+                profile_objects.append(
+                    (settings.CT_BUCKET_ORG_PROFILES, org_user.org.profile.name)
                 )
-                user_profile_url = user_presign["url"]
-            except Exception:
-                return create_error_response("S3_ERROR", SERVER_ERRORS)
+        try:
+            profile_urls = generate_s3_presigned_batch(profile_objects, expiration=3600)
+        except Exception:
+            return create_error_response("S3_ERROR", SERVER_ERRORS)
+
+        user_profile_url = ""
+        if user.profile:
+            user_profile_url = profile_urls[
+                (settings.CT_BUCKET_USER_PROFILES, user.profile.name)
+            ]
 
         # Get organizations with presigned URLs for their profiles
-        org_users = OrgUser.objects.filter(user=user).select_related("org")
         orgs = []
         for org_user in org_users:
             org = org_user.org
             org_profile_url = ""
             if org.profile:
-                try:
-                    org_presign = generate_s3_presigned(
-                        bucket_name=settings.CT_BUCKET_ORG_PROFILES,
-                        key=org.profile.name,
-                        operation="download",
-                        expiration=3600,
-                    )
-                    org_profile_url = org_presign["url"]
-                except Exception:
-                    return create_error_response("S3_ERROR", SERVER_ERRORS)
+                org_profile_url = profile_urls[
+                    (settings.CT_BUCKET_ORG_PROFILES, org.profile.name)
+                ]
 
             orgs.append(
                 {
@@ -1484,6 +1740,7 @@ def delete_user(request, user_id):
             id=request.user_id
         )  # kwargs['real_user_id']
         user_to_delete.delete()
+        invalidate_user(request.user_id)
         return JsonResponse({"success": True}, status=200)
     except:
         return create_error_response("DATABASE_ERROR", SERVER_ERRORS)
@@ -1498,23 +1755,19 @@ def get_org_projects(request, org_id):
         org = get_object_or_404(Organization, id=org_id)
 
         # Get all projects in the org
-        projects = Project.objects.filter(org=org)
-        project_count = projects.count()
-
-        for project in projects:
-            story_count = Story.objects.filter(proj=project).count()
+        projects = Project.objects.filter(org=org).only("id", "name", "story_count")
 
         response_data = {
             "org_id": org.id,
             "name": org.name,
             "description": org.description,
             "profile_pic_path": org.profile.url if org.profile else "",
-            "project_count": project_count,
+            "project_count": org.project_count,
             "projects": [
                 {
                     "project_id": project.id,
                     "project_name": project.name,
-                    "story_count": story_count,
+                    "story_count": project.story_count,
                 }
                 for project in projects
             ],
@@ -1527,4 +1780,100 @@ def get_org_projects(request, org_id):
         return JsonResponse({"error": "Something went wrong."}, status=500)
 
 
+## Chat methods ----------------------------------------------------------------
+
+
+@csrf_exempt
+@verify_user('user')
+def project_chat_api(request, project_id):
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    try:
+        data = json.loads(request.body)
+        user_message = data.get("user_message")
+        if not user_message:
+            return JsonResponse({"error": "Missing user_message"}, status=400)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    # Only the chunks most relevant to the question, whatever the project size
+    chunks = retrieve_chunks(project_id, user_message)
+    context = "\n\n".join(text for _, text in chunks)
+
+    # Call the Perplexity service
+    response_data = get_perplexity_chat_response(settings.PERPLEXITY_API_KEY, context, user_message)
+
+    if "error" in response_data:
+        logger.error(f"Error from Perplexity service: {response_data}")
+        return JsonResponse(
+            {"error": "Failed to get response from AI service", "details": response_data.get("details", response_data.get("error"))},
+            status=response_data.get("status_code", 500)
+        )
+
+    try:
+        # Adjust the following line based on the actual structure of Perplexity's response
+        # This structure is based on the successful response from the service
+        ai_response = response_data.get('choices', [{}])[0].get('message', {}).get('content', '')
+        if not ai_response:
+            logger.error(f"Perplexity service response did not contain the expected data structure: {response_data}")
+            api_error_message = response_data.get('error', {}).get('message', 'Error processing Perplexity response.')
+            return JsonResponse({"error": f"Failed to get a valid response from AI service: {api_error_message}"}, status=500)
+        
+        return JsonResponse({"reply": ai_response})
+
+    except Exception as e: # Catch any other unexpected errors during response parsing
+        logger.error(f"Unexpected error processing Perplexity service response in view: {e}. Response data: {response_data}")
+        return JsonResponse({"error": "An unexpected server error occurred while processing AI response."}, status=500)
+
+@csrf_exempt
+@verify_user('user')
+def story_chat_api(request, story_id):
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    try:
+        data = json.loads(request.body)
+        user_message = data.get("user_message")
+        if not user_message:
+            return JsonResponse({"error": "Missing user_message"}, status=400)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    try:
+        story = Story.objects.get(id=story_id)
+        context = story.text_content
+        if not context.strip(): 
+            logger.warning(f"Story {story_id} has no text_content. Chat context will be empty.")
+            # Proceeding with potentially empty context as per instructions
+    except Story.DoesNotExist:
+        logger.error(f"Story with id={story_id} not found for chat.")
+        return JsonResponse({"error": "Story not found."}, status=404)
+
+    # Temporary logging
+    logger.info(f"[STORY_CHAT_DEBUG] Story ID: {story_id}")
+    logger.info(f"[STORY_CHAT_DEBUG] Context preview (first 500 chars): {context[:500]}")
+
+    # Call the Perplexity service
+    response_data = get_perplexity_chat_response(settings.PERPLEXITY_API_KEY, context, user_message)
+
+    if "error" in response_data:
+        logger.error(f"Error from Perplexity service for story {story_id}: {response_data}")
+        return JsonResponse({
+            "error": "Failed to get response from AI service.",
+            "details": response_data.get("error") # Matching the structure from project_chat_api's error details
+        }, status=response_data.get("status_code", 500))
+
+    try:
+        ai_reply = response_data.get("choices", [{}])[0].get("message", {}).get("content")
+        if not ai_reply:
+            logger.error(f"Could not extract AI reply from Perplexity response for story {story_id}: {response_data}")
+            return JsonResponse({"error": "Failed to parse AI response."}, status=500)
+        
+        return JsonResponse({"reply": ai_reply})
+    except Exception as e: # Catch any other unexpected errors during response parsing
+        logger.error(f"Unexpected error processing Perplexity service response in story_chat_api view: {e}. Response data: {response_data}")
+        return JsonResponse({"error": "An unexpected server error occurred while processing AI response."}, status=500)
+
+
 # EOF. ------------------------------------------------------------------------
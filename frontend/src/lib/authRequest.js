@@ -113,3 +113,31 @@ async function getNewAccessToken(refreshToken) {
 		return null;
 	}
 }
+
+// GET /stories returns one page at a time; follow next_cursor until every
+// story for the query has been loaded.
+export async function authRequestAllStories(url, accessToken, refreshToken) {
+	const firstPage = await authRequest(url, 'GET', accessToken, refreshToken);
+	if (!firstPage?.data) {
+		return firstPage;
+	}
+
+	const stories = [...firstPage.data.stories];
+	let cursor = firstPage.data.next_cursor;
+	while (cursor) {
+		const separator = url.includes('?') ? '&' : '?';
+		const nextPage = await authRequest(
+			`${url}${separator}cursor=${encodeURIComponent(cursor)}`,
+			'GET',
+			accessToken,
+			refreshToken
+		);
+		if (!nextPage?.data) {
+			return nextPage;
+		}
+		stories.push(...nextPage.data.stories);
+		cursor = nextPage.data.next_cursor;
+	}
+
+	return { ...firstPage, data: { ...firstPage.data, stories, next_cursor: null } };
+}